@@ -0,0 +1,119 @@
+import os
+import logging
+import mimetypes
+import threading
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import urlparse
+
+from pdf_output import OutputPreset, IMAGE_DISPLAY_PX, prepare_png
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+REMOTE_ASSET_CACHE_BYTES = int(os.getenv("REMOTE_ASSET_CACHE_BYTES", str(16 * 1024 * 1024)))
+
+# Supabase storage URLs used by the receipt templates and their copies under static/
+KNOWN_ASSETS = {
+    "https://dvobjzoqovdrsuzhjnkf.supabase.co/storage/v1/object/public/receiptimgs//logo.png": "img/logo.png",
+    "https://dvobjzoqovdrsuzhjnkf.supabase.co/storage/v1/object/public/receiptimgs//AbhijitSign.png": "img/AbhijitSign.png",
+    "https://dvobjzoqovdrsuzhjnkf.supabase.co/storage/v1/object/public/receiptimgs/logo.png": "img/logo.png",
+    "https://dvobjzoqovdrsuzhjnkf.supabase.co/storage/v1/object/public/receiptimgs/AbhijitSign.png": "img/AbhijitSign.png",
+}
+
+
+class AssetFetcher:
+    """WeasyPrint url_fetcher serving receipt assets from memory instead of the network
+
+    With a preset, the receipt images are served already resampled for it, so
+    WeasyPrint embeds the small copy without resizing it on every render.
+    """
+
+    def __init__(
+        self,
+        static_dir: str = STATIC_DIR,
+        remote_cache_bytes: int = REMOTE_ASSET_CACHE_BYTES,
+        preset: Optional[OutputPreset] = None,
+    ):
+        self.static_dir = os.path.realpath(static_dir)
+        self.remote_cache_bytes = remote_cache_bytes
+        self.preset = preset
+        self._static = {}
+        self._remote: "OrderedDict[str, dict]" = OrderedDict()
+        self._remote_size = 0
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.remote_hits = 0
+        self.remote_fetches = 0
+        for relative in set(KNOWN_ASSETS.values()):
+            self._load_static(relative)
+
+    def _load_static(self, relative: str):
+        """Read a file under static/ once and keep it in memory"""
+        if relative in self._static:
+            return self._static[relative]
+        path = os.path.realpath(os.path.join(self.static_dir, relative))
+        if not path.startswith(self.static_dir + os.sep) or not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        mime_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if self.preset is not None and relative in IMAGE_DISPLAY_PX:
+            data = prepare_png(data, IMAGE_DISPLAY_PX[relative], self.preset)
+            mime_type = "image/png"
+        self._static[relative] = (data, mime_type)
+        return self._static[relative]
+
+    def _local(self, url: str):
+        relative = KNOWN_ASSETS.get(url)
+        if relative is None:
+            path = urlparse(url).path
+            marker = path.find("/static/")
+            if marker == -1:
+                return None
+            relative = path[marker + len("/static/"):]
+        return self._load_static(relative)
+
+    def __call__(self, url: str, *args, **kwargs) -> dict:
+        local = self._local(url)
+        if local is not None:
+            self.local_hits += 1
+            data, mime_type = local
+            return {"string": data, "mime_type": mime_type, "redirected_url": url}
+        with self._lock:
+            cached = self._remote.get(url)
+            if cached is not None:
+                self._remote.move_to_end(url)
+                self.remote_hits += 1
+                return dict(cached)
+        result = self._fetch_remote(url, *args, **kwargs)
+        self._remember(url, result)
+        return result
+
+    def _fetch_remote(self, url: str, *args, **kwargs) -> dict:
+        from weasyprint import default_url_fetcher
+
+        self.remote_fetches += 1
+        result = default_url_fetcher(url, *args, **kwargs)
+        if "file_obj" in result:
+            file_obj = result.pop("file_obj")
+            try:
+                result["string"] = file_obj.read()
+            finally:
+                file_obj.close()
+        return result
+
+    def _remember(self, url: str, result: dict):
+        size = len(result.get("string") or b"")
+        if size > self.remote_cache_bytes:
+            return
+        with self._lock:
+            old = self._remote.pop(url, None)
+            if old is not None:
+                self._remote_size -= len(old.get("string") or b"")
+            self._remote[url] = dict(result)
+            self._remote_size += size
+            while self._remote_size > self.remote_cache_bytes:
+                _, evicted = self._remote.popitem(last=False)
+                self._remote_size -= len(evicted.get("string") or b"")
@@ -0,0 +1,149 @@
+import os
+import logging
+import importlib.util
+from typing import TYPE_CHECKING, Awaitable, Callable, List, Optional
+
+from resilience import Upstream, supabase_upstream
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_KEEPALIVE = int(os.getenv("DB_KEEPALIVE", "10"))
+DB_KEEPALIVE_EXPIRY = float(os.getenv("DB_KEEPALIVE_EXPIRY", "30"))
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "10"))
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+DB_HTTP2 = os.getenv("DB_HTTP2", "1") != "0"
+
+# Checked without importing: httpx and h2 load with the first client, not with this module
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def in_filter(values) -> str:
+    """PostgREST in. operand with each value quoted, so commas and parentheses in IDs are safe"""
+    quoted = ('"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"' for value in values)
+    return f"in.({','.join(quoted)})"
+
+
+# PostgreSQL's code for a filter or order on a column that does not exist
+UNDEFINED_COLUMN = "42703"
+
+
+class PostgrestError(Exception):
+    """Raised when PostgREST answers with an error status"""
+
+    def __init__(self, status_code: int, message: str, code: Optional[str] = None):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+        # PostgreSQL or PostgREST error code from the body, e.g. "42703" for an undefined column
+        self.code = code
+
+
+class AsyncPostgrest:
+    """Minimal async PostgREST client on a shared keep-alive (HTTP/2 when available) connection pool
+
+    Requests go through an Upstream: each runs under a deadline behind the
+    shared circuit breaker, and reads are retried on transient failures.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        token_provider: Optional[Callable[[], Awaitable[Optional[str]]]] = None,
+        pool_size: int = DB_POOL_SIZE,
+        keepalive: int = DB_KEEPALIVE,
+        timeout: float = DB_TIMEOUT,
+        connect_timeout: float = DB_CONNECT_TIMEOUT,
+        http2: bool = DB_HTTP2,
+        upstream: Upstream = supabase_upstream,
+    ):
+        self.base_url = f"{url.rstrip('/')}/rest/v1"
+        self.key = key
+        self.token_provider = token_provider
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.upstream = upstream
+        self._client = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.keepalive,
+                    keepalive_expiry=DB_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                headers={"apikey": self.key},
+            )
+        return self._client
+
+    async def _headers(self, extra: Optional[dict] = None) -> dict:
+        token = await self.token_provider() if self.token_provider else None
+        headers = {"Authorization": f"Bearer {token or self.key}"}
+        if extra:
+            headers.update(extra)
+        return headers
+
+    @staticmethod
+    def _check(response: "httpx.Response"):
+        if response.status_code >= 400:
+            try:
+                body = response.json()
+                message, code = body.get("message", response.text), body.get("code")
+            except (ValueError, AttributeError):
+                message, code = response.text, None
+            raise PostgrestError(response.status_code, message, code)
+
+    async def select(
+        self,
+        table: str,
+        eq: Optional[dict] = None,
+        columns: str = "*",
+        limit: Optional[int] = None,
+        params=None,
+    ) -> List[dict]:
+        """GET rows matching equality filters plus any raw PostgREST params (dict or pairs)"""
+        query = [("select", columns)]
+        for column, value in (eq or {}).items():
+            query.append((column, f"eq.{value}"))
+        if limit is not None:
+            query.append(("limit", str(limit)))
+        if params:
+            query.extend(params.items() if isinstance(params, dict) else params)
+        headers = await self._headers()
+
+        async def get():
+            response = await self.client.get(f"/{table}", params=query, headers=headers)
+            self._check(response)
+            return response.json()
+
+        return await self.upstream.call(get)
+
+    async def insert(self, table: str, rows) -> List[dict]:
+        """POST one row or a list of rows and return what was stored"""
+        headers = await self._headers({"Prefer": "return=representation"})
+
+        async def post():
+            response = await self.client.post(f"/{table}", json=rows, headers=headers)
+            self._check(response)
+            return response.json()
+
+        # Not retried: a timed-out insert may still have been stored
+        return await self.upstream.call(post, idempotent=False)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,122 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Optional
+
+from resilience import Upstream, supabase_upstream
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_AUTH_EMAIL = os.getenv("SUPABASE_AUTH_EMAIL", "abhijit.shinde@test.com")
+SUPABASE_AUTH_PASSWORD = os.getenv("SUPABASE_AUTH_PASSWORD", "india@123")
+# Refresh this many seconds before the access token expires
+SUPABASE_REFRESH_MARGIN = int(os.getenv("SUPABASE_REFRESH_MARGIN", "60"))
+
+
+class AuthError(Exception):
+    """Raised when no authenticated session can be obtained"""
+
+
+class SupabaseSession:
+    """One signed-in Supabase session per process, refreshed before it expires"""
+
+    def __init__(
+        self,
+        client,
+        email: str = SUPABASE_AUTH_EMAIL,
+        password: str = SUPABASE_AUTH_PASSWORD,
+        refresh_margin: int = SUPABASE_REFRESH_MARGIN,
+        upstream: Upstream = supabase_upstream,
+    ):
+        self.client = client
+        self.upstream = upstream
+        self.email = email
+        self.password = password
+        self.refresh_margin = refresh_margin
+        self._lock = asyncio.Lock()
+        self._session = None
+        self.sign_ins = 0
+        self.refreshes = 0
+        self.failures = 0
+        self.last_latency = 0.0
+        self.total_latency = 0.0
+
+    @property
+    def access_token(self) -> Optional[str]:
+        return self._session.access_token if self._session else None
+
+    @property
+    def expires_at(self) -> float:
+        if not self._session or not self._session.expires_at:
+            return 0.0
+        return float(self._session.expires_at)
+
+    def _fresh(self) -> bool:
+        return self._session is not None and self.expires_at - self.refresh_margin > time.time()
+
+    async def ensure(self):
+        """Return a valid session, signing in or refreshing at most once across concurrent callers"""
+        if self._fresh():
+            return self._session
+        async with self._lock:
+            if not self._fresh():
+                await self._renew()
+        return self._session
+
+    async def _renew(self):
+        started = time.perf_counter()
+        try:
+            if self._session is not None and self._session.refresh_token:
+                try:
+                    # Not retried: the refresh token is single use
+                    response = await self.upstream.call(
+                        lambda: asyncio.to_thread(self.client.auth.refresh_session, self._session.refresh_token),
+                        idempotent=False,
+                    )
+                    self.refreshes += 1
+                except Exception as e:
+                    logger.warning(f"Supabase session refresh failed, signing in again: {e}")
+                    response = await self._sign_in()
+            else:
+                response = await self._sign_in()
+        except Exception as e:
+            self.failures += 1
+            raise AuthError(str(e)) from e
+        finally:
+            self.last_latency = time.perf_counter() - started
+            self.total_latency += self.last_latency
+        if not response or not response.session:
+            self.failures += 1
+            raise AuthError("Supabase returned no session")
+        self._session = response.session
+
+    async def _sign_in(self):
+        response = await self.upstream.call(
+            lambda: asyncio.to_thread(
+                self.client.auth.sign_in_with_password, {"email": self.email, "password": self.password}
+            )
+        )
+        self.sign_ins += 1
+        return response
+
+    async def run_refresher(self):
+        """Background task that renews the session shortly before expiry"""
+        while True:
+            try:
+                await self.ensure()
+                delay = self.expires_at - self.refresh_margin - time.time()
+            except Exception as e:
+                logger.error(f"Supabase session renewal failed: {e}")
+                delay = 0
+            await asyncio.sleep(max(delay, 5))
+
+    def stats(self) -> dict:
+        return {
+            "sign_ins": self.sign_ins,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "last_latency_seconds": round(self.last_latency, 4),
+            "total_latency_seconds": round(self.total_latency, 4),
+            "expires_in_seconds": max(0, int(self.expires_at - time.time())),
+        }
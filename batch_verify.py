@@ -0,0 +1,67 @@
+import os
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from models import normalize_phone
+from async_db import in_filter
+from receipt_cache import receipt_cache
+
+# Most (receipt ID, phone) pairs accepted per request
+VERIFY_BATCH_MAX = max(1, int(os.getenv("VERIFY_BATCH_MAX", "500")))
+# IDs per in_ query, which keeps the PostgREST URL short
+VERIFY_BATCH_CHUNK = max(1, int(os.getenv("VERIFY_BATCH_CHUNK", "100")))
+
+# Matching needs only the phone, so misses fetch two columns instead of the row
+MATCH_COLUMNS = "receiptid,customer_phone"
+
+VERIFIED, PHONE_MISMATCH, NOT_FOUND = "verified", "phone_mismatch", "not_found"
+
+
+async def _fetch_phone_digits(rest, receipt_ids: List[str]) -> Dict[str, str]:
+    rows = await rest.select("receipts", columns=MATCH_COLUMNS, params=[("receiptid", in_filter(receipt_ids))])
+    return {row["receiptid"]: normalize_phone(row.get("customer_phone")) for row in rows}
+
+
+async def phone_digits_by_id(
+    receipt_ids: List[str], rest, replica=None, chunk_size: int = VERIFY_BATCH_CHUNK
+) -> Dict[str, Optional[str]]:
+    """Normalized phone per receipt ID (None when unknown) from the receipt cache, the replica, then in_ queries"""
+    digits: Dict[str, Optional[str]] = {}
+    missing = []
+    for receipt_id in dict.fromkeys(receipt_ids):
+        found, receipt = await receipt_cache.aget(receipt_id)
+        if found:
+            digits[receipt_id] = receipt.phone_digits if receipt is not None else None
+        else:
+            missing.append(receipt_id)
+
+    if missing and replica:
+        digits.update(replica.phone_digits(missing))
+        missing = [receipt_id for receipt_id in missing if receipt_id not in digits]
+
+    if missing:
+        chunks = [missing[start:start + chunk_size] for start in range(0, len(missing), chunk_size)]
+        for fetched in await asyncio.gather(*(_fetch_phone_digits(rest, chunk) for chunk in chunks)):
+            digits.update(fetched)
+        for receipt_id in missing:
+            if receipt_id not in digits:
+                # Same negative entry a single verification would leave
+                receipt_cache.put(receipt_id, None)
+                digits[receipt_id] = None
+    return digits
+
+
+async def verify_pairs(pairs: List[Tuple[str, str]], rest, replica=None) -> List[dict]:
+    """Match result for each (receipt ID, phone) pair, in request order"""
+    digits = await phone_digits_by_id([receipt_id for receipt_id, _ in pairs], rest, replica)
+    results = []
+    for receipt_id, phone_number in pairs:
+        stored = digits.get(receipt_id)
+        if stored is None:
+            status = NOT_FOUND
+        elif normalize_phone(phone_number) == stored:
+            status = VERIFIED
+        else:
+            status = PHONE_MISMATCH
+        results.append({"receipt_id": receipt_id, "match": status == VERIFIED, "status": status})
+    return results
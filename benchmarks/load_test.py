@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""Load-test the receipt service against a local Supabase stand-in.
+
+    python benchmarks/load_test.py --concurrency 1 8 32 --duration 20 --latency 0.03 --json results.json
+    python benchmarks/load_test.py --json new.json --compare results.json --max-regression 0.2
+
+Starts fake_supabase.py in-process with the given injected latency, launches
+the app under uvicorn in a subprocess pointed at it, then drives
+verify -> download flows at each concurrency level. Throughput, p50/p95/p99
+latency and error counts are reported per endpoint, with the peak RSS of the
+server and its render workers per level. With --compare, exits non-zero when
+any endpoint's p95 or throughput regressed by more than --max-regression.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import threading
+import subprocess
+import tempfile
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_supabase import FakeSupabase, make_rows  # noqa: E402
+
+ENDPOINTS = ("verify", "download")
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# ---- Memory sampling -------------------------------------------------------
+
+def _rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _process_tree(root: int) -> list:
+    """root and all of its descendants, found by scanning /proc"""
+    parents = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # The command name may contain spaces; the parent pid follows its closing paren
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        parents.setdefault(ppid, []).append(int(name))
+    tree, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(parents.get(pid, ()))
+    return tree
+
+
+class RSSSampler:
+    """Background thread tracking the peak RSS of a process tree (Linux /proc only)"""
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.available = os.path.isdir("/proc")
+        self.peak_total = 0
+        self.peak_server = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def reset(self):
+        self.peak_total = 0
+        self.peak_server = 0
+
+    def sample(self):
+        tree = _process_tree(self.pid)
+        server = _rss_bytes(self.pid)
+        self.peak_server = max(self.peak_server, server)
+        self.peak_total = max(self.peak_total, server + sum(_rss_bytes(pid) for pid in tree[1:]))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        if self.available:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+
+# ---- Server lifecycle ------------------------------------------------------
+
+def start_server(args, supabase_url: str, port: int, cache_dir: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "SUPABASE_URL": supabase_url,
+        "PDF_ENGINE": args.engine,
+        "SHARED_CACHE_PATH": os.path.join(cache_dir, "cache.sqlite3"),
+        "REPORTS_PATH": os.path.join(cache_dir, "reports.sqlite3"),
+        "REPLICA_PATH": "",
+    })
+    if args.render_workers:
+        env["RENDER_WORKERS"] = str(args.render_workers)
+    if args.no_cache:
+        env.update({"PDF_CACHE_MEMORY_BYTES": "0", "PDF_CACHE_DISK_BYTES": "0", "RECEIPT_CACHE_SIZE": "0"})
+    if args.workers > 1:
+        env.update({"WEB_CONCURRENCY": str(args.workers), "BIND": f"127.0.0.1:{port}", "LOG_LEVEL": "warning"})
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"]
+    else:
+        command = [
+            sys.executable, "-m", "uvicorn", "app:app",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log",
+        ]
+    log = open(args.server_log or os.devnull, "ab")
+    try:
+        return subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    finally:
+        log.close()
+
+
+def wait_ready(base_url: str, server: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if httpx.get(f"{base_url}/health/ready", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+
+# ---- Load generation -------------------------------------------------------
+
+async def run_flow(client: httpx.AsyncClient, row: dict, record):
+    """One customer: verify the receipt, then download its PDF"""
+    form = {"phone_number": row["customer_phone"]}
+    path = f"/receipt/{row['receiptid']}"
+    for endpoint, url in (("verify", f"{path}/verify"), ("download", f"{path}/download")):
+        started = time.perf_counter()
+        try:
+            response = await client.post(url, data=form)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        record(endpoint, time.perf_counter() - started, ok)
+        if not ok:
+            return
+
+
+async def run_level(base_url: str, rows: list, concurrency: int, duration: float, record) -> int:
+    """Run closed-loop flows with a fixed number of concurrent users until the duration elapses"""
+    deadline = time.perf_counter() + duration
+    flows = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        async def user():
+            nonlocal flows
+            while time.perf_counter() < deadline:
+                await run_flow(client, random.choice(rows), record)
+                flows += 1
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+    return flows
+
+
+def summarize(samples: dict, elapsed: float) -> dict:
+    summary = {}
+    for endpoint in ENDPOINTS:
+        latencies = sorted(latency for latency, ok in samples[endpoint] if ok)
+        errors = sum(1 for _, ok in samples[endpoint] if not ok)
+        summary[endpoint] = {
+            "requests": len(samples[endpoint]),
+            "errors": errors,
+            "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        }
+    return summary
+
+
+def benchmark(args) -> dict:
+    random.seed(args.seed)
+    rows = make_rows(args.rows)
+    fake = FakeSupabase(rows, latency=args.latency)
+    fake_server = fake.serve()
+    supabase_url = f"http://127.0.0.1:{fake_server.server_address[1]}"
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    # Only a slice of the table is requested so cached paths see repeat traffic
+    hot_rows = rows[: args.distinct or len(rows)]
+
+    with tempfile.TemporaryDirectory(prefix="receipt-load-") as cache_dir:
+        server = start_server(args, supabase_url, port, cache_dir)
+        sampler = RSSSampler(server.pid)
+        try:
+            wait_ready(base_url, server)
+            sampler.start()
+            if args.warmup:
+                asyncio.run(run_level(base_url, hot_rows, max(args.concurrency), args.warmup, lambda *a: None))
+
+            levels = []
+            for concurrency in args.concurrency:
+                samples = {endpoint: [] for endpoint in ENDPOINTS}
+                sampler.reset()
+                requests_before = fake.requests
+                started = time.perf_counter()
+                flows = asyncio.run(run_level(
+                    base_url, hot_rows, concurrency, args.duration,
+                    lambda endpoint, latency, ok: samples[endpoint].append((latency, ok)),
+                ))
+                elapsed = time.perf_counter() - started
+                if sampler.available:
+                    sampler.sample()
+                level = {
+                    "concurrency": concurrency,
+                    "duration_s": round(elapsed, 2),
+                    "flows": flows,
+                    "flows_per_second": round(flows / elapsed, 2),
+                    "upstream_requests": fake.requests - requests_before,
+                    "peak_rss_mb": round(sampler.peak_total / 2 ** 20, 1) if sampler.available else None,
+                    "peak_server_rss_mb": round(sampler.peak_server / 2 ** 20, 1) if sampler.available else None,
+                    "endpoints": summarize(samples, elapsed),
+                }
+                levels.append(level)
+                print_level(level)
+        finally:
+            sampler.stop()
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            fake_server.shutdown()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "engine": args.engine,
+            "workers": args.workers,
+            "latency_s": args.latency,
+            "rows": args.rows,
+            "distinct": len(hot_rows),
+            "no_cache": args.no_cache,
+            "duration_s": args.duration,
+        },
+        "levels": levels,
+    }
+
+
+def print_level(level: dict):
+    rss = f", peak RSS {level['peak_rss_mb']} MB" if level["peak_rss_mb"] is not None else ""
+    print(f"concurrency {level['concurrency']}: {level['flows_per_second']} flows/s{rss}")
+    for endpoint, stats in level["endpoints"].items():
+        print(f"  {endpoint:>9}: {stats['throughput_rps']:>8} req/s  p50 {stats['p50_ms']:>8} ms  "
+              f"p95 {stats['p95_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms  errors {stats['errors']}")
+
+
+def compare(current: dict, baseline: dict, max_regression: float) -> int:
+    """Print per-endpoint changes against a previous run; non-zero when a regression exceeds the limit"""
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    status = 0
+    print(f"compared with {baseline.get('meta', {}).get('commit', '?')}:")
+    for level in current["levels"]:
+        old = previous.get(level["concurrency"])
+        if old is None:
+            continue
+        for endpoint, stats in level["endpoints"].items():
+            before = old["endpoints"].get(endpoint)
+            if not before:
+                continue
+            p95_change = stats["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+            rps_change = stats["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+            regressed = p95_change > max_regression or rps_change < -max_regression
+            flag = "  REGRESSION" if regressed else ""
+            print(f"  c={level['concurrency']:<4} {endpoint:>9}: p95 {p95_change:+.1%}, throughput {rps_change:+.1%}{flag}")
+            if regressed:
+                status = 1
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="concurrent users per level")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per level")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds of unrecorded traffic first")
+    parser.add_argument("--latency", type=float, default=0.03, help="seconds the fake Supabase adds per request")
+    parser.add_argument("--rows", type=int, default=2000, help="synthetic receipts to seed")
+    parser.add_argument("--distinct", type=int, default=200, help="receipts drawn from (0 = all rows)")
+    parser.add_argument("--engine", default=os.getenv("PDF_ENGINE", "weasyprint"), help="PDF engine to use")
+    parser.add_argument("--workers", type=int, default=1, help="web workers; more than 1 runs gunicorn.conf.py")
+    parser.add_argument("--render-workers", type=int, help="RENDER_WORKERS for each web worker")
+    parser.add_argument("--no-cache", action="store_true", help="disable the PDF and receipt caches")
+    parser.add_argument("--server-log", help="append the server's output to this file")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed relative p95/throughput change")
+    args = parser.parse_args()
+
+    results = benchmark(args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            return compare(results, json.load(f), args.max_regression)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
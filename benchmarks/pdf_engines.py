@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Benchmark the WeasyPrint and native PDF engines and diff their output visually.
+
+    python benchmarks/pdf_engines.py --iterations 50 --max-diff 0.08 --out /tmp/engine-diff
+
+Exits non-zero when the share of differing pixels exceeds --max-diff.
+Rasterizing needs pypdfium2 and Pillow; without them only timings are reported.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import renderer  # noqa: E402
+from models import Receipt  # noqa: E402
+
+# Share of differing pixels the native engine may show against WeasyPrint (also tests/test_pdf_engines.py)
+MAX_DIFF = 0.08
+
+SAMPLE_RECEIPT = Receipt.from_row({
+    "id": 3,
+    "created_at": "2025-06-08T17:26:51.388101+00:00",
+    "transaction_id": 621,
+    "receiptid": "NG000337",
+    "transaction_date": "2025-06-08T00:00:00",
+    "customer_name": "Rahul Sharma",
+    "customer_phone": "9800000011",
+    "shift": "4th shift (12am to 6am)",
+    "payment_mode": "Cash",
+    "payment_amount": 1500,
+    "joining_date": "2025-06-08",
+    "expiration_date": "2025-07-08",
+    "plantype": "Monthly",
+})
+
+
+def time_engine(engine: str, iterations: int) -> dict:
+    timings = []
+    pdf = b""
+    for _ in range(iterations):
+        started = time.perf_counter()
+        pdf = renderer._render_pdf(SAMPLE_RECEIPT, engine)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "engine": engine,
+        "iterations": iterations,
+        "mean_ms": round(statistics.mean(timings), 2),
+        "p50_ms": round(timings[len(timings) // 2], 2),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        "bytes": len(pdf),
+        "pdf": pdf,
+    }
+
+
+def rasterize(pdf: bytes, scale: float):
+    import pypdfium2
+
+    page = pypdfium2.PdfDocument(pdf)[0]
+    return page.render(scale=scale).to_pil().convert("L")
+
+
+def visual_diff(first: bytes, second: bytes, scale: float, out_dir: str = None) -> dict:
+    """Share of pixels whose grey level differs by more than 32 after rasterizing both PDFs"""
+    from PIL import Image, ImageChops
+
+    a, b = rasterize(first, scale), rasterize(second, scale)
+    if a.size != b.size:
+        b = b.resize(a.size)
+    diff = ImageChops.difference(a, b)
+    histogram = diff.histogram()
+    total = a.size[0] * a.size[1]
+    differing = sum(histogram[33:])
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+        a.save(os.path.join(out_dir, "weasyprint.png"))
+        b.save(os.path.join(out_dir, "native.png"))
+        Image.eval(diff, lambda v: 255 - v).save(os.path.join(out_dir, "diff.png"))
+    return {
+        "differing_pixels": round(differing / total, 4),
+        "mean_abs_diff": round(sum(i * n for i, n in enumerate(histogram)) / total, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--scale", type=float, default=1.0, help="rasterization scale (1.0 = 72 dpi)")
+    parser.add_argument("--max-diff", type=float, default=MAX_DIFF, help="allowed share of differing pixels")
+    parser.add_argument("--out", help="directory for rendered PDFs and diff images")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    renderer._init_worker(renderer.TEMPLATE_DIR, renderer.PDF_TEMPLATE, os.path.dirname(renderer.TEMPLATE_DIR))
+    engines = [engine for engine in renderer.ENGINES if engine != "native" or renderer._native is not None]
+    if renderer._HTML is None:
+        engines.remove("weasyprint")
+
+    results = {}
+    for engine in engines:
+        result = time_engine(engine, args.iterations)
+        pdf = result.pop("pdf")
+        results[engine] = result
+        results[engine]["_pdf"] = pdf
+        print(f"{engine:>10}: mean {result['mean_ms']} ms, p50 {result['p50_ms']} ms, "
+              f"p95 {result['p95_ms']} ms, {result['bytes']} bytes")
+        if args.out:
+            os.makedirs(args.out, exist_ok=True)
+            with open(os.path.join(args.out, f"{engine}.pdf"), "wb") as f:
+                f.write(pdf)
+
+    status = 0
+    summary = {engine: {k: v for k, v in r.items() if k != "_pdf"} for engine, r in results.items()}
+    if len(results) == 2:
+        summary["speedup"] = round(results["weasyprint"]["mean_ms"] / results["native"]["mean_ms"], 1)
+        print(f"native speedup: {summary['speedup']}x")
+        try:
+            diff = visual_diff(results["weasyprint"]["_pdf"], results["native"]["_pdf"], args.scale, args.out)
+        except ImportError as e:
+            print(f"visual diff skipped: {e}")
+        else:
+            summary["visual_diff"] = diff
+            print(f"visual diff: {diff['differing_pixels']:.2%} pixels differ (mean {diff['mean_abs_diff']})")
+            if diff["differing_pixels"] > args.max_diff:
+                print(f"FAIL: more than {args.max_diff:.2%} of pixels differ")
+                status = 1
+    else:
+        print("only one engine available; visual diff skipped")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
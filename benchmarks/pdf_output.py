@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Compare PDF size and render time across the output quality presets.
+
+    python benchmarks/pdf_output.py --iterations 20 --batch 50 --json pdf_output.json
+
+For each available engine and preset it reports the PDF size, bytes saved
+against the "original" baseline, the first render (which prepares that
+preset's images) and the median warm render. It also compares a bulk
+export of --batch receipts as separate PDFs with one combined PDF, where
+the shared logo and signature are embedded once.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import renderer  # noqa: E402
+from pdf_output import PRESETS, BASELINE_QUALITY, bytes_saved  # noqa: E402
+from pdf_engines import SAMPLE_RECEIPT  # noqa: E402
+
+
+def measure(engine: str, quality: str, iterations: int, batch: int) -> dict:
+    started = time.perf_counter()
+    pdf = renderer._render_pdf(SAMPLE_RECEIPT, engine, quality)
+    first_ms = (time.perf_counter() - started) * 1000
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        renderer._render_pdf(SAMPLE_RECEIPT, engine, quality)
+        timings.append((time.perf_counter() - started) * 1000)
+    combined = renderer._render_documents([SAMPLE_RECEIPT] * batch, engine, quality)
+    return {
+        "engine": engine,
+        "quality": quality,
+        "bytes": len(pdf),
+        "first_ms": round(first_ms, 1),
+        "warm_ms": round(statistics.median(timings), 2),
+        "batch_separate_bytes": len(pdf) * batch,
+        "batch_combined_bytes": len(combined),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20, help="warm renders per engine and preset")
+    parser.add_argument("--batch", type=int, default=50, help="receipts in the bulk export comparison")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    renderer._init_worker(renderer.TEMPLATE_DIR, renderer.PDF_TEMPLATE, os.path.dirname(renderer.TEMPLATE_DIR))
+    engines = [engine for engine in renderer.ENGINES if engine != "native" or renderer._native is not None]
+    if renderer._HTML is None:
+        engines.remove("weasyprint")
+
+    results = []
+    for engine in engines:
+        rows = [measure(engine, quality, args.iterations, args.batch) for quality in PRESETS]
+        baseline = next(row["bytes"] for row in rows if row["quality"] == BASELINE_QUALITY)
+        for row in rows:
+            row["bytes_saved"] = bytes_saved(baseline, row["bytes"])
+        results.extend(rows)
+
+    print(f"{'engine':<11} {'quality':<9} {'bytes':>8} {'saved':>8} {'first ms':>9} {'warm ms':>8} "
+          f"{f'{args.batch} separate':>13} {f'{args.batch} combined':>13}")
+    for r in results:
+        print(
+            f"{r['engine']:<11} {r['quality']:<9} {r['bytes']:>8} {r['bytes_saved']:>8} {r['first_ms']:>9} "
+            f"{r['warm_ms']:>8} {r['batch_separate_bytes']:>13} {r['batch_combined_bytes']:>13}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
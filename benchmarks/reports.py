@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Compare a revenue report computed from every receipt with one read from the daily rollups.
+
+    python benchmarks/reports.py --rows 100000 --iterations 20 --json reports.json
+
+Synthetic receipts (fake_supabase.make_rows) are aggregated once into a
+temporary rollup database. Each iteration then answers the same report
+twice: by scanning and grouping every row, as the spreadsheet export did,
+and from the rollups. It also times adding 1% more rows incrementally.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from collections import defaultdict
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_supabase import make_rows  # noqa: E402
+from reports import RevenueRollups, aggregate  # noqa: E402
+
+GROUP_BY = ["month", "shift", "plantype", "payment_mode"]
+
+
+def scan(rows, start: str, end: str) -> dict:
+    totals = defaultdict(lambda: [0, 0])
+    for row in rows:
+        day = row["transaction_date"][:10]
+        if start <= day <= end:
+            key = (day[:7], row["shift"], row["plantype"], row["payment_mode"])
+            totals[key][0] += 1
+            totals[key][1] += row["payment_amount"]
+    active = sum(1 for row in rows if row["joining_date"] <= end and row["expiration_date"] >= start)
+    return {"groups": len(totals), "active": active}
+
+
+def median_ms(fn, iterations: int) -> float:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="synthetic receipts")
+    parser.add_argument("--iterations", type=int, default=20, help="timed runs per method")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    start, end = date(2025, 2, 1), date(2025, 11, 30)
+    with tempfile.TemporaryDirectory() as directory:
+        rollups = RevenueRollups(os.path.join(directory, "reports.sqlite3"), cache_path=None)
+
+        started = time.perf_counter()
+        revenue, memberships = {}, {}
+        aggregate(rows, revenue, memberships)
+        rollups._apply(revenue, memberships, 0, args.rows, rebuild=True)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        extra = make_rows(max(1, args.rows // 100), start=args.rows + 1)
+        started = time.perf_counter()
+        revenue, memberships = {}, {}
+        aggregate(extra, revenue, memberships)
+        rollups._apply(revenue, memberships, args.rows, args.rows + len(extra), rebuild=False)
+        incremental_ms = (time.perf_counter() - started) * 1000
+        rows += extra
+
+        results = {
+            "rows": len(rows),
+            "build_ms": round(build_ms, 1),
+            "incremental_rows": len(extra),
+            "incremental_ms": round(incremental_ms, 1),
+            "scan_ms": median_ms(lambda: scan(rows, start.isoformat(), end.isoformat()), args.iterations),
+            "rollup_ms": median_ms(lambda: rollups._report(start, end, GROUP_BY), args.iterations),
+        }
+        rollups.close()
+
+    for name, value in results.items():
+        print(f"{name:<18} {value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Measure cold start: time to the first /health answer and where import time goes.
+
+    python benchmarks/startup.py --runs 5 --json startup.json
+
+Each run launches the app under uvicorn (against fake_supabase.py) and polls
+until /health/live answers, then until /health/ready does; both are timed
+from process spawn. Servers without the probes are timed on /health instead.
+The import breakdown comes from `python -X importtime -c "import app"` and
+lists the modules app.py imports directly, by cumulative time.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_supabase  # noqa: E402
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def server_env(supabase_url: str, cache_dir: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "SUPABASE_URL": supabase_url,
+        "SHARED_CACHE_PATH": os.path.join(cache_dir, "cache.sqlite3"),
+        "REPORTS_PATH": os.path.join(cache_dir, "reports.sqlite3"),
+        "REPLICA_PATH": "",
+    })
+    return env
+
+
+def import_breakdown(env: dict, top: int) -> dict:
+    """Self and cumulative import time of app and the modules it imports directly"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    modules = []
+    total = None
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        if name == "app" and not indent:
+            total = {"self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000}
+        elif len(indent) == 2:
+            modules.append({"module": name, "cumulative_ms": int(cumulative_us) / 1000})
+    modules.sort(key=lambda m: m["cumulative_ms"], reverse=True)
+    return {"app": total, "modules": modules[:top]}
+
+
+def poll(client: httpx.Client, url: str, server: subprocess.Popen, started: float, timeout: float):
+    """Seconds from spawn until url answers 200, or None when it answers 404"""
+    deadline = started + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            status = client.get(url, timeout=1.0).status_code
+            if status == 200:
+                return time.monotonic() - started
+            if status == 404:
+                return None
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"{url} did not answer within {timeout}s")
+
+
+def measure_run(env: dict, port: int, timeout: float) -> dict:
+    base_url = f"http://127.0.0.1:{port}"
+    command = [
+        sys.executable, "-m", "uvicorn", "app:app",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log",
+    ]
+    started = time.monotonic()
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client() as client:
+            live = poll(client, f"{base_url}/health/live", server, started, timeout)
+            if live is None:
+                live = ready = poll(client, f"{base_url}/health", server, started, timeout)
+            else:
+                ready = poll(client, f"{base_url}/health/ready", server, started, timeout)
+    finally:
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return {"live_s": live, "ready_s": ready}
+
+
+def free_port() -> int:
+    import socket
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="cold starts to time")
+    parser.add_argument("--top", type=int, default=12, help="modules listed in the import breakdown")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for each probe")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    fake = fake_supabase.FakeSupabase(fake_supabase.make_rows(100))
+    server = fake.serve()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = server_env(f"http://127.0.0.1:{server.server_address[1]}", cache_dir)
+        breakdown = import_breakdown(env, args.top)
+        runs = [measure_run(env, free_port(), args.timeout) for _ in range(args.runs)]
+    server.shutdown()
+
+    live = sorted(run["live_s"] for run in runs)
+    ready = sorted(run["ready_s"] for run in runs)
+    results = {
+        "runs": runs,
+        "live_median_s": round(statistics.median(live), 3),
+        "ready_median_s": round(statistics.median(ready), 3),
+        "imports": breakdown,
+    }
+
+    app_import = breakdown["app"] or {}
+    print(f"import app: {app_import.get('cumulative_ms', 0):.1f} ms ({app_import.get('self_ms', 0):.1f} ms in app.py itself)")
+    for module in breakdown["modules"]:
+        print(f"  {module['module']:<28} {module['cumulative_ms']:>8.1f} ms")
+    print(f"first /health/live: median {results['live_median_s'] * 1000:.0f} ms over {len(runs)} runs")
+    print(f"first /health/ready: median {results['ready_median_s'] * 1000:.0f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
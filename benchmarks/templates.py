@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Measure per-render template cost: compiling, loading from the bytecode cache, and rendering.
+
+    python benchmarks/templates.py --iterations 500 --json templates.json
+
+For each receipt template it reports the time to compile from source, the
+time to load it in a fresh process-like environment from a warm bytecode
+cache, and per-render cost as one string (render) versus streamed chunks
+(generate), including time to the first chunk.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from renderer import WARMUP_RECEIPT  # noqa: E402
+from templating import environment, _chunks, TEMPLATE_STREAM_CHUNK  # noqa: E402
+
+TEMPLATES = ("receipt_display.html", "receipt_display2.html")
+
+
+def fresh_env(cache_dir: str):
+    env = environment(cache_dir=cache_dir)
+    env.globals["static_url"] = lambda path: "/static/" + path
+    return env
+
+
+def load_ms(cache_dir: str, name: str, iterations: int) -> float:
+    """Median time for a new environment to produce the compiled template"""
+    timings = []
+    for _ in range(iterations):
+        env = fresh_env(cache_dir)
+        started = time.perf_counter()
+        env.get_template(name)
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def render_ms(template, context: dict, iterations: int, chunk_size: int) -> dict:
+    whole, streamed, first = [], [], []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        template.render(context)
+        whole.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        chunks = _chunks(template, context, chunk_size)
+        next(chunks)
+        first.append((time.perf_counter() - started) * 1000)
+        for _ in chunks:
+            pass
+        streamed.append((time.perf_counter() - started) * 1000)
+    return {
+        "render_ms": round(statistics.median(whole), 3),
+        "stream_total_ms": round(statistics.median(streamed), 3),
+        "stream_first_chunk_ms": round(statistics.median(first), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=500, help="renders per template")
+    parser.add_argument("--loads", type=int, default=30, help="fresh-environment loads per template")
+    parser.add_argument("--chunk", type=int, default=TEMPLATE_STREAM_CHUNK, help="characters per streamed chunk")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    context = {"receipt": WARMUP_RECEIPT, "receipt_id": WARMUP_RECEIPT.receiptid}
+    results = []
+    with tempfile.TemporaryDirectory() as empty, tempfile.TemporaryDirectory() as warm:
+        for name in TEMPLATES:
+            # A fresh cache directory every time, so each load compiles from source
+            compile_ms = []
+            for _ in range(args.loads):
+                with tempfile.TemporaryDirectory(dir=empty) as cold:
+                    env = fresh_env(cold)
+                    started = time.perf_counter()
+                    env.get_template(name)
+                    compile_ms.append((time.perf_counter() - started) * 1000)
+            fresh_env(warm).get_template(name)
+            template = fresh_env(warm).get_template(name)
+            html = template.render(context)
+            results.append({
+                "template": name,
+                "bytes": len(html.encode()),
+                "chunks": sum(1 for _ in _chunks(template, context, args.chunk)),
+                "compile_ms": round(statistics.median(compile_ms), 3),
+                "bytecode_load_ms": load_ms(warm, name, args.loads),
+                **render_ms(template, context, args.iterations, args.chunk),
+            })
+
+    print(f"{'template':<24} {'bytes':>7} {'chunks':>6} {'compile':>8} {'bc load':>8} {'render':>7} {'stream':>7} {'first':>7}  (ms)")
+    for r in results:
+        print(
+            f"{r['template']:<24} {r['bytes']:>7} {r['chunks']:>6} {r['compile_ms']:>8} {r['bytecode_load_ms']:>8} "
+            f"{r['render_ms']:>7} {r['stream_total_ms']:>7} {r['stream_first_chunk_ms']:>7}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
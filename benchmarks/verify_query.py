@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Compare the receipt verification query before and after server-side phone matching.
+
+    python benchmarks/verify_query.py --latency 0.02 --iterations 200
+
+"before" selects every column by receiptid and compares phones in Python;
+"after" is ReceiptDatabase's lookup, which projects RECEIPT_COLUMNS and filters
+on the stored digits column; only a miss follows up with an ID-only probe
+that tells a wrong phone from an unknown receipt.
+Runs against the fake Supabase, so payload sizes reflect its column set.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_supabase  # noqa: E402
+from models import Receipt, normalize_phone  # noqa: E402
+
+CASES = ("match", "wrong_phone", "unknown_id")
+
+
+async def before(rest, receipt_id: str, phone_digits: str):
+    rows = await rest.select("receipts", {"receiptid": receipt_id}, limit=1)
+    receipt = Receipt.from_row(rows[0]) if rows else None
+    if receipt is None:
+        return False, None
+    return True, receipt if receipt.phone_digits == phone_digits else None
+
+
+def case_args(case: str, rows: list, rng: random.Random):
+    row = rng.choice(rows)
+    if case == "match":
+        return row["receiptid"], normalize_phone(row["customer_phone"])
+    if case == "wrong_phone":
+        return row["receiptid"], "1234567890"
+    return "XX" + row["receiptid"], normalize_phone(row["customer_phone"])
+
+
+async def measure(name: str, lookup, rest, case: str, rows: list, iterations: int, seed: int) -> dict:
+    wire = {"requests": 0, "bytes": 0}
+
+    async def count(response):
+        wire["requests"] += 1
+        wire["bytes"] += int(response.headers.get("content-length", 0))
+
+    rest.client.event_hooks["response"] = [count]
+    rng = random.Random(seed)
+    timings = []
+    for _ in range(iterations):
+        receipt_id, phone = case_args(case, rows, rng)
+        started = time.perf_counter()
+        exists, receipt = await lookup(rest, receipt_id, phone)
+        timings.append((time.perf_counter() - started) * 1000)
+        expected = {"match": (True, True), "wrong_phone": (True, False), "unknown_id": (False, False)}[case]
+        assert (exists, receipt is not None) == expected, (name, case, receipt_id)
+    timings.sort()
+    return {
+        "query": name,
+        "case": case,
+        "requests_per_lookup": round(wire["requests"] / iterations, 2),
+        "bytes_per_lookup": round(wire["bytes"] / iterations, 1),
+        "mean_ms": round(statistics.mean(timings), 2),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+    }
+
+
+async def run(args) -> list:
+    rows = fake_supabase.make_rows(args.rows)
+    server = fake_supabase.FakeSupabase(rows, latency=args.latency).serve()
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    # create_client only checks that the key is JWT-shaped
+    os.environ.setdefault("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.benchmark")
+    from database import ReceiptDatabase
+
+    db = ReceiptDatabase()
+
+    async def after(rest, receipt_id: str, phone_digits: str):
+        return await db._afetch_verified(receipt_id, phone_digits)
+
+    results = []
+    for case in CASES:
+        for name, lookup in (("before", before), ("after", after)):
+            results.append(await measure(name, lookup, db.rest, case, rows, args.iterations, args.seed))
+    await db.aclose()
+    server.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000, help="synthetic receipts to seed")
+    parser.add_argument("--iterations", type=int, default=200, help="lookups per query and case")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the fake Supabase adds per request")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"{'case':<12} {'query':<7} {'requests':>9} {'bytes':>8} {'mean ms':>8} {'p95 ms':>8}")
+    for r in results:
+        print(
+            f"{r['case']:<12} {r['query']:<7} {r['requests_per_lookup']:>9} {r['bytes_per_lookup']:>8} "
+            f"{r['mean_ms']:>8} {r['p95_ms']:>8}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
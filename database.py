@@ -1,55 +1,166 @@
 import os
 import logging
-from typing import Optional, List
-from supabase import create_client, Client
-from models import Receipt
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional, List, Tuple
+from models import Receipt, normalize_phone, RECEIPT_COLUMNS, PHONE_DIGITS_COLUMN
+from receipt_cache import receipt_cache
+from async_db import AsyncPostgrest, PostgrestError, UNDEFINED_COLUMN
+from resilience import UPSTREAM_ATTEMPT_TIMEOUT, supabase_upstream
+from replica import ReceiptReplica
+from batch_verify import verify_pairs
+from metrics import stage
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 logger = logging.getLogger(__name__)
 
+# Verified lookups fetch the whole row: it is cached under the same key get_receipt_by_id reads
+RECEIPT_SELECT = ",".join(RECEIPT_COLUMNS)
+
+# Cleared once the database rejects PHONE_DIGITS_COLUMN (sql/receipts_phone_digits.sql not applied);
+# lookups then fetch by receiptid and compare phones in Python
+_phone_column_available = bool(PHONE_DIGITS_COLUMN)
+
+
+def _phone_column_missing(error: Exception):
+    global _phone_column_available
+    _phone_column_available = False
+    logger.error(f"Phone filter on {PHONE_DIGITS_COLUMN} failed, matching phones in Python from now on: {error}")
+
+
+def _match_phone(row: Optional[dict], phone_digits: str) -> Tuple[bool, Optional[Receipt]]:
+    """(exists, receipt) for a row fetched by receiptid alone"""
+    receipt = Receipt.from_row(row) if row else None
+    if receipt is None:
+        return False, None
+    return True, receipt if receipt.phone_digits == phone_digits else None
+
+
+async def fetch_verified(
+    rest: AsyncPostgrest, replica: Optional[ReceiptReplica], receipt_id: str, phone_digits: str
+) -> Tuple[bool, Optional[Receipt]]:
+    """(exists, receipt) with the phone matched by the replica or database; used on receipt cache misses"""
+    if replica:
+        with stage("replica"):
+            row = replica.get_verified(receipt_id, phone_digits)
+            exists = row is not None or replica.exists(receipt_id)
+        if row:
+            return True, Receipt.from_row(row)
+        if exists:
+            return True, None
+    with stage("db"):
+        if _phone_column_available:
+            try:
+                rows = await rest.select(
+                    "receipts", {"receiptid": receipt_id, PHONE_DIGITS_COLUMN: phone_digits},
+                    columns=RECEIPT_SELECT, limit=1,
+                )
+                if rows:
+                    return True, Receipt.from_row(rows[0])
+                # Only a miss pays for the ID-only probe that tells a wrong phone from an unknown receipt
+                ids = await rest.select("receipts", {"receiptid": receipt_id}, columns="receiptid", limit=1)
+                return bool(ids), None
+            except PostgrestError as e:
+                if e.code != UNDEFINED_COLUMN:
+                    raise
+                _phone_column_missing(e)
+        rows = await rest.select("receipts", {"receiptid": receipt_id}, columns=RECEIPT_SELECT, limit=1)
+    return _match_phone(rows[0] if rows else None, phone_digits)
+
+
 class ReceiptDatabase:
     """Database interface for receipt operations"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        token_provider: Optional[Callable[[], Awaitable[Optional[str]]]] = None,
+        replica: Optional[ReceiptReplica] = None,
+    ):
+        self.replica = replica
         self.supabase_url = os.getenv("SUPABASE_URL", "")
         self.supabase_key = os.getenv("SUPABASE_KEY", "")
         
         if not self.supabase_url or not self.supabase_key:
             logger.warning("Supabase credentials not found in environment variables")
-            self.client: Optional[Client] = None
+            self.client: Optional["Client"] = None
+            self.rest: Optional[AsyncPostgrest] = None
         else:
-            self.client: Client = create_client(self.supabase_url, self.supabase_key)
+            from supabase import create_client, ClientOptions
+
+            # The client timeout bounds each attempt; supabase_upstream adds retries and the breaker
+            self.client: "Client" = create_client(
+                self.supabase_url,
+                self.supabase_key,
+                options=ClientOptions(postgrest_client_timeout=UPSTREAM_ATTEMPT_TIMEOUT),
+            )
+            # Pooled async access for use from event-loop code
+            self.rest = AsyncPostgrest(self.supabase_url, self.supabase_key, token_provider)
     
+    def _fetch_row(self, receipt_id: str) -> Optional[Receipt]:
+        """Query a single receipt; used on receipt cache misses"""
+        if self.replica:
+            row = self.replica.get(receipt_id)
+            if row:
+                return Receipt.from_row(row)
+        query = self.client.table("receipts").select(RECEIPT_SELECT).eq("receiptid", receipt_id)
+        response = supabase_upstream.call_sync(query.execute)
+        return Receipt.from_row(response.data[0]) if response.data else None
+
     def get_receipt_by_id(self, receipt_id: str) -> Optional[Receipt]:
         """Get receipt by ID"""
         if not self.client:
             return None
         
         try:
-            response = self.client.table("receipts").select("*").eq("receipt_id", receipt_id).execute()
-            
-            if response.data:
-                return Receipt.from_dict(response.data[0])
-            return None
+            return receipt_cache.fetch_sync(receipt_id, self._fetch_row)
             
         except Exception as e:
             logger.error(f"Error fetching receipt {receipt_id}: {str(e)}")
             return None
     
+    def _fetch_verified(self, receipt_id: str, phone_digits: str) -> Tuple[bool, Optional[Receipt]]:
+        """Blocking version of fetch_verified; used on cache misses"""
+        from postgrest.exceptions import APIError
+
+        if self.replica:
+            row = self.replica.get_verified(receipt_id, phone_digits)
+            if row:
+                return True, Receipt.from_row(row)
+            if self.replica.exists(receipt_id):
+                return True, None
+
+        def by_id(columns: str):
+            return self.client.table("receipts").select(columns).eq("receiptid", receipt_id).limit(1)
+
+        if _phone_column_available:
+            try:
+                response = supabase_upstream.call_sync(by_id(RECEIPT_SELECT).eq(PHONE_DIGITS_COLUMN, phone_digits).execute)
+                if response.data:
+                    return True, Receipt.from_row(response.data[0])
+                response = supabase_upstream.call_sync(by_id("receiptid").execute)
+                return bool(response.data), None
+            except APIError as e:
+                if e.code != UNDEFINED_COLUMN:
+                    raise
+                _phone_column_missing(e)
+        response = supabase_upstream.call_sync(by_id(RECEIPT_SELECT).execute)
+        return _match_phone(response.data[0] if response.data else None, phone_digits)
+
     def verify_receipt_phone(self, receipt_id: str, phone_number: str) -> Optional[Receipt]:
         """Verify receipt ID and phone number combination"""
-        receipt = self.get_receipt_by_id(receipt_id)
-        
-        if not receipt:
+        if not self.client:
             return None
         
-        # Clean both phone numbers for comparison
-        cleaned_input_phone = ''.join(filter(str.isdigit, phone_number))
-        cleaned_stored_phone = ''.join(filter(str.isdigit, receipt.customer_phone))
-        
-        if cleaned_input_phone == cleaned_stored_phone:
+        try:
+            # Phones are compared as digits only; on cache misses the database does the matching
+            _, receipt = receipt_cache.fetch_verified_sync(
+                receipt_id, normalize_phone(phone_number), self._fetch_verified
+            )
             return receipt
-        
-        return None
+            
+        except Exception as e:
+            logger.error(f"Error verifying receipt {receipt_id}: {str(e)}")
+            return None
     
     def create_receipt(self, receipt: Receipt) -> bool:
         """Create a new receipt (for testing purposes)"""
@@ -57,13 +168,82 @@ class ReceiptDatabase:
             return False
         
         try:
-            response = self.client.table("receipts").insert(receipt.to_dict()).execute()
+            insert = self.client.table("receipts").insert(receipt.to_dict())
+            response = supabase_upstream.call_sync(insert.execute, idempotent=False)
+            self.invalidate_receipt(receipt.receiptid)
             return len(response.data) > 0
             
         except Exception as e:
             logger.error(f"Error creating receipt: {str(e)}")
             return False
     
+    async def _afetch_row(self, receipt_id: str) -> Optional[Receipt]:
+        if self.replica:
+            row = self.replica.get(receipt_id)
+            if row:
+                return Receipt.from_row(row)
+        rows = await self.rest.select("receipts", {"receiptid": receipt_id}, columns=RECEIPT_SELECT, limit=1)
+        return Receipt.from_row(rows[0]) if rows else None
+
+    async def aget_receipt_by_id(self, receipt_id: str) -> Optional[Receipt]:
+        """Coroutine version of get_receipt_by_id"""
+        if not self.rest:
+            return None
+        
+        try:
+            return await receipt_cache.fetch(receipt_id, self._afetch_row)
+            
+        except Exception as e:
+            logger.error(f"Error fetching receipt {receipt_id}: {str(e)}")
+            return None
+    
+    async def _afetch_verified(self, receipt_id: str, phone_digits: str) -> Tuple[bool, Optional[Receipt]]:
+        return await fetch_verified(self.rest, self.replica, receipt_id, phone_digits)
+
+    async def averify_receipt_phone(self, receipt_id: str, phone_number: str) -> Optional[Receipt]:
+        """Coroutine version of verify_receipt_phone"""
+        if not self.rest:
+            return None
+        
+        try:
+            _, receipt = await receipt_cache.fetch_verified(
+                receipt_id, normalize_phone(phone_number), self._afetch_verified
+            )
+            return receipt
+            
+        except Exception as e:
+            logger.error(f"Error verifying receipt {receipt_id}: {str(e)}")
+            return None
+    
+    async def averify_receipts(self, pairs: List[Tuple[str, str]]) -> List[dict]:
+        """Verify many (receipt ID, phone) pairs with chunked in_ queries; see batch_verify.verify_pairs"""
+        if not self.rest:
+            return []
+        return await verify_pairs(pairs, self.rest, self.replica)
+
+    async def acreate_receipt(self, receipt: Receipt) -> bool:
+        """Coroutine version of create_receipt"""
+        if not self.rest:
+            return False
+        
+        try:
+            rows = await self.rest.insert("receipts", receipt.to_dict())
+            self.invalidate_receipt(receipt.receiptid)
+            return len(rows) > 0
+            
+        except Exception as e:
+            logger.error(f"Error creating receipt: {str(e)}")
+            return False
+    
+    async def aclose(self):
+        """Close pooled async connections"""
+        if self.rest:
+            await self.rest.aclose()
+    
+    def invalidate_receipt(self, receipt_id: str):
+        """Drop a cached receipt row (or cached "not found") after it changes"""
+        receipt_cache.invalidate(receipt_id)
+    
     def is_connected(self) -> bool:
         """Check if database connection is available"""
         return self.client is not None
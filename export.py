@@ -0,0 +1,216 @@
+import os
+import re
+import asyncio
+import logging
+import zipfile
+from collections import deque
+from datetime import date, timedelta
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Set
+
+from models import Receipt, RECEIPT_COLUMNS
+from async_db import in_filter
+from renderer import RendererBusy
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "50"))
+EXPORT_MAX_IDS = int(os.getenv("EXPORT_MAX_IDS", "5000"))
+RECEIPT_SELECT = ",".join(RECEIPT_COLUMNS)
+# Attempts per render while the pool is busy, with exponential backoff between them;
+# a render that never gets a slot is listed in errors.txt instead of stalling the export
+EXPORT_RENDER_ATTEMPTS = max(1, int(os.getenv("EXPORT_RENDER_ATTEMPTS", "8")))
+EXPORT_RETRY_DELAY = float(os.getenv("EXPORT_RETRY_DELAY", "0.1"))
+EXPORT_RETRY_MAX_DELAY = float(os.getenv("EXPORT_RETRY_MAX_DELAY", "2.0"))
+
+UNSAFE_NAME = re.compile(r"[^A-Za-z0-9_-]")
+
+
+def entry_name(stem: str, used: Set[str]) -> str:
+    """Archive member name built from [A-Za-z0-9_-] only, unique within the archive"""
+    safe = UNSAFE_NAME.sub("_", stem)[:100]
+    name, copy = f"{safe}.pdf", 1
+    while name in used:
+        copy += 1
+        name = f"{safe}_{copy}.pdf"
+    used.add(name)
+    return name
+
+
+async def render_with_retries(render: Callable[..., Awaitable[bytes]], *args) -> bytes:
+    """render(*args), backing off while the pool is busy; RendererBusy once the attempts run out"""
+    for attempt in range(EXPORT_RENDER_ATTEMPTS - 1):
+        try:
+            return await render(*args)
+        except RendererBusy:
+            await asyncio.sleep(min(EXPORT_RETRY_MAX_DELAY, EXPORT_RETRY_DELAY * 2 ** attempt))
+    return await render(*args)
+
+
+def failure(receipt_id: str, error: Exception) -> str:
+    return f"{receipt_id}: {'renderer busy' if isinstance(error, RendererBusy) else 'render failed'}"
+
+
+class ZipStream:
+    """Write-only file object that lets zipfile stream an archive chunk by chunk"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def iter_receipts_by_ids(rest, receipt_ids: List[str], batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List[Receipt]]:
+    """Yield receipts for the given IDs, one in_ query per batch"""
+    for start in range(0, len(receipt_ids), batch_size):
+        chunk = receipt_ids[start:start + batch_size]
+        rows = await rest.select("receipts", columns=RECEIPT_SELECT, params=[("receiptid", in_filter(chunk))])
+        yield Receipt.from_rows(rows)
+
+
+async def iter_receipts_by_date(rest, start: date, end: date, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List[Receipt]]:
+    """Yield receipts with transaction_date in [start, end], paged by id"""
+    last_id = 0
+    while True:
+        rows = await rest.select(
+            "receipts",
+            columns=RECEIPT_SELECT,
+            limit=batch_size,
+            params=[
+                ("transaction_date", f"gte.{start.isoformat()}"),
+                ("transaction_date", f"lt.{(end + timedelta(days=1)).isoformat()}"),
+                ("id", f"gt.{last_id}"),
+                ("order", "id.asc"),
+            ],
+        )
+        if not rows:
+            return
+        yield Receipt.from_rows(rows)
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+async def stream_receipts_zip(
+    batches: AsyncIterator[List[Receipt]],
+    render: Callable[[Receipt], Awaitable[bytes]],
+    concurrency: int,
+    requested_ids: Optional[List[str]] = None,
+) -> AsyncIterator[bytes]:
+    """Render each batch in parallel and stream the ZIP as PDFs finish"""
+    sink = ZipStream()
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    failures = []
+    seen = set()
+    names = set()
+
+    async def render_one(receipt: Receipt):
+        async with semaphore:
+            try:
+                return receipt, await render_with_retries(render, receipt)
+            except Exception as e:
+                return receipt, e
+
+    tasks = []
+    try:
+        async for receipts in batches:
+            tasks = [asyncio.create_task(render_one(receipt)) for receipt in receipts]
+            for next_result in asyncio.as_completed(tasks):
+                receipt, result = await next_result
+                receipt_id = receipt.receiptid or str(receipt.id)
+                seen.add(receipt_id)
+                if isinstance(result, Exception):
+                    logger.error(f"Export render failed for {receipt_id}: {result}")
+                    failures.append(failure(receipt_id, result))
+                    continue
+                archive.writestr(entry_name(f"receipt_{receipt_id}", names), result)
+                yield sink.drain()
+    finally:
+        # Stop the batch's remaining renders when the client disconnects mid-export
+        for task in tasks:
+            task.cancel()
+
+    for receipt_id in requested_ids or []:
+        if receipt_id not in seen:
+            failures.append(f"{receipt_id}: not found")
+    if failures:
+        archive.writestr("errors.txt", "\n".join(failures) + "\n")
+    archive.close()
+    yield sink.drain()
+
+
+async def stream_combined_zip(
+    batches: AsyncIterator[List[Receipt]],
+    render_many: Callable[[List[Receipt]], Awaitable[bytes]],
+    concurrency: int,
+    requested_ids: Optional[List[str]] = None,
+) -> AsyncIterator[bytes]:
+    """Stream a ZIP with one multi-page PDF per batch, so the images every receipt shares are embedded once per file"""
+    sink = ZipStream()
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED)
+    in_flight = deque()
+    index = ["file,page,receipt_id"]
+    failures = []
+    seen = set()
+
+    async def render_batch(receipts: List[Receipt]):
+        try:
+            return await render_with_retries(render_many, receipts)
+        except Exception as e:
+            return e
+
+    async def write_oldest():
+        number, receipts, task = in_flight.popleft()
+        result = await task
+        receipt_ids = [receipt.receiptid or str(receipt.id) for receipt in receipts]
+        seen.update(receipt_ids)
+        if isinstance(result, Exception):
+            logger.error(f"Export render failed for batch {number}: {result}")
+            failures.extend(failure(receipt_id, result) for receipt_id in receipt_ids)
+            return
+        name = f"receipts_{number:04d}.pdf"
+        archive.writestr(name, result)
+        index.extend(f"{name},{page},{receipt_id}" for page, receipt_id in enumerate(receipt_ids, 1))
+
+    # Batches render concurrently but are written in order
+    number = 0
+    try:
+        async for receipts in batches:
+            if not receipts:
+                continue
+            number += 1
+            in_flight.append((number, receipts, asyncio.create_task(render_batch(receipts))))
+            if len(in_flight) >= max(1, concurrency):
+                await write_oldest()
+                yield sink.drain()
+        while in_flight:
+            await write_oldest()
+            yield sink.drain()
+    finally:
+        # Stop renders still in flight when the client disconnects mid-export
+        for _, _, task in in_flight:
+            task.cancel()
+
+    for receipt_id in requested_ids or []:
+        if receipt_id not in seen:
+            failures.append(f"{receipt_id}: not found")
+    archive.writestr("index.csv", "\n".join(index) + "\n")
+    if failures:
+        archive.writestr("errors.txt", "\n".join(failures) + "\n")
+    archive.close()
+    yield sink.drain()
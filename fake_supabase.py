@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Supabase receipts PostgREST and auth endpoints (development only)"""
+import json
+import time
+import uuid
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+
+SHIFTS = ["1st shift (6am to 12pm)", "2nd shift (12pm to 6pm)", "3rd shift (6pm to 12am)", "4th shift (12am to 6am)"]
+PLANS = ["Monthly", "Quarterly", "Half Yearly", "Yearly"]
+MODES = ["Cash", "UPI", "Online"]
+
+
+def _generated_columns(row: dict) -> dict:
+    """Mirror the stored generated columns of the real table (sql/receipts_phone_digits.sql)"""
+    row["customer_phone_digits"] = "".join(filter(str.isdigit, row.get("customer_phone") or ""))
+    return row
+
+
+def make_rows(count: int, start: int = 1) -> list:
+    """Generate synthetic receipts rows shaped like the real table"""
+    base = datetime(2025, 1, 1)
+    rows = []
+    for i in range(start, start + count):
+        joined = base + timedelta(days=i % 365)
+        created_at = (joined + timedelta(hours=9)).replace(tzinfo=timezone.utc).isoformat()
+        rows.append({
+            "id": i,
+            "created_at": created_at,
+            "updated_at": created_at,
+            "transaction_id": 1000 + i,
+            "receiptid": f"NG{i:06d}",
+            "transaction_date": joined.strftime("%Y-%m-%dT%H:%M:%S"),
+            "customer_name": f"Customer {i}",
+            "customer_phone": f"98{i:08d}",
+            "shift": SHIFTS[i % len(SHIFTS)],
+            "payment_mode": MODES[i % len(MODES)],
+            "payment_amount": 500 + (i % 10) * 100,
+            "joining_date": joined.strftime("%Y-%m-%d"),
+            "expiration_date": (joined + timedelta(days=30)).strftime("%Y-%m-%d"),
+            "plantype": PLANS[i % len(PLANS)],
+        })
+        _generated_columns(rows[-1])
+    return rows
+
+
+def _coerce(value: str, sample):
+    if isinstance(sample, bool):
+        return value == "true"
+    if isinstance(sample, int):
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _split_conditions(body: str) -> list:
+    """Split the inside of or(...)/and(...) on its top-level commas"""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in body:
+        if char == '"' and not current.endswith("\\"):
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    return parts + [current]
+
+
+def _match_logical(row: dict, op: str, body: str) -> bool:
+    """PostgREST logical filter, e.g. or=(updated_at.gt.X,and(updated_at.eq.X,id.gt.5))"""
+    results = []
+    for condition in _split_conditions(body.strip()[1:-1]):
+        if condition.startswith(("or(", "and(")):
+            nested, _, rest = condition.partition("(")
+            results.append(_match_logical(row, nested, "(" + rest))
+        else:
+            column, _, expression = condition.partition(".")
+            op_name, _, operand = expression.partition(".")
+            operand = operand.strip('"')
+            results.append(_match(row, column, f"{op_name}.{operand}"))
+    return any(results) if op == "or" else all(results)
+
+
+def _match(row: dict, column: str, expression: str) -> bool:
+    if column in ("or", "and"):
+        return _match_logical(row, column, expression)
+    op, _, operand = expression.partition(".")
+    current = row.get(column)
+    if op == "in":
+        values = [v.strip('"') for v in operand.strip("()").split(",") if v]
+        return str(current) in values
+    if op == "is":
+        return current is None if operand == "null" else str(current).lower() == operand
+    operand = _coerce(operand, current)
+    if current is None:
+        return False
+    if op == "eq":
+        return current == operand
+    if op == "neq":
+        return current != operand
+    if op == "gt":
+        return current > operand
+    if op == "gte":
+        return current >= operand
+    if op == "lt":
+        return current < operand
+    if op == "lte":
+        return current <= operand
+    return False
+
+
+class FakeSupabase:
+    """In-memory tables plus the HTTP server serving them"""
+
+    def __init__(self, rows=None, latency: float = 0.0):
+        self.tables = {"receipts": list(rows or [])}
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def query(self, table: str, params: list) -> list:
+        rows = self.tables.get(table, [])
+        select, limit, order = "*", None, None
+        filters = []
+        for key, value in params:
+            if key == "select":
+                select = value
+            elif key == "limit":
+                limit = int(value)
+            elif key == "offset":
+                rows = rows[int(value):]
+            elif key == "order":
+                order = value
+            else:
+                filters.append((key, value))
+        result = [row for row in rows if all(_match(row, c, e) for c, e in filters)]
+        if order:
+            for part in reversed(order.split(",")):
+                column, _, direction = part.partition(".")
+                result.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=direction.startswith("desc"))
+        if limit is not None:
+            result = result[:limit]
+        if select != "*":
+            columns = [c.strip() for c in select.split(",")]
+            result = [{c: row.get(c) for c in columns} for row in result]
+        return result
+
+    def session(self, email: str) -> dict:
+        now = int(time.time())
+        return {
+            "access_token": uuid.uuid4().hex,
+            "token_type": "bearer",
+            "expires_in": 3600,
+            "expires_at": now + 3600,
+            "refresh_token": uuid.uuid4().hex,
+            "user": {
+                "id": str(uuid.uuid5(uuid.NAMESPACE_DNS, email or "anon")),
+                "aud": "authenticated",
+                "role": "authenticated",
+                "email": email,
+                "app_metadata": {},
+                "user_metadata": {},
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            },
+        }
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; with Nagle on, delayed ACKs add ~40ms to each
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_json(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"null")
+
+            def _delay(self):
+                fake.requests += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+            def do_GET(self):
+                self._delay()
+                url = urlparse(self.path)
+                if url.path.startswith("/rest/v1/"):
+                    table = url.path[len("/rest/v1/"):]
+                    with fake.lock:
+                        rows = fake.query(table, parse_qsl(url.query, keep_blank_values=True))
+                    return self._send(200, rows)
+                self._send(404, {"message": "not found"})
+
+            def do_POST(self):
+                self._delay()
+                url = urlparse(self.path)
+                if url.path == "/auth/v1/token":
+                    body = self._read_json() or {}
+                    return self._send(200, fake.session(body.get("email", "")))
+                if url.path.startswith("/rest/v1/"):
+                    table = url.path[len("/rest/v1/"):]
+                    body = self._read_json()
+                    rows = body if isinstance(body, list) else [body]
+                    with fake.lock:
+                        stored = fake.tables.setdefault(table, [])
+                        for row in rows:
+                            row.setdefault("id", len(stored) + 1)
+                            row.setdefault("updated_at", datetime.now(timezone.utc).isoformat())
+                            if table == "receipts":
+                                _generated_columns(row)
+                            stored.append(row)
+                    return self._send(201, rows)
+                self._send(404, {"message": "not found"})
+
+        return Handler
+
+    def serve(self, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+        """Start serving in a daemon thread and return the server (see server.server_address)"""
+        server = ThreadingHTTPServer((host, port), self.handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--rows", type=int, default=1000, help="synthetic receipts to seed")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    args = parser.parse_args()
+    fake = FakeSupabase(make_rows(args.rows), latency=args.latency)
+    server = fake.serve(args.host, args.port)
+    print(f"Fake Supabase on http://{args.host}:{server.server_address[1]} ({args.rows} receipts)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,26 @@
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Optional, Union
+
+DISPLAY_DATE_FORMAT = "%d %b %Y"
+
+
+@lru_cache(maxsize=4096)
+def parse_date(value: str) -> Optional[Union[date, datetime]]:
+    """Parse an ISO date or datetime string, memoized since receipts share few distinct dates"""
+    try:
+        if "T" in value or " " in value:
+            return datetime.fromisoformat(value)
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def format_date(value, fmt=DISPLAY_DATE_FORMAT):
+    """Format a date, datetime or ISO date string for display on receipts"""
+    if isinstance(value, date):
+        return value.strftime(fmt)
+    parsed = parse_date(value) if isinstance(value, str) else None
+    if parsed is None:
+        return value  # fallback if parsing fails
+    return parsed.strftime(fmt)
@@ -0,0 +1,45 @@
+"""Production server settings: gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master and forked into WEB_CONCURRENCY
+uvicorn workers. Each worker runs its own render pool; RENDER_WORKERS
+defaults to an even share of the CPUs so the host is not oversubscribed.
+Rendered PDFs and receipt rows are cached in the SQLite file at
+SHARED_CACHE_PATH, so every worker sees the others' entries.
+
+Reloads:
+  kill -HUP <master>    restart workers gracefully with the preloaded code
+                        (new code too when PRELOAD_APP=0)
+  kill -USR2 <master>   start a new master on the new code, then
+  kill -QUIT <old>      drain and stop the old one, for zero-downtime deploys
+"""
+import os
+import multiprocessing
+
+cpus = multiprocessing.cpu_count() or 1
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(cpus, 4))))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Pending connections the kernel queues before refusing new ones
+backlog = int(os.getenv("BACKLOG", "2048"))
+# Seconds an idle keep-alive connection stays open
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# Recycle workers after this many requests (0 = never), jittered so they do not restart together
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "100")) if max_requests else 0
+preload_app = os.getenv("PRELOAD_APP", "1") == "1"
+accesslog = os.getenv("ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+# Read by renderer.py when the app is imported below
+os.environ.setdefault("RENDER_WORKERS", str(max(1, cpus // workers)))
+
+
+def on_starting(server):
+    server.log.info(
+        f"Starting {workers} workers (backlog={backlog}, keepalive={keepalive}s, "
+        f"render workers each={os.environ['RENDER_WORKERS']}, preload={preload_app})"
+    )
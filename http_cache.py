@@ -0,0 +1,108 @@
+import os
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Mapping, Optional
+
+from fastapi.responses import Response
+
+from models import Receipt
+from pdf_cache import PDF_FIELDS, VERSION_FILES, compute_template_version, pdf_cache_key
+from renderer import TEMPLATE_DIR, PDF_ENGINE
+from pdf_output import PDF_QUALITY
+
+# Receipts are only shown after the phone check, so shared caches must never store them
+PDF_CACHE_CONTROL = os.getenv("PDF_CACHE_CONTROL", "private, max-age=86400")
+PAGE_CACHE_CONTROL = os.getenv("PAGE_CACHE_CONTROL", "private, no-cache")
+
+PAGE_TEMPLATE = "receipt_display.html"
+PAGE_VERSION_FILES = (os.path.join(TEMPLATE_DIR, PAGE_TEMPLATE),) + VERSION_FILES[1:]
+PAGE_VERSION = compute_template_version(PAGE_VERSION_FILES)
+
+
+def _newest_mtime(paths) -> Optional[datetime]:
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.path.getmtime(path))
+        except OSError:
+            pass
+    return datetime.fromtimestamp(int(max(mtimes)), timezone.utc) if mtimes else None
+
+
+# A template change alters every receipt, so it bounds Last-Modified from below
+PDF_TEMPLATES_MODIFIED = _newest_mtime(VERSION_FILES)
+PAGE_TEMPLATES_MODIFIED = _newest_mtime(PAGE_VERSION_FILES)
+
+
+def pdf_etag(receipt: Receipt, engine: str = PDF_ENGINE, quality: str = PDF_QUALITY) -> str:
+    """Strong validator for a receipt's PDF; the cache key already covers row, engine, template and preset"""
+    return key_etag(pdf_cache_key(receipt, engine, quality))
+
+
+def key_etag(cache_key: str) -> str:
+    return f'"{cache_key[:32]}"'
+
+
+def page_etag(receipt: Receipt) -> str:
+    """Strong validator for the receipt_display.html page of a receipt"""
+    payload = json.dumps([PAGE_VERSION, [getattr(receipt, name) for name in PDF_FIELDS]])
+    return f'"{hashlib.sha256(payload.encode()).hexdigest()[:32]}"'
+
+
+def last_modified(receipt: Receipt, templates_modified: Optional[datetime]) -> Optional[datetime]:
+    created = receipt.created_at
+    if created is not None:
+        created = (created if created.tzinfo else created.replace(tzinfo=timezone.utc)).replace(microsecond=0)
+    candidates = [value for value in (created, templates_modified) if value is not None]
+    return max(candidates) if candidates else None
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison: W/ prefixes are ignored"""
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def is_not_modified(headers: Mapping[str, str], etag: str, modified: Optional[datetime] = None) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since when it is absent"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return modified <= since
+    return False
+
+
+def validator_headers(etag: str, modified: Optional[datetime], cache_control: str) -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if modified is not None:
+        headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+    return headers
+
+
+def not_modified_response(headers: dict) -> Response:
+    """304 for a conditional request whose validator still matches
+
+    RFC 9110 answers a failed If-None-Match on methods other than GET/HEAD with
+    412. The receipt POSTs are reads, and the phone number goes in the body to
+    keep it out of URLs and access logs. static/js/receipt.js sends the
+    validator and treats 304 as "use your stored copy", exactly as for a GET.
+    """
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,239 @@
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Add a Server-Timing header with the per-stage breakdown to every response
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _with_label(sample: str, label: str) -> str:
+    """Add one label to a rendered sample line"""
+    series, value = sample.rsplit(" ", 1)
+    if series.endswith("}"):
+        return f"{series[:-1]},{label}}} {value}"
+    return f"{series}{{{label}}} {value}"
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[tuple(str(labels.get(name, "")) for name in self.labelnames)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Callback:
+    """Metric read at scrape time from existing stats (a number, or {label value: number})"""
+
+    def __init__(self, name: str, documentation: str, callback: Callable, kind: str = "gauge", labelname: str = ""):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.kind = kind
+        self.labelnames = (labelname,) if labelname else ()
+
+    def samples(self) -> List[str]:
+        value = self.callback()
+        if value is None:
+            return []
+        if isinstance(value, dict):
+            # A None value (e.g. a stat that could not be read) leaves that series out of this scrape
+            return [
+                f"{self.name}{_format_labels(self.labelnames, (key,))} {v}" for key, v in value.items() if v is not None
+            ]
+        return [f"{self.name} {value}"]
+
+
+class Histogram:
+    """Fixed-bucket histogram; an observation is one bisect and two additions"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            # bucket counts (+Inf last), sum
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text format.
+
+    Values live in the serving process, so under gunicorn each worker answers
+    /metrics with its own numbers; every sample carries a worker_pid label so
+    scrapes that land on different workers stay separate series. Aggregate in
+    the query, e.g. sum without (worker_pid) (rate(receipt_errors_total[5m])).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def callback(self, name: str, documentation: str, callback: Callable, kind: str = "gauge", labelname: str = "") -> Callback:
+        return self._add(Callback(name, documentation, callback, kind, labelname))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        # Read at scrape time: with preload_app the module is imported before the fork
+        worker = f'worker_pid="{os.getpid()}"'
+        for metric in list(self._metrics):
+            try:
+                samples = metric.samples()
+            except Exception:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(_with_label(sample, worker) for sample in samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "receipt_stage_seconds", "Time spent in each receipt pipeline stage", ["stage"]
+)
+REQUEST_SECONDS = registry.histogram(
+    "receipt_http_request_duration_seconds", "HTTP request latency by endpoint", ["endpoint", "method", "status"]
+)
+ERRORS = registry.counter("receipt_errors_total", "Errors by type", ["type"])
+
+# Per-request stage timings, collected for the Server-Timing header
+_request_timings: ContextVar[Optional[list]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage into STAGE_SECONDS and the current request's Server-Timing"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def count_error(error) -> None:
+    ERRORS.inc(type=error if isinstance(error, str) else type(error).__name__)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each request and the send of its response body"""
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        timings = []
+        token = _request_timings.set(timings)
+        state = {"status": 500, "send_started": None}
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                state["send_started"] = time.perf_counter()
+                if self.server_timing:
+                    header = ", ".join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in timings)
+                    total = (state["send_started"] - started) * 1000
+                    header = f"{header}, app;dur={total:.1f}" if header else f"app;dur={total:.1f}"
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"server-timing", header.encode())]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body") and state["send_started"]:
+                STAGE_SECONDS.observe(time.perf_counter() - state["send_started"], stage="send")
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            _request_timings.reset(token)
+            endpoint = scope.get("endpoint")
+            name = getattr(endpoint, "__name__", type(endpoint).__name__) if endpoint else "unmatched"
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started, endpoint=name, method=scope.get("method", ""), status=state["status"]
+            )
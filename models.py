@@ -1,56 +1,149 @@
-from typing import Optional
-from datetime import datetime
-
-class Receipt:
-    """Receipt model for type hinting and validation"""
-    
-    def __init__(
-        self,
-        receipt_id: str,
-        customer_name: str,
-        customer_phone: str,
-        customer_email: Optional[str] = None,
-        payment_amount: int = 0,
-        description: Optional[str] = None,
-        payment_method: Optional[str] = None,
-        status: str = "completed",
-        created_at: Optional[datetime] = None
-    ):
-        self.receipt_id = receipt_id
-        self.customer_name = customer_name
-        self.customer_phone = customer_phone
-        self.customer_email = customer_email
-        self.payment_amount = payment_amount
-        self.description = description
-        self.payment_method = payment_method
-        self.status = status
-        self.created_at = created_at or datetime.now()
-    
-    def to_dict(self):
-        """Convert receipt to dictionary"""
-        return {
-            "receipt_id": self.receipt_id,
-            "customer_name": self.customer_name,
-            "customer_phone": self.customer_phone,
-            "customer_email": self.customer_email,
-            "payment_amount": self.amount,
-            "description": self.description,
-            "payment_method": self.payment_method,
-            "status": self.status,
-            "created_at": self.created_at.isoformat() if self.created_at else None
-        }
-    
+import os
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Optional
+
+from filters import parse_date, DISPLAY_DATE_FORMAT
+
+# Stored generated column holding the digits of customer_phone (see sql/receipts_phone_digits.sql);
+# empty falls back to fetching by receiptid and comparing phones in Python
+PHONE_DIGITS_COLUMN = os.getenv("RECEIPT_PHONE_DIGITS_COLUMN", "customer_phone_digits")
+
+# Columns the receipt page, the PDF and its validators read; id and transaction_id are not shown
+DISPLAY_COLUMNS = (
+    "receiptid",
+    "created_at",
+    "transaction_date",
+    "customer_name",
+    "customer_phone",
+    "shift",
+    "plantype",
+    "payment_mode",
+    "payment_amount",
+    "joining_date",
+    "expiration_date",
+)
+# Everything Receipt.from_row reads
+RECEIPT_COLUMNS = ("id", "transaction_id") + DISPLAY_COLUMNS
+
+
+def normalize_phone(phone: Optional[str]) -> str:
+    """Keep only the digits of a phone number"""
+    return ''.join(filter(str.isdigit, phone or ""))
+
+
+def as_int(value) -> int:
+    """Same coercion as Jinja's int filter"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return 0
+
+
+@lru_cache(maxsize=4096)
+def _parse_display_date(value: str):
+    parsed = parse_date(value)
+    if parsed is None:
+        return None, value
+    return parsed, parsed.strftime(DISPLAY_DATE_FORMAT)
+
+
+def _date_and_display(value):
+    """(parsed value, display string); unparseable strings are displayed as stored"""
+    if not value:
+        return None, ""
+    if isinstance(value, date):
+        return value, value.strftime(DISPLAY_DATE_FORMAT)
+    # Memoized, so rows sharing a date share the parsed value and display string
+    return _parse_display_date(str(value))
+
+
+def _timestamp(value) -> Optional[datetime]:
+    if not value or isinstance(value, datetime):
+        return value or None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Receipt(NamedTuple):
+    """Immutable receipts row; dates are parsed and display strings formatted once at load"""
+
+    id: Optional[int]
+    receiptid: str
+    transaction_id: Optional[int]
+    created_at: Optional[datetime]
+    transaction_date: Optional[datetime]
+    customer_name: str
+    customer_phone: str
+    shift: str
+    plantype: str
+    payment_mode: str
+    payment_amount: int
+    joining_date: Optional[date]
+    expiration_date: Optional[date]
+    # Derived once so verification and rendering do no per-request parsing
+    phone_digits: str
+    transaction_date_display: str
+    joining_date_display: str
+    expiration_date_display: str
+
     @classmethod
-    def from_dict(cls, data: dict):
-        """Create receipt from dictionary"""
+    def from_row(cls, row: dict) -> "Receipt":
+        """Build a receipt from a receipts table row"""
+        get = row.get
+        transaction_date, transaction_display = _date_and_display(get("transaction_date"))
+        joining_date, joining_display = _date_and_display(get("joining_date"))
+        expiration_date, expiration_display = _date_and_display(get("expiration_date"))
+        phone = get("customer_phone") or ""
         return cls(
-            receipt_id=data.get("receipt_id", ""),
-            customer_name=data.get("customer_name", ""),
-            customer_phone=data.get("customer_phone", ""),
-            customer_email=data.get("customer_email"),
-            payment_amount=int(data.get("payment_amount", 0)),
-            description=data.get("description"),
-            payment_method=data.get("payment_mode"),
-            status=data.get("status", "completed"),
-            created_at=datetime.fromisoformat(data["created_at"]) if data.get("created_at") else None
+            get("id"),
+            get("receiptid") or "",
+            get("transaction_id"),
+            _timestamp(get("created_at")),
+            transaction_date,
+            get("customer_name") or "",
+            phone,
+            get("shift") or "",
+            get("plantype") or "",
+            get("payment_mode") or "",
+            as_int(get("payment_amount")),
+            joining_date,
+            expiration_date,
+            normalize_phone(phone),
+            transaction_display,
+            joining_display,
+            expiration_display,
         )
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict]) -> List["Receipt"]:
+        """Build receipts for a whole result set"""
+        from_row = cls.from_row
+        return [from_row(row) for row in rows]
+
+    def to_dict(self) -> dict:
+        """Receipts table row for this receipt"""
+        row = {
+            "id": self.id,
+            "receiptid": self.receiptid,
+            "transaction_id": self.transaction_id,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "transaction_date": self.transaction_date.isoformat() if self.transaction_date else None,
+            "customer_name": self.customer_name,
+            "customer_phone": self.customer_phone,
+            "shift": self.shift,
+            "plantype": self.plantype,
+            "payment_mode": self.payment_mode,
+            "payment_amount": self.payment_amount,
+            "joining_date": self.joining_date.isoformat() if self.joining_date else None,
+            "expiration_date": self.expiration_date.isoformat() if self.expiration_date else None,
+        }
+        if self.id is None:
+            # Let the database assign it
+            del row["id"]
+        return row
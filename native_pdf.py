@@ -0,0 +1,272 @@
+import io
+import os
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from models import Receipt
+from pdf_output import OutputPreset, PRESETS, PDF_QUALITY, IMAGE_DISPLAY_PX, prepare_image
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+
+FONT_CANDIDATES = (
+    os.getenv("PDF_FONT_PATH", ""),
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+)
+BOLD_FONT_CANDIDATES = (
+    os.getenv("PDF_BOLD_FONT_PATH", ""),
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans-Bold.ttf",
+)
+
+try:
+    from reportlab import rl_config
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.colors import HexColor
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from PIL import Image
+    NATIVE_AVAILABLE = True
+    # Binary Flate streams; the default ASCII85 layer grows every image and font by a quarter
+    rl_config.useA85 = 0
+except ImportError:
+    NATIVE_AVAILABLE = False
+
+# CSS px (96 dpi) to PDF points, so the layout below reads like receipt_display2.html
+PX = 0.75
+
+TAGLINE = "Where Productivity meets Comfort"
+ADDRESS = "Sonata Commercial Co. Op. Society C-201, 2nd Floor, Above RK Bazar, MIDC, Dombivli (E) 421203"
+CONTACT = "Phone: 9930253216 | 8108236131 Email: nexgenstudycenter@gmail.com"
+SIGNATORY = "Abhijit Shinde"
+FOOTER = "This is an official receipt for your records"
+PAYMENT_MODES = ("UPI", "Cash", "Online")
+
+
+def _first_existing(paths) -> Optional[str]:
+    for path in paths:
+        if path and os.path.isfile(path):
+            return path
+    return None
+
+
+def _load_image(path: str):
+    image = Image.open(path)
+    image.load()
+    return image
+
+
+class NativeReceiptRenderer:
+    """Draws the fixed receipt_display2.html layout straight to PDF, without an HTML layout pass"""
+
+    def __init__(self, static_dir: str = STATIC_DIR):
+        if not NATIVE_AVAILABLE:
+            raise RuntimeError("reportlab is not installed")
+        regular = _first_existing(FONT_CANDIDATES)
+        bold = _first_existing(BOLD_FONT_CANDIDATES) or regular
+        if regular:
+            # Registered once per process; each PDF embeds only the glyph subset it uses
+            if "ReceiptSans" not in pdfmetrics.getRegisteredFontNames():
+                pdfmetrics.registerFont(TTFont("ReceiptSans", regular))
+                pdfmetrics.registerFont(TTFont("ReceiptSans-Bold", bold))
+            self.font, self.bold_font, self.currency = "ReceiptSans", "ReceiptSans-Bold", "₹"
+        else:
+            logger.warning("No Unicode TTF font found for native PDFs; using Helvetica")
+            self.font, self.bold_font, self.currency = "Helvetica", "Helvetica-Bold", "Rs."
+        # Decoded once; each preset's resampled copies are then reused by every document this process draws
+        self._sources = {
+            relative: _load_image(os.path.join(static_dir, *relative.split("/"))) for relative in IMAGE_DISPLAY_PX
+        }
+        self._images: Dict[str, Tuple] = {}
+        self.page_width, self.page_height = A4
+
+    def images(self, preset: OutputPreset) -> Tuple:
+        """(logo, signature) readers prepared for a preset"""
+        if preset.name not in self._images:
+            self._images[preset.name] = tuple(
+                ImageReader(prepare_image(self._sources[relative], display_px, preset))
+                for relative, display_px in IMAGE_DISPLAY_PX.items()
+            )
+        return self._images[preset.name]
+
+    # ---- Drawing helpers (all arguments in CSS px measured from the page top-left) ----
+
+    def _y(self, y: float) -> float:
+        return self.page_height - y * PX
+
+    def _text(self, c, x, y, text, size=16, bold=False, color="#000000", anchor="left", max_width=None):
+        font = self.bold_font if bold else self.font
+        text = str(text)
+        if max_width is not None:
+            limit = max_width * PX
+            while text and pdfmetrics.stringWidth(text, font, size * PX) > limit:
+                text = text[:-2] + "…" if len(text) > 1 else ""
+        c.setFillColor(HexColor(color))
+        c.setFont(font, size * PX)
+        # Baseline sits roughly 80% down a 1.2 line box
+        baseline = self._y(y + size * 0.95)
+        if anchor == "center":
+            c.drawCentredString(x * PX, baseline, text)
+        elif anchor == "right":
+            c.drawRightString(x * PX, baseline, text)
+        else:
+            c.drawString(x * PX, baseline, text)
+        return pdfmetrics.stringWidth(text, font, size * PX) / PX
+
+    def _hline(self, c, x1, x2, y, color="#000000"):
+        c.setStrokeColor(HexColor(color))
+        c.setLineWidth(1 * PX)
+        c.line(x1 * PX, self._y(y), x2 * PX, self._y(y))
+
+    def _image(self, c, image, x, y, width):
+        iw, ih = image.getSize()
+        height = width * ih / iw
+        c.drawImage(image, x * PX, self._y(y + height), width * PX, height * PX, mask="auto")
+        return height
+
+    def _field(self, c, label, value, x, y, width, label_width):
+        """Label followed by an underlined value box, like the flex rows in the template"""
+        self._text(c, x, y + 6, label)
+        box_x = x + label_width
+        self._text(c, box_x + 10, y + 5, value, max_width=width - label_width - 20)
+        self._hline(c, box_x, x + width, y + 30)
+
+    # ---- Layout ------------------------------------------------------------
+
+    def render(self, receipt: Receipt, preset: OutputPreset = PRESETS[PDF_QUALITY]) -> bytes:
+        """Render a receipt to PDF bytes"""
+        return self.render_many([receipt], preset, title=f"Receipt {receipt.receiptid}")
+
+    def render_many(self, receipts: List[Receipt], preset: OutputPreset = PRESETS[PDF_QUALITY], title: str = "Receipts") -> bytes:
+        """Render receipts as the pages of one PDF; reportlab embeds each identical image once per document"""
+        buffer = io.BytesIO()
+        c = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+        c.setTitle(title)
+        c.setAuthor(SIGNATORY)
+        logo, signature = self.images(preset)
+        for receipt in receipts:
+            self._draw(c, receipt, logo, signature)
+            c.showPage()
+        c.save()
+        return buffer.getvalue()
+
+    def _draw(self, c, receipt: Receipt, logo, signature):
+        page_w = self.page_width / PX
+        content_w = 700
+        outer_w = content_w + 62
+        left = (page_w - outer_w) / 2
+        x = left + 31
+        right = x + content_w
+        top = 60
+        y = top + 31
+
+        # Header
+        logo_h = logo.getSize()[1] * 200 / logo.getSize()[0]
+        header_h = logo_h + 1 + 27 + 19 + 19 + 20
+        c.setFillColor(HexColor("#f4f9fc"))
+        c.rect(x * PX, self._y(y + header_h), content_w * PX, header_h * PX, stroke=0, fill=1)
+        self._image(c, logo, x + (content_w - 200) / 2, y, 200)
+        y += logo_h + 1 + 5
+        self._text(c, x + content_w / 2, y, TAGLINE, size=14, bold=True, color="#ff7c00", anchor="center")
+        y += 17 + 10
+        self._text(c, x + content_w / 2, y, ADDRESS, size=12, anchor="center", max_width=content_w)
+        y += 14 + 5
+        self._text(c, x + content_w / 2, y, CONTACT, size=12, anchor="center", max_width=content_w)
+        y += 14 + 15
+        self._hline(c, x + 10, right, y)
+        y += 6
+
+        # Title
+        y += 20
+        self._text(c, x + content_w / 2, y, "RECEIPT", size=18, bold=True, color="#8b1e1d", anchor="center")
+        y += 22 + 20
+
+        # Receipt number and date
+        y += 15
+        label_w = self._text(c, x, y + 6, "No.: ")
+        number_w = self._text(c, x + label_w + 5, y + 6, receipt.receiptid)
+        self._hline(c, x + label_w, x + label_w + number_w + 10, y + 30)
+        date_text = receipt.transaction_date_display
+        date_w = pdfmetrics.stringWidth(date_text, self.font, 16 * PX) / PX
+        self._text(c, right - 5, y + 6, date_text, anchor="right")
+        self._hline(c, right - date_w - 10, right, y + 30)
+        self._text(c, right - date_w - 10, y + 6, "Date: ", anchor="right")
+        y += 31 + 15
+
+        # Name
+        y += 15
+        self._field(c, "Name :", receipt.customer_name or "N/A", x, y, content_w, 60)
+        y += 31 + 15
+
+        # Plan type and shift
+        half = (content_w - 20) / 2
+        y += 15
+        self._field(c, "Plan Type :", receipt.plantype or "N/A", x, y, half, 90)
+        self._field(c, "Shift :", receipt.shift or "N/A", x + half + 20, y, half, 60)
+        y += 31 + 15
+
+        # Payment mode checkboxes
+        y += 15
+        cx = x + self._text(c, x, y, "Payment Mode :", size=14) + 10
+        c.setStrokeColor(HexColor("#767676"))
+        c.setLineWidth(1 * PX)
+        for mode in PAYMENT_MODES:
+            checked = receipt.payment_mode == mode
+            box_top = y + 2
+            c.setFillColor(HexColor("#0075ff" if checked else "#ffffff"))
+            c.roundRect(cx * PX, self._y(box_top + 13), 13 * PX, 13 * PX, 2 * PX, stroke=0 if checked else 1, fill=1)
+            if checked:
+                c.setStrokeColor(HexColor("#ffffff"))
+                c.setLineWidth(2 * PX)
+                c.lines([
+                    (
+                        (cx + 3) * PX, self._y(box_top + 7),
+                        (cx + 5.5) * PX, self._y(box_top + 10),
+                    ),
+                    (
+                        (cx + 5.5) * PX, self._y(box_top + 10),
+                        (cx + 10.5) * PX, self._y(box_top + 3.5),
+                    ),
+                ])
+                c.setStrokeColor(HexColor("#767676"))
+                c.setLineWidth(1 * PX)
+            cx += 13 + 5
+            cx += self._text(c, cx, y, mode, size=14) + 10
+        y += 17 + 15
+
+        # Joining and expiry dates
+        y += 15
+        joining = receipt.joining_date_display or "N/A"
+        expiry = receipt.expiration_date_display or "N/A"
+        self._field(c, "Joining Date :", joining, x, y, half, 105)
+        self._field(c, "Expired On :", expiry, x + half + 20, y, half, 95)
+        y += 31 + 15
+
+        # Amount box and signature
+        y += 15
+        c.setStrokeColor(HexColor("#8b1e1d"))
+        c.setLineWidth(1 * PX)
+        c.rect(x * PX, self._y(y + 52), 182 * PX, 52 * PX, stroke=1, fill=0)
+        amount = f"{self.currency} {receipt.payment_amount}/-"
+        self._text(c, x + 91, y + 14, amount, size=20, bold=True, color="#8b1e1d", anchor="center", max_width=176)
+        sig_h = signature.getSize()[1] * 100 / signature.getSize()[0]
+        sig_x = right - 100 - 10
+        sig_top = y + (52 - sig_h - 11) / 2
+        self._image(c, signature, sig_x + 5, sig_top + 5, 100)
+        self._hline(c, sig_x, sig_x + 110, sig_top + sig_h + 11)
+        y += 52 + 15
+
+        # Signatory
+        y += 15
+        self._text(c, right, y, SIGNATORY, anchor="right")
+        y += 19 + 15
+
+        # Footer
+        y += 40 + 15
+        self._text(c, x, y, FOOTER, size=13)
@@ -0,0 +1,164 @@
+import os
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from models import Receipt
+from renderer import TEMPLATE_DIR, PDF_TEMPLATE, PDF_ENGINE
+from pdf_output import PRESETS, PDF_QUALITY
+from shared_cache import SharedCache, SHARED_CACHE_PATH
+
+PDF_CACHE_MEMORY_BYTES = int(os.getenv("PDF_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+# Budget for PDFs in the shared SQLite store (0 disables the shared tier)
+PDF_CACHE_DISK_BYTES = int(os.getenv("PDF_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Receipt fields read by receipt_display2.html; anything else does not change the PDF
+PDF_FIELDS = (
+    "receiptid",
+    "transaction_date_display",
+    "customer_name",
+    "plantype",
+    "shift",
+    "payment_mode",
+    "joining_date_display",
+    "expiration_date_display",
+    "payment_amount",
+)
+
+# Files whose content affects the rendered output
+VERSION_FILES = (
+    os.path.join(TEMPLATE_DIR, PDF_TEMPLATE),
+    os.path.join(BASE_DIR, "filters.py"),
+    os.path.join(BASE_DIR, "models.py"),
+    os.path.join(BASE_DIR, "static", "img", "logo.png"),
+    os.path.join(BASE_DIR, "static", "img", "AbhijitSign.png"),
+)
+
+
+def compute_template_version(paths=VERSION_FILES) -> str:
+    """Hash the template and the assets it embeds"""
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        except OSError:
+            digest.update(path.encode())
+    return digest.hexdigest()[:16]
+
+
+TEMPLATE_VERSION = compute_template_version()
+
+# Output of each engine depends on different files
+ENGINE_VERSIONS = {
+    "weasyprint": TEMPLATE_VERSION,
+    "native": compute_template_version(VERSION_FILES[1:] + (os.path.join(BASE_DIR, "native_pdf.py"),)),
+}
+
+
+def pdf_cache_key(receipt: Receipt, engine: str = PDF_ENGINE, quality: str = PDF_QUALITY) -> str:
+    """Content address of the PDF rendered for a receipt"""
+    version = f"{engine}:{ENGINE_VERSIONS.get(engine, TEMPLATE_VERSION)}"
+    fields = [getattr(receipt, name) for name in PDF_FIELDS]
+    # The preset's settings, not just its name, so retuning a preset re-renders its PDFs
+    payload = json.dumps([version, fields, PRESETS[quality]])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class PDFCache:
+    """Two-tier cache of rendered PDF bytes: a per-process memory LRU over a store shared by all workers"""
+
+    def __init__(
+        self,
+        memory_bytes: int = PDF_CACHE_MEMORY_BYTES,
+        disk_bytes: int = PDF_CACHE_DISK_BYTES,
+        path: Optional[str] = SHARED_CACHE_PATH,
+    ):
+        self.memory_bytes = memory_bytes
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._shared = SharedCache(path, "pdfs", disk_bytes) if path and disk_bytes > 0 else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+
+    @property
+    def evictions(self) -> int:
+        return self.memory_evictions + (self._shared.evictions if self._shared else 0)
+
+    def _get_memory(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+            return data
+
+    def _from_shared(self, key: str, data: Optional[bytes]) -> Optional[bytes]:
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._put_memory(key, data)
+        return data
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self._get_memory(key)
+        if data is not None:
+            return data
+        return self._from_shared(key, self._shared.get(key) if self._shared else None)
+
+    async def aget(self, key: str) -> Optional[bytes]:
+        """get for the event loop: memory hits answer at once, the shared tier is read on a thread"""
+        data = self._get_memory(key)
+        if data is not None:
+            return data
+        return self._from_shared(key, await self._shared.aget(key) if self._shared else None)
+
+    def put(self, key: str, data: bytes):
+        """Store in memory now; the shared tier is written behind, off the caller's thread"""
+        with self._lock:
+            self._put_memory(key, data)
+        if self._shared:
+            self._shared.put_async(key, data)
+
+    def _put_memory(self, key: str, data: bytes):
+        if len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self.memory_evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+        if self._shared:
+            self._shared.clear()
+
+    def stats(self) -> dict:
+        shared = self._shared.stats() if self._shared else {}
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_size,
+            "disk_entries": shared.get("entries", 0),
+            "disk_bytes": shared.get("bytes", 0),
+        }
@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import secrets
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, Optional
+
+from models import Receipt
+from renderer import RendererBusy, RenderTimeout
+from pdf_output import PDF_QUALITY
+from metrics import count_error
+from shared_cache import SharedCache, SHARED_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+# Jobs waiting for a render slot; submissions beyond this are refused
+PDF_JOB_QUEUE_DEPTH = int(os.getenv("PDF_JOB_QUEUE_DEPTH", "256"))
+# How long finished jobs (and their status) stay retrievable
+PDF_JOB_TTL = float(os.getenv("PDF_JOB_TTL", "600"))
+# Concurrent renders started by the job dispatcher (0 = one per render worker)
+PDF_JOB_WORKERS = int(os.getenv("PDF_JOB_WORKERS", "0"))
+
+QUEUED, RENDERING, DONE, FAILED = "queued", "rendering", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+
+class JobQueueFull(Exception):
+    """Raised when the job queue is at PDF_JOB_QUEUE_DEPTH"""
+
+
+class PDFJob:
+    """One queued render of a verified receipt"""
+
+    def __init__(self, receipt: Receipt, engine: str, cache_key: str, client: str, quality: str = PDF_QUALITY):
+        self.id = secrets.token_urlsafe(16)
+        self.receipt = receipt
+        self.engine = engine
+        self.quality = quality
+        self.cache_key = cache_key
+        self.client = client
+        self.status = QUEUED
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.updated = self.created
+        self.changed = asyncio.Event()
+
+    def record(self) -> dict:
+        """State shared with other worker processes"""
+        return {
+            "receipt_id": self.receipt.receiptid,
+            "engine": self.engine,
+            "quality": self.quality,
+            "cache_key": self.cache_key,
+            "status": self.status,
+            "error": self.error,
+            "created": self.created,
+            "updated": self.updated,
+        }
+
+
+class FairQueue:
+    """Bounded queue served round-robin across clients, so one client's burst cannot starve the rest"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._size = 0
+        self._ready: Optional[asyncio.Condition] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _condition(self) -> asyncio.Condition:
+        if self._ready is None:
+            self._ready = asyncio.Condition()
+        return self._ready
+
+    async def put(self, client: str, job: PDFJob):
+        async with self._condition():
+            if self._size >= self.maxsize:
+                raise JobQueueFull("PDF job queue is full")
+            self._queues.setdefault(client, deque()).append(job)
+            self._size += 1
+            self._condition().notify()
+
+    async def get(self) -> PDFJob:
+        async with self._condition():
+            await self._condition().wait_for(lambda: self._size > 0)
+            client, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            # Move the client to the back so the next get serves someone else
+            del self._queues[client]
+            if queue:
+                self._queues[client] = queue
+            self._size -= 1
+            return job
+
+    def position(self, job: PDFJob) -> int:
+        """Jobs that will be served before this one under round-robin order"""
+        queue = self._queues.get(job.client)
+        if not queue or job not in queue:
+            return 0
+        rounds = queue.index(job)
+        ahead = rounds
+        before = True
+        for client, other in self._queues.items():
+            if client == job.client:
+                before = False
+                continue
+            # Clients earlier in the rotation get one more turn before this job's round
+            ahead += min(len(other), rounds + 1 if before else rounds)
+        return ahead
+
+
+class PDFJobManager:
+    """Runs PDF renders from a fair queue and tracks their status for polling and SSE"""
+
+    def __init__(
+        self,
+        render: Callable[[Receipt, str, str], Awaitable[bytes]],
+        fetch_cached: Callable[[str], Awaitable[Optional[bytes]]],
+        workers: int = PDF_JOB_WORKERS,
+        queue_depth: int = PDF_JOB_QUEUE_DEPTH,
+        ttl: float = PDF_JOB_TTL,
+        shared_path: Optional[str] = SHARED_CACHE_PATH,
+    ):
+        self.render = render
+        self.fetch_cached = fetch_cached
+        self.workers = workers
+        self.ttl = ttl
+        self.queue = FairQueue(queue_depth)
+        self._jobs: Dict[str, PDFJob] = {}
+        # Job state in the shared store lets any worker process answer status and result requests
+        self._shared = SharedCache(shared_path, "pdf_jobs", 16 * 1024 * 1024) if shared_path else None
+        self._tasks = []
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self, workers: int = 1):
+        if not self._tasks:
+            count = self.workers or workers
+            self._tasks = [asyncio.create_task(self._dispatch()) for _ in range(max(1, count))]
+            self._tasks.append(asyncio.create_task(self._expire()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(
+        self, receipt: Receipt, engine: str, cache_key: str, client: str, quality: str = PDF_QUALITY
+    ) -> PDFJob:
+        """Queue a render; a PDF that is already cached completes the job immediately"""
+        job = PDFJob(receipt, engine, cache_key, client, quality)
+        if await self.fetch_cached(cache_key) is not None:
+            self._jobs[job.id] = job
+            self._set(job, DONE)
+            return job
+        try:
+            await self.queue.put(client, job)
+        except JobQueueFull:
+            self.rejected += 1
+            raise
+        self._jobs[job.id] = job
+        self._publish(job)
+        return job
+
+    def _set(self, job: PDFJob, status: str, error: Optional[str] = None):
+        job.status = status
+        job.error = error
+        job.updated = time.time()
+        self._publish(job)
+
+    def _publish(self, job: PDFJob):
+        job.changed.set()
+        job.changed = asyncio.Event()
+        if self._shared:
+            self._shared.put_async(job.id, json.dumps(job.record()).encode(), self.ttl)
+
+    async def _dispatch(self):
+        while True:
+            job = await self.queue.get()
+            self._set(job, RENDERING)
+            try:
+                while True:
+                    try:
+                        # The render stores the PDF in the PDF cache; jobs keep only its key
+                        await self.render(job.receipt, job.engine, job.quality)
+                        break
+                    except RendererBusy:
+                        # Synchronous downloads filled the pool; wait for a slot
+                        await asyncio.sleep(0.1)
+            except asyncio.CancelledError:
+                raise
+            except RenderTimeout:
+                count_error("render_timeout")
+                self.failed += 1
+                self._set(job, FAILED, "PDF generation timed out")
+            except Exception as e:
+                count_error(e)
+                logger.error(f"PDF job {job.id} for {job.receipt.receiptid} failed: {e}")
+                self.failed += 1
+                self._set(job, FAILED, "PDF generation failed")
+            else:
+                self.completed += 1
+                self._set(job, DONE)
+
+    async def _expire(self):
+        while True:
+            await asyncio.sleep(min(60.0, self.ttl))
+            cutoff = time.time() - self.ttl
+            for job_id, job in list(self._jobs.items()):
+                if job.status in FINISHED and job.updated < cutoff:
+                    del self._jobs[job_id]
+
+    async def status(self, job_id: str) -> Optional[dict]:
+        """Public status of a job from this process or, failing that, the shared store"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            record = job.record()
+            if job.status == QUEUED:
+                record["position"] = self.queue.position(job)
+            return record
+        data = await self._shared.aget(job_id) if self._shared else None
+        return json.loads(data) if data is not None else None
+
+    async def result(self, job_id: str) -> Optional[bytes]:
+        """PDF of a finished job from the PDF cache; a local job whose PDF was evicted is rendered again"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            if job.status != DONE:
+                return None
+            pdf = await self.fetch_cached(job.cache_key)
+            if pdf is None:
+                pdf = await self.render(job.receipt, job.engine, job.quality)
+            return pdf
+        record = await self.status(job_id)
+        if record is None or record["status"] != DONE:
+            return None
+        return await self.fetch_cached(record["cache_key"])
+
+    async def wait(self, job_id: str, timeout: float):
+        """Return when a local job changes, or after timeout (jobs in other processes are polled)"""
+        job = self._jobs.get(job_id)
+        try:
+            if job is not None:
+                await asyncio.wait_for(job.changed.wait(), timeout)
+            else:
+                await asyncio.sleep(min(timeout, 0.5))
+        except asyncio.TimeoutError:
+            pass
+
+    def stats(self) -> dict:
+        running = sum(1 for job in self._jobs.values() if job.status == RENDERING)
+        return {
+            "queued": len(self.queue),
+            "rendering": running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "tracked": len(self._jobs),
+        }
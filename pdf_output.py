@@ -0,0 +1,64 @@
+import io
+import os
+from typing import Dict, NamedTuple, Optional
+
+# Preset used when a request does not name one
+PDF_QUALITY = os.getenv("PDF_QUALITY", "print")
+# NATIVE_IMAGE_DPI is the older name for the print resolution
+PDF_PRINT_DPI = int(os.getenv("PDF_PRINT_DPI", os.getenv("NATIVE_IMAGE_DPI", "300")))
+
+
+class OutputPreset(NamedTuple):
+    """How receipt images are prepared before either engine embeds them"""
+    name: str
+    # Resolution images are resampled to at their printed size; None embeds the source file
+    image_dpi: Optional[int]
+    # Palette size images are reduced to, which makes their streams compress far better; None keeps full colour
+    colors: Optional[int]
+
+
+PRESETS: Dict[str, OutputPreset] = {preset.name: preset for preset in (
+    OutputPreset("original", None, None),
+    OutputPreset("print", PDF_PRINT_DPI, None),
+    OutputPreset("standard", 200, 256),
+    OutputPreset("compact", 96, 32),
+)}
+# Untuned output that bytes saved are measured against
+BASELINE_QUALITY = "original"
+
+# Printed width in CSS px of each image the receipt layouts embed
+IMAGE_DISPLAY_PX = {
+    "img/logo.png": 200,
+    "img/AbhijitSign.png": 100,
+}
+
+
+def prepare_image(image, display_px: float, preset: OutputPreset):
+    """Resample a decoded PIL image for its printed size and reduce its palette, per the preset"""
+    from PIL import Image
+
+    if preset.image_dpi:
+        target = int(display_px * preset.image_dpi / 96 + 0.5)
+        if image.width > target:
+            image = image.resize((target, round(image.height * target / image.width)), Image.LANCZOS)
+    if preset.colors:
+        mode = "RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB"
+        image = image.convert(mode).quantize(preset.colors, method=Image.Quantize.FASTOCTREE).convert(mode)
+    return image
+
+
+def prepare_png(data: bytes, display_px: float, preset: OutputPreset) -> bytes:
+    """prepare_image for encoded image bytes; returns an optimized PNG, or data unchanged when nothing applies"""
+    if not preset.image_dpi and not preset.colors:
+        return data
+    from PIL import Image
+
+    image = prepare_image(Image.open(io.BytesIO(data)), display_px, preset)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def bytes_saved(baseline: Optional[int], size: int) -> Optional[int]:
+    """Bytes a document saves against the baseline preset's size, when that size is known"""
+    return max(0, baseline - size) if baseline else None
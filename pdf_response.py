@@ -0,0 +1,61 @@
+import os
+import re
+import time
+import logging
+import tempfile
+from urllib.parse import quote
+
+from fastapi.responses import Response
+
+logger = logging.getLogger(__name__)
+
+# Files older than this are considered abandoned by the janitor
+TEMPFILE_MAX_AGE = int(os.getenv("TEMPFILE_MAX_AGE", "3600"))
+JANITOR_INTERVAL = int(os.getenv("JANITOR_INTERVAL", "3600"))
+
+# Older versions leaked NamedTemporaryFile(delete=False, suffix=".pdf") files in the temp directory
+LEGACY_TEMPFILE = re.compile(r"^tmp[a-z0-9_]{8}\.pdf$")
+
+
+def content_disposition(filename: str) -> str:
+    """Build an attachment header that is safe for any receipt ID"""
+    ascii_name = re.sub(r'[^A-Za-z0-9._-]', "_", filename)
+    if ascii_name == filename:
+        return f'attachment; filename="{filename}"'
+    return f"attachment; filename=\"{ascii_name}\"; filename*=utf-8''{quote(filename)}"
+
+
+def pdf_response(pdf_bytes: bytes, filename: str, headers: dict = None) -> Response:
+    """Send PDF bytes straight from memory; they are already there from the cache or render"""
+    headers = dict(headers or {})
+    headers["Content-Disposition"] = content_disposition(filename)
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+
+def purge_stale_tempfiles(directories=None, max_age: int = TEMPFILE_MAX_AGE) -> int:
+    """Delete PDF temp files leaked by older versions; returns count removed"""
+    directories = directories or [tempfile.gettempdir()]
+    cutoff = time.time() - max_age
+    uid = os.getuid() if hasattr(os, "getuid") else None
+    removed = 0
+    for directory in directories:
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if not LEGACY_TEMPFILE.match(entry.name):
+                continue
+            try:
+                stat = entry.stat(follow_symlinks=False)
+                if not entry.is_file(follow_symlinks=False) or stat.st_mtime > cutoff:
+                    continue
+                if uid is not None and stat.st_uid != uid:
+                    continue
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                continue
+    if removed:
+        logger.info(f"Removed {removed} stale PDF temp files")
+    return removed
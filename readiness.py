@@ -0,0 +1,47 @@
+import time
+import logging
+from typing import Awaitable, Dict
+
+logger = logging.getLogger(__name__)
+
+PENDING, READY, FAILED = "pending", "ready", "failed"
+
+
+class Readiness:
+    """Startup state of the components warmed up after the server is already answering"""
+
+    def __init__(self, *components: str):
+        self.started = time.monotonic()
+        self.states: Dict[str, str] = {name: PENDING for name in components}
+        self.errors: Dict[str, str] = {}
+        self.durations: Dict[str, float] = {}
+        self.ready_after = None
+
+    @property
+    def ready(self) -> bool:
+        return all(state == READY for state in self.states.values())
+
+    async def track(self, name: str, work: Awaitable):
+        """Await one component's warm-up and record how it went; failures are logged, not raised"""
+        started = time.monotonic()
+        try:
+            await work
+        except Exception as e:
+            self.states[name] = FAILED
+            self.errors[name] = str(e)
+            logger.error(f"Startup of {name} failed: {e}")
+        else:
+            self.states[name] = READY
+        self.durations[name] = round(time.monotonic() - started, 3)
+        if self.ready and self.ready_after is None:
+            self.ready_after = round(time.monotonic() - self.started, 3)
+            logger.info(f"Ready {self.ready_after}s after startup")
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "components": dict(self.states),
+            "errors": dict(self.errors),
+            "durations_seconds": dict(self.durations),
+            "ready_after_seconds": self.ready_after,
+        }
@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from models import Receipt
+from shared_cache import SharedCache, SHARED_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_CACHE_SIZE = int(os.getenv("RECEIPT_CACHE_SIZE", "10000"))
+RECEIPT_CACHE_TTL = float(os.getenv("RECEIPT_CACHE_TTL", "300"))
+# Unknown IDs are remembered for a shorter time so a newly issued receipt shows up quickly
+RECEIPT_CACHE_NEGATIVE_TTL = float(os.getenv("RECEIPT_CACHE_NEGATIVE_TTL", "30"))
+# How long past its TTL a receipt is still served while it is refreshed in the background (0 disables)
+RECEIPT_CACHE_STALE_TTL = float(os.getenv("RECEIPT_CACHE_STALE_TTL", "3600"))
+# Budget for receipts in the shared SQLite store (0 keeps the cache per process)
+RECEIPT_SHARED_CACHE_BYTES = int(os.getenv("RECEIPT_SHARED_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+FRESH, STALE, MISSING = "fresh", "stale", "missing"
+
+
+class ReceiptCache:
+    """LRU + TTL cache of receipts keyed by receiptid, including negative entries, backed by the shared store
+
+    Receipts past their TTL stay for stale_ttl more seconds. The read-through
+    fetches serve such a stale copy at once and refresh it in the background
+    (async callers) or fall back to it when the upstream fails (blocking callers).
+    Negative entries are never served stale, so a new receipt shows up quickly.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RECEIPT_CACHE_SIZE,
+        ttl: float = RECEIPT_CACHE_TTL,
+        negative_ttl: float = RECEIPT_CACHE_NEGATIVE_TTL,
+        stale_ttl: float = RECEIPT_CACHE_STALE_TTL,
+        shared_path: Optional[str] = SHARED_CACHE_PATH,
+        shared_bytes: int = RECEIPT_SHARED_CACHE_BYTES,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = max(0.0, stale_ttl)
+        self._lock = threading.Lock()
+        # receiptid -> (fresh until, kept until, row), monotonic times
+        self._entries: "OrderedDict[str, Tuple[float, float, Optional[Receipt]]]" = OrderedDict()
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        enabled = shared_path and shared_bytes > 0 and max_entries > 0
+        self._shared = SharedCache(shared_path, "receipts", shared_bytes) if enabled else None
+        self.hits = 0
+        self.shared_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def get(self, receipt_id: str) -> Tuple[bool, Optional[Receipt]]:
+        """Return (found, row); found with row None means the ID is known not to exist. Stale rows are misses"""
+        state, row = self._lookup(receipt_id)
+        if state == FRESH:
+            return True, row
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    async def aget(self, receipt_id: str) -> Tuple[bool, Optional[Receipt]]:
+        """get for the event loop; the shared store is read on a thread"""
+        state, row = await self._alookup(receipt_id)
+        if state == FRESH:
+            return True, row
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def _lookup(self, receipt_id: str) -> Tuple[str, Optional[Receipt]]:
+        """(FRESH, row or None), (STALE, row) or (MISSING, None); counts fresh hits"""
+        state, row = self._lookup_memory(receipt_id)
+        if state != MISSING or not self._shared:
+            return state, row
+        return self._from_shared(receipt_id, self._shared.get(receipt_id))
+
+    async def _alookup(self, receipt_id: str) -> Tuple[str, Optional[Receipt]]:
+        """_lookup with the shared store read off the event loop"""
+        state, row = self._lookup_memory(receipt_id)
+        if state != MISSING or not self._shared:
+            return state, row
+        return self._from_shared(receipt_id, await self._shared.aget(receipt_id))
+
+    def _lookup_memory(self, receipt_id: str) -> Tuple[str, Optional[Receipt]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(receipt_id)
+            if entry is not None:
+                fresh_until, keep_until, row = entry
+                if fresh_until > now:
+                    self._entries.move_to_end(receipt_id)
+                    self._count_hit(row)
+                    return FRESH, row
+                if keep_until > now:
+                    return STALE, row
+                del self._entries[receipt_id]
+        return MISSING, None
+
+    def _from_shared(self, receipt_id: str, data: Optional[bytes]) -> Tuple[str, Optional[Receipt]]:
+        if data is None:
+            return MISSING, None
+        # Another worker already loaded it; keep it as long as the shared entry
+        entry = json.loads(data)
+        row = Receipt.from_row(entry["row"]) if entry["row"] is not None else None
+        remaining = entry["expires"] - time.time()
+        self._put_memory(receipt_id, row, remaining, self.stale_ttl if row is not None else 0.0)
+        if remaining <= 0:
+            return (STALE, row) if row is not None else (MISSING, None)
+        with self._lock:
+            self.shared_hits += 1
+            self._count_hit(row)
+        return FRESH, row
+
+    def _count_hit(self, row: Optional[Receipt]):
+        if row is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+
+    def put(self, receipt_id: str, row: Optional[Receipt]):
+        ttl = self.ttl if row is not None else self.negative_ttl
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        stale_ttl = self.stale_ttl if row is not None else 0.0
+        self._put_memory(receipt_id, row, ttl, stale_ttl)
+        if self._shared:
+            entry = {"expires": time.time() + ttl, "row": row.to_dict() if row is not None else None}
+            # Written behind, off the caller's thread; the memory tier already answers this process
+            self._shared.put_async(receipt_id, json.dumps(entry).encode(), ttl + stale_ttl)
+
+    def _put_memory(self, receipt_id: str, row: Optional[Receipt], ttl: float, stale_ttl: float = 0.0):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[receipt_id] = (now + ttl, now + ttl + stale_ttl, row)
+            self._entries.move_to_end(receipt_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, receipt_id: str):
+        with self._lock:
+            self._entries.pop(receipt_id, None)
+        if self._shared:
+            self._shared.delete_async(receipt_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._shared:
+            self._shared.clear()
+
+    def _miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def _serve_stale(self):
+        with self._lock:
+            self.stale_hits += 1
+
+    def _revalidate(self, receipt_id: str, load: Callable[[], Awaitable[Tuple[bool, Optional[Receipt]]]]):
+        """Refresh a stale receipt in the background, once per receipt at a time"""
+        if receipt_id in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(receipt_id, load))
+        self._refreshing[receipt_id] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(receipt_id, None))
+
+    async def _refresh(self, receipt_id: str, load: Callable[[], Awaitable[Tuple[bool, Optional[Receipt]]]]):
+        try:
+            exists, row = await load()
+        except Exception as e:
+            with self._lock:
+                self.refresh_failures += 1
+            logger.warning(f"Refreshing receipt {receipt_id} failed, still serving the stale copy: {e}")
+            return
+        with self._lock:
+            self.refreshes += 1
+        if row is not None or not exists:
+            self.put(receipt_id, row)
+        else:
+            # Loaded with the stale row's phone, so the phone changed; drop the copy
+            self.invalidate(receipt_id)
+
+    async def fetch(self, receipt_id: str, loader: Callable[[str], Awaitable[Optional[Receipt]]]) -> Optional[Receipt]:
+        """Read-through lookup for async callers"""
+        state, row = await self._alookup(receipt_id)
+        if state == FRESH:
+            return row
+
+        async def load():
+            loaded = await loader(receipt_id)
+            return loaded is not None, loaded
+
+        if state == STALE:
+            self._serve_stale()
+            self._revalidate(receipt_id, load)
+            return row
+        self._miss()
+        row = await loader(receipt_id)
+        self.put(receipt_id, row)
+        return row
+
+    def fetch_sync(self, receipt_id: str, loader: Callable[[str], Optional[Receipt]]) -> Optional[Receipt]:
+        """Read-through lookup for blocking callers; a stale copy is returned only if reloading fails"""
+        state, row = self._lookup(receipt_id)
+        if state == FRESH:
+            return row
+        self._miss()
+        try:
+            fresh = loader(receipt_id)
+        except Exception:
+            if state != STALE:
+                raise
+            self._serve_stale()
+            return row
+        self.put(receipt_id, fresh)
+        return fresh
+
+    async def fetch_verified(
+        self,
+        receipt_id: str,
+        phone_digits: str,
+        loader: Callable[[str, str], Awaitable[Tuple[bool, Optional[Receipt]]]],
+    ) -> Tuple[bool, Optional[Receipt]]:
+        """(exists, receipt) where receipt is set only if the phone matches; misses match in the database"""
+        state, row = await self._alookup(receipt_id)
+        if state == FRESH:
+            return row is not None, row if row is not None and row.phone_digits == phone_digits else None
+        if state == STALE:
+            self._serve_stale()
+            # Reloaded with the stored phone, so the refresh works whichever phone this request gave
+            self._revalidate(receipt_id, lambda: loader(receipt_id, row.phone_digits))
+            return True, row if row.phone_digits == phone_digits else None
+        self._miss()
+        exists, row = await loader(receipt_id, phone_digits)
+        self._remember(receipt_id, exists, row)
+        return exists, row
+
+    def fetch_verified_sync(
+        self,
+        receipt_id: str,
+        phone_digits: str,
+        loader: Callable[[str, str], Tuple[bool, Optional[Receipt]]],
+    ) -> Tuple[bool, Optional[Receipt]]:
+        """Blocking version of fetch_verified; a stale copy is used only if reloading fails"""
+        state, row = self._lookup(receipt_id)
+        if state == FRESH:
+            return row is not None, row if row is not None and row.phone_digits == phone_digits else None
+        self._miss()
+        try:
+            exists, fresh = loader(receipt_id, phone_digits)
+        except Exception:
+            if state != STALE:
+                raise
+            self._serve_stale()
+            return True, row if row.phone_digits == phone_digits else None
+        self._remember(receipt_id, exists, fresh)
+        return exists, fresh
+
+    def _remember(self, receipt_id: str, exists: bool, row: Optional[Receipt]):
+        # A phone mismatch returns no row, so there is nothing to cache for it
+        if row is not None:
+            self.put(receipt_id, row)
+        elif not exists:
+            self.put(receipt_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "stale_hits": self.stale_hits,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "refreshing": len(self._refreshing),
+            "entries": len(self._entries),
+        }
+
+
+# Shared by the web endpoints and ReceiptDatabase
+receipt_cache = ReceiptCache()
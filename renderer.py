@@ -0,0 +1,318 @@
+import os
+import signal
+import asyncio
+import logging
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from models import Receipt
+from assets import AssetFetcher
+from pdf_output import OutputPreset, PRESETS, PDF_QUALITY, BASELINE_QUALITY
+from templating import environment, TEMPLATE_DIR
+
+logger = logging.getLogger(__name__)
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 1)))
+RENDER_QUEUE_DEPTH = int(os.getenv("RENDER_QUEUE_DEPTH", "32"))
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "30"))
+RENDER_MAX_TASKS_PER_CHILD = int(os.getenv("RENDER_MAX_TASKS_PER_CHILD", "0")) or None
+# Extra seconds past RENDER_TIMEOUT before a worker that ignored its own deadline
+# (stuck inside C code, where the alarm cannot interrupt it) is killed
+RENDER_KILL_GRACE = float(os.getenv("RENDER_KILL_GRACE", "5"))
+
+# "weasyprint" lays out receipt_display2.html; "native" draws the same layout directly
+ENGINES = ("weasyprint", "native")
+PDF_ENGINE = os.getenv("PDF_ENGINE", "weasyprint")
+
+PDF_TEMPLATE = "receipt_display2.html"
+
+# Row used to warm fonts, CSS and images in each worker before real traffic arrives
+WARMUP_RECEIPT = Receipt.from_row({
+    "receiptid": "WARMUP",
+    "transaction_date": "2025-01-01T00:00:00",
+    "customer_name": "Warmup",
+    "customer_phone": "0000000000",
+    "shift": "",
+    "plantype": "",
+    "payment_mode": "Cash",
+    "payment_amount": 0,
+    "joining_date": "2025-01-01",
+    "expiration_date": "2025-01-01",
+})
+
+
+class RendererBusy(Exception):
+    """Raised when the render queue is full"""
+
+
+class RenderTimeout(Exception):
+    """Raised when a render job exceeds its deadline"""
+
+
+# ---- Worker process side -------------------------------------------------
+
+_template = None
+_HTML = None
+# Where workers announce (job id, pid) when they pick up a render
+_started = None
+_base_url = None
+_native = None
+# Per preset: the asset fetcher serving its resampled images and WeasyPrint's decoded-image cache,
+# which is keyed by URL and so must not be shared across presets
+_fetchers: Dict[str, AssetFetcher] = {}
+_image_caches: Dict[str, dict] = {}
+# Size of the warm-up receipt at the baseline preset, per engine
+_baseline_bytes: Dict[str, int] = {}
+
+
+def _init_worker(template_dir: str, template_name: str, base_url: str, started=None):
+    """Import the render engines, compile the receipt template and run the warm-up renders"""
+    global _template, _HTML, _base_url, _native, _started
+    _started = started
+    # Engines load only here, so the web process never imports reportlab or WeasyPrint
+    from native_pdf import NativeReceiptRenderer, NATIVE_AVAILABLE
+    worker_logger = logging.getLogger(__name__)
+
+    # Same environment and bytecode cache as the web workers, so only the first process compiles
+    _template = environment(template_dir).get_template(template_name)
+    _base_url = base_url
+    if NATIVE_AVAILABLE:
+        try:
+            _native = NativeReceiptRenderer()
+        except Exception as e:
+            worker_logger.warning(f"Native PDF engine unavailable: {e}")
+    try:
+        from weasyprint import HTML
+        _HTML = HTML
+    except (ImportError, OSError):
+        # Only fatal when there is no native engine to fall back on
+        if _native is None:
+            raise
+        worker_logger.warning("WeasyPrint unavailable; only the native engine will work")
+    for engine in ENGINES:
+        try:
+            _render_pdf(WARMUP_RECEIPT, engine)
+            # Also the reference that bytes saved are reported against
+            _baseline_bytes[engine] = len(_render_pdf(WARMUP_RECEIPT, engine, BASELINE_QUALITY))
+        except Exception as e:
+            worker_logger.warning(f"Render worker warm-up failed for {engine}: {e}")
+
+
+def _weasyprint_options(preset: OutputPreset) -> dict:
+    if preset.name not in _fetchers:
+        _fetchers[preset.name] = AssetFetcher(preset=preset)
+        _image_caches[preset.name] = {}
+    # Fonts are subset and streams compressed by default; images are already resampled by the fetcher
+    return {
+        "url_fetcher": _fetchers[preset.name],
+        "cache": _image_caches[preset.name],
+        "optimize_images": preset.image_dpi is not None,
+        "dpi": preset.image_dpi,
+    }
+
+
+def _render_documents(receipts: List[Receipt], engine: str, quality: str) -> bytes:
+    """Render receipts as the pages of one PDF inside a worker process"""
+    preset = PRESETS[quality]
+    if engine == "native" and _native is not None:
+        try:
+            return _native.render_many(receipts, preset) if len(receipts) > 1 else _native.render(receipts[0], preset)
+        except RenderTimeout:
+            raise
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Native render failed, falling back to WeasyPrint: {e}")
+    if _HTML is None:
+        raise RuntimeError("WeasyPrint is not available")
+    options = _weasyprint_options(preset)
+    fetcher = options.pop("url_fetcher")
+    documents = [
+        _HTML(string=_template.render(receipt=receipt), base_url=_base_url, url_fetcher=fetcher).render(**options)
+        for receipt in receipts
+    ]
+    # One document, so images shared by the pages are embedded once
+    pages = [page for document in documents for page in document.pages]
+    return documents[0].copy(pages).write_pdf(**options)
+
+
+def _render_pdf(receipt: Receipt, engine: str = PDF_ENGINE, quality: str = PDF_QUALITY) -> bytes:
+    """Render a receipt to PDF bytes inside a worker process"""
+    return _render_documents([receipt], engine, quality)
+
+
+def _alarm(signum, frame):
+    raise RenderTimeout("Render exceeded its deadline")
+
+
+def _render_job(job_id: int, receipts: List[Receipt], engine: str, quality: str, timeout: float) -> bytes:
+    """_render_documents with a deadline that starts now, when this worker picks the job up"""
+    if _started is not None:
+        _started.put((job_id, os.getpid()))
+    if not hasattr(signal, "setitimer"):
+        return _render_documents(receipts, engine, quality)
+    previous = signal.signal(signal.SIGALRM, _alarm)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return _render_documents(receipts, engine, quality)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _ping() -> Dict[str, int]:
+    return dict(_baseline_bytes)
+
+
+# ---- Event loop side -----------------------------------------------------
+
+class RenderPool:
+    """Pool of pre-warmed WeasyPrint worker processes awaited from async handlers"""
+
+    def __init__(
+        self,
+        workers: int = RENDER_WORKERS,
+        queue_depth: int = RENDER_QUEUE_DEPTH,
+        timeout: float = RENDER_TIMEOUT,
+        max_tasks_per_child: Optional[int] = RENDER_MAX_TASKS_PER_CHILD,
+        base_url: Optional[str] = None,
+    ):
+        self.workers = max(1, workers)
+        self.queue_depth = max(0, queue_depth)
+        self.timeout = timeout
+        self.max_tasks_per_child = max_tasks_per_child
+        self.base_url = base_url or os.getcwd()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._warmups = []
+        self._pending = 0
+        self.restarts = 0
+        self.killed = 0
+        self._job_ids = itertools.count()
+        # Render jobs awaiting a worker: job id -> (loop, event set on pickup, [worker pid])
+        self._waiting: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Event, list]] = {}
+        self._started = None
+        # Warm-up receipt size at the baseline preset per engine, reported by the workers
+        self.baseline_bytes: Dict[str, int] = {}
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(TEMPLATE_DIR, PDF_TEMPLATE, self.base_url, self._started),
+            max_tasks_per_child=self.max_tasks_per_child,
+        )
+
+    def start(self):
+        """Create the pool and spawn every worker so warm-up happens before the first request"""
+        if self._started is None:
+            self._started = multiprocessing.get_context("spawn").Queue()
+            threading.Thread(target=self._watch_pickups, args=(self._started,), daemon=True).start()
+        if self._executor is None:
+            self._executor = self._new_executor()
+            self._warmups = [self._executor.submit(_ping) for _ in range(self.workers)]
+            logger.info(f"Render pool started with {self.workers} workers")
+
+    async def warm_up(self):
+        """Start the pool and return once every worker has finished its warm-up renders"""
+        self.start()
+        for sizes in await asyncio.gather(*(asyncio.wrap_future(future) for future in self._warmups)):
+            self.baseline_bytes.update(sizes)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._started is not None:
+            self._started.put(None)
+            self._started = None
+
+    def _watch_pickups(self, started):
+        """Thread relaying worker pickups to the jobs awaiting them"""
+        while True:
+            item = started.get()
+            if item is None:
+                return
+            job_id, pid = item
+            waiter = self._waiting.get(job_id)
+            if waiter is not None:
+                loop, event, worker = waiter
+                worker.append(pid)
+                loop.call_soon_threadsafe(event.set)
+
+    def _kill(self, executor: ProcessPoolExecutor, pid: int):
+        """Terminate one hung worker; the pool then reports broken and is replaced"""
+        for proc in list((getattr(executor, "_processes", None) or {}).values()):
+            if proc.pid == pid:
+                logger.warning(f"Terminating render worker {pid}, which overran its deadline")
+                proc.terminate()
+                self.killed += 1
+        self._restart(executor, terminate=False)
+
+    def _restart(self, executor: ProcessPoolExecutor, terminate: bool = True):
+        """Replace a broken pool; no-op if another job already replaced it"""
+        if executor is not self._executor:
+            return
+        logger.warning("Restarting render pool")
+        if terminate:
+            for proc in list((getattr(executor, "_processes", None) or {}).values()):
+                proc.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self.restarts += 1
+        self.start()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def render(self, receipt: Receipt, engine: str = PDF_ENGINE, quality: str = PDF_QUALITY) -> bytes:
+        """Render a receipt to PDF bytes without blocking the event loop"""
+        return await self._submit([receipt], engine, quality, self.timeout)
+
+    async def render_many(self, receipts: List[Receipt], engine: str = PDF_ENGINE, quality: str = PDF_QUALITY) -> bytes:
+        """Render receipts as the pages of one PDF; the deadline scales with the page count"""
+        return await self._submit(receipts, engine, quality, self.timeout * max(1, len(receipts)))
+
+    async def _submit(self, receipts: List[Receipt], engine: str, quality: str, timeout: float) -> bytes:
+        if self._pending >= self.workers + self.queue_depth:
+            raise RendererBusy("Render queue is full")
+        self.start()
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        try:
+            for attempt in range(2):
+                executor = self._executor
+                job_id = next(self._job_ids)
+                picked_up, worker = asyncio.Event(), []
+                self._waiting[job_id] = (loop, picked_up, worker)
+                try:
+                    future = loop.run_in_executor(executor, _render_job, job_id, receipts, engine, quality, timeout)
+                    return await self._await_render(executor, future, picked_up, worker, timeout)
+                except BrokenProcessPool:
+                    # A worker died (segfault, OOM kill, or a hung one was killed); retry once on a fresh pool
+                    self._restart(executor)
+                    if attempt:
+                        raise
+                finally:
+                    self._waiting.pop(job_id, None)
+        finally:
+            self._pending -= 1
+
+    async def _await_render(self, executor, future, picked_up: asyncio.Event, worker: list, timeout: float) -> bytes:
+        # Time queued behind other renders does not count: the deadline starts at pickup.
+        # The worker enforces it itself and raises RenderTimeout without dying.
+        pickup = asyncio.ensure_future(picked_up.wait())
+        try:
+            await asyncio.wait({future, pickup}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            pickup.cancel()
+        try:
+            return await asyncio.wait_for(future, timeout + RENDER_KILL_GRACE)
+        except asyncio.TimeoutError:
+            # The worker is stuck where its alarm cannot fire; only it is terminated
+            if worker:
+                self._kill(executor, worker[0])
+            raise RenderTimeout(f"Render exceeded {timeout}s")
@@ -0,0 +1,357 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from models import normalize_phone
+from async_db import PostgrestError, UNDEFINED_COLUMN
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; every process then syncs
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Path of the local SQLite replica; empty disables it
+REPLICA_PATH = os.getenv("REPLICA_PATH", "")
+REPLICA_SYNC_INTERVAL = float(os.getenv("REPLICA_SYNC_INTERVAL", "30"))
+# Last-modified column (see sql/receipts_updated_at.sql) that incremental syncs page on,
+# so edits arrive with the next sync; empty syncs new ids only and leaves edits to the full pass
+REPLICA_UPDATED_COLUMN = os.getenv("REPLICA_UPDATED_COLUMN", "updated_at")
+# Periodic full pass to drop rows deleted upstream (and pick up edits without REPLICA_UPDATED_COLUMN)
+REPLICA_FULL_SYNC_INTERVAL = float(os.getenv("REPLICA_FULL_SYNC_INTERVAL", "3600"))
+REPLICA_BATCH_SIZE = int(os.getenv("REPLICA_BATCH_SIZE", "1000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS receipts (
+    id INTEGER PRIMARY KEY,
+    receiptid TEXT NOT NULL,
+    customer_phone_norm TEXT NOT NULL DEFAULT '',
+    created_at TEXT,
+    row TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS receipts_receiptid ON receipts (receiptid);
+CREATE INDEX IF NOT EXISTS receipts_phone_norm ON receipts (customer_phone_norm);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _quoted(value) -> str:
+    """A value quoted for a PostgREST logical filter"""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class ReceiptReplica:
+    """Local indexed SQLite copy of the receipts table, kept current by an incremental syncer"""
+
+    def __init__(
+        self, path: str, rest=None, batch_size: int = REPLICA_BATCH_SIZE, updated_column: str = REPLICA_UPDATED_COLUMN
+    ):
+        self.path = path
+        self.rest = rest
+        self.batch_size = batch_size
+        self.updated_column = updated_column
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._leader_file = None
+        self.last_id = int(self._state("last_id") or 0)
+        self.last_created_at = self._state("last_created_at")
+        self._load_updated_mark()
+        self.last_sync: Optional[float] = None
+        # A replica restored from disk only needs an incremental pull at startup
+        self.last_full_sync: Optional[float] = time.time() if self.last_id else None
+        self.deleted = 0
+        self.last_error: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # Connections must not cross fork(), so each worker process opens its own
+        if self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._connection, self._pid = conn, os.getpid()
+        return self._connection
+
+    def _state(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _load_updated_mark(self):
+        # (updated_at, id) of the last row pulled in last-modified order
+        updated_at = self._state("last_updated_at")
+        self.last_updated: Optional[Tuple[str, int]] = (
+            (updated_at, int(self._state("last_updated_id") or 0)) if updated_at else None
+        )
+
+    # ---- Reads -------------------------------------------------------------
+
+    def get(self, receipt_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT row FROM receipts WHERE receiptid = ?", (receipt_id,)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def get_verified(self, receipt_id: str, phone_number: str) -> Optional[dict]:
+        """Row for a receipt ID only if its normalized phone matches"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT row FROM receipts WHERE receiptid = ? AND customer_phone_norm = ?",
+                (receipt_id, normalize_phone(phone_number)),
+            ).fetchone()
+        if row is None:
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def exists(self, receipt_id: str) -> bool:
+        """Whether a receipt ID is present, without decoding its row"""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM receipts WHERE receiptid = ?", (receipt_id,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def phone_digits(self, receipt_ids: List[str]) -> Dict[str, str]:
+        """Normalized phone per receipt ID present in the replica"""
+        found = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(receipt_ids), 500):
+                chunk = receipt_ids[start:start + 500]
+                found.update(self._conn.execute(
+                    f"SELECT receiptid, customer_phone_norm FROM receipts WHERE receiptid IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall())
+        self.hits += len(found)
+        self.misses += len(receipt_ids) - len(found)
+        return found
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM receipts").fetchone()[0]
+
+    # ---- Writes ------------------------------------------------------------
+
+    def upsert(self, rows: List[dict], updated: Optional[Tuple[str, int]] = None):
+        """Insert or replace rows and advance the id watermark (and the last-modified one, when given)"""
+        if not rows:
+            return
+        records = [
+            (
+                row["id"],
+                row.get("receiptid") or "",
+                normalize_phone(row.get("customer_phone")),
+                row.get("created_at"),
+                json.dumps(row, default=str),
+            )
+            for row in rows
+        ]
+        newest = max(rows, key=lambda r: r["id"])
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO receipts (id, receiptid, customer_phone_norm, created_at, row) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    records,
+                )
+                if newest["id"] > self.last_id:
+                    self.last_id = newest["id"]
+                    self.last_created_at = newest.get("created_at")
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+                        [("last_id", str(self.last_id)), ("last_created_at", self.last_created_at)],
+                    )
+                if updated is not None:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+                        [("last_updated_at", updated[0]), ("last_updated_id", str(updated[1]))],
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if updated is not None:
+            self.last_updated = updated
+
+    def delete_missing(self, seen: Set[int]) -> int:
+        """Delete local rows whose ids a complete pass over the source did not return"""
+        with self._lock:
+            local = [row[0] for row in self._conn.execute("SELECT id FROM receipts")]
+            gone = [row_id for row_id in local if row_id not in seen]
+            if not gone:
+                return 0
+            self._conn.execute("BEGIN")
+            try:
+                for start in range(0, len(gone), 500):
+                    chunk = gone[start:start + 500]
+                    self._conn.execute(f"DELETE FROM receipts WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.deleted += len(gone)
+        return len(gone)
+
+    # ---- Sync --------------------------------------------------------------
+
+    async def _pull(self, after_id: int, seen: Optional[Set[int]] = None) -> int:
+        pulled = 0
+        while True:
+            rows = await self.rest.select(
+                "receipts",
+                params={"id": f"gt.{after_id}", "order": "id.asc"},
+                limit=self.batch_size,
+            )
+            if not rows:
+                break
+            await asyncio.to_thread(self.upsert, rows)
+            if seen is not None:
+                seen.update(row["id"] for row in rows)
+            pulled += len(rows)
+            after_id = rows[-1]["id"]
+            if len(rows) < self.batch_size:
+                break
+        return pulled
+
+    async def _pull_updated(self) -> int:
+        """Pull rows inserted or edited since the last-modified watermark, paging on (updated_at, id)"""
+        column = self.updated_column
+        pulled = 0
+        while True:
+            params = {"order": f"{column}.asc,id.asc"}
+            if self.last_updated is not None:
+                updated_at, row_id = _quoted(self.last_updated[0]), self.last_updated[1]
+                params["or"] = f"({column}.gt.{updated_at},and({column}.eq.{updated_at},id.gt.{row_id}))"
+            rows = await self.rest.select("receipts", params=params, limit=self.batch_size)
+            if not rows:
+                break
+            await asyncio.to_thread(self.upsert, rows, (rows[-1][column], rows[-1]["id"]))
+            pulled += len(rows)
+            if len(rows) < self.batch_size:
+                break
+        return pulled
+
+    async def _pull_incremental(self) -> int:
+        if self.updated_column:
+            try:
+                return await self._pull_updated()
+            except PostgrestError as e:
+                if e.code != UNDEFINED_COLUMN:
+                    raise
+                logger.error(
+                    f"Replica sync on {self.updated_column} failed, syncing new ids only from now on: {e}"
+                )
+                self.updated_column = ""
+        return await self._pull(self.last_id)
+
+    async def sync_once(self, full: bool = False) -> int:
+        """Pull rows changed since the last sync, or every row when full=True.
+
+        A full pass ends by deleting local rows the source no longer has.
+        """
+        # Pulling from an empty watermark is a full pass in all but name
+        fresh = not self.last_id
+        seen: Set[int] = set()
+        deleted = 0
+        try:
+            if full:
+                pulled = await self._pull(0, seen)
+                deleted = await asyncio.to_thread(self.delete_missing, seen)
+            else:
+                pulled = await self._pull_incremental()
+        except Exception as e:
+            self.last_error = str(e)
+            raise
+        self.last_error = None
+        self.last_sync = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('last_sync', ?)", (str(self.last_sync),)
+            )
+        if full or fresh:
+            self.last_full_sync = self.last_sync
+        if pulled or deleted:
+            logger.info(f"Replica synced {pulled} receipts, deleted {deleted} (watermark id={self.last_id})")
+        return pulled
+
+    def _lead(self) -> bool:
+        """Take the host-wide sync lock so one worker process syncs and the others only read"""
+        if fcntl is None:
+            return True
+        if self._leader_file is None:
+            self._leader_file = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(self._leader_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    async def run(self, interval: float = REPLICA_SYNC_INTERVAL, full_interval: float = REPLICA_FULL_SYNC_INTERVAL):
+        """Background syncer; processes that lose the sync lock keep retrying it in case the leader exits"""
+        leading = False
+        while True:
+            if not leading:
+                leading = self._lead()
+                if not leading:
+                    await asyncio.sleep(interval)
+                    continue
+                # Pick up the watermark the previous leader left behind
+                with self._lock:
+                    self.last_id = int(self._state("last_id") or 0)
+                    self.last_created_at = self._state("last_created_at")
+                    self._load_updated_mark()
+            full = self.last_full_sync is not None and time.time() - self.last_full_sync > full_interval
+            try:
+                await self.sync_once(full=full)
+            except Exception as e:
+                logger.warning(f"Replica sync failed: {e}")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        with self._lock:
+            # The syncing worker may be another process
+            last_sync = float(self._state("last_sync") or 0) or self.last_sync
+            last_id = int(self._state("last_id") or 0)
+            last_created_at = self._state("last_created_at")
+            last_updated_at = self._state("last_updated_at")
+        return {
+            "rows": self.count(),
+            "watermark_id": last_id,
+            "watermark_created_at": last_created_at,
+            "watermark_updated_at": last_updated_at,
+            "lag_seconds": round(time.time() - last_sync, 1) if last_sync else None,
+            "last_error": self.last_error,
+            "deleted": self.deleted,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = self._pid = None
+        if self._leader_file is not None:
+            self._leader_file.close()
+            self._leader_file = None
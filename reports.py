@@ -0,0 +1,342 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from filters import parse_date
+from models import as_int
+from shared_cache import SharedCache, SHARED_CACHE_PATH, CACHE_DIR, private_file
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# SQLite file holding the daily rollups, shared by every worker process on the host
+REPORTS_PATH = os.getenv("REPORTS_PATH", os.path.join(CACHE_DIR, "reports.sqlite3"))
+# Reports pull receipts added since the last pull at most this often
+REPORTS_REFRESH_INTERVAL = float(os.getenv("REPORTS_REFRESH_INTERVAL", "60"))
+# Periodic rebuild from every row to pick up receipts edited after insert
+REPORTS_REBUILD_INTERVAL = float(os.getenv("REPORTS_REBUILD_INTERVAL", "86400"))
+REPORTS_BATCH_SIZE = int(os.getenv("REPORTS_BATCH_SIZE", "1000"))
+# Budget and lifetime of cached report results; keys include the rollup version, so edits never serve old totals
+REPORT_CACHE_BYTES = int(os.getenv("REPORT_CACHE_BYTES", str(8 * 1024 * 1024)))
+REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", "3600"))
+
+# Only the columns the rollups read are fetched
+ROLLUP_COLUMNS = "id,transaction_date,shift,plantype,payment_mode,payment_amount,joining_date,expiration_date"
+DIMENSIONS = ("shift", "plantype", "payment_mode")
+GROUPS = ("month",) + DIMENSIONS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS revenue_daily (
+    day TEXT NOT NULL,
+    shift TEXT NOT NULL,
+    plantype TEXT NOT NULL,
+    payment_mode TEXT NOT NULL,
+    receipts INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    PRIMARY KEY (day, shift, plantype, payment_mode)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS membership_daily (
+    day TEXT NOT NULL,
+    shift TEXT NOT NULL,
+    plantype TEXT NOT NULL,
+    payment_mode TEXT NOT NULL,
+    joined INTEGER NOT NULL,
+    expired INTEGER NOT NULL,
+    PRIMARY KEY (day, shift, plantype, payment_mode)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# (day, shift, plantype, payment_mode) -> [receipts, amount] or [joined, expired]
+Rollup = Dict[Tuple[str, str, str, str], List[int]]
+
+
+def _day(value) -> Optional[str]:
+    """ISO date of a date, datetime or ISO string; None when missing or unparseable"""
+    if not value:
+        return None
+    parsed = value if isinstance(value, date) else parse_date(str(value))
+    if isinstance(parsed, datetime):
+        parsed = parsed.date()
+    return parsed.isoformat() if parsed else None
+
+
+def aggregate(rows: List[dict], revenue: Rollup, memberships: Rollup):
+    """Add rows to per-day revenue and membership join/expiry counts"""
+    for row in rows:
+        dims = tuple(row.get(column) or "" for column in DIMENSIONS)
+        day = _day(row.get("transaction_date"))
+        if day:
+            totals = revenue.setdefault((day,) + dims, [0, 0])
+            totals[0] += 1
+            totals[1] += as_int(row.get("payment_amount"))
+        joined, expires = _day(row.get("joining_date")), _day(row.get("expiration_date"))
+        # A membership counts as active from its joining date through its expiration date
+        if joined and expires and joined <= expires:
+            memberships.setdefault((joined,) + dims, [0, 0])[0] += 1
+            memberships.setdefault((expires,) + dims, [0, 0])[1] += 1
+
+
+def months(start: date, end: date) -> List[Tuple[str, date, date]]:
+    """("YYYY-MM", first day, last day) for each month overlapping [start, end], clipped to it"""
+    spans = []
+    first = start
+    while first <= end:
+        next_month = (first.replace(day=1) + timedelta(days=32)).replace(day=1)
+        last = min(end, next_month - timedelta(days=1))
+        spans.append((first.strftime("%Y-%m"), first, last))
+        first = next_month
+    return spans
+
+
+class RevenueRollups:
+    """Daily revenue and membership rollups in SQLite, kept current incrementally from the receipts table
+
+    Revenue is summed per transaction day and (shift, plantype, payment_mode).
+    Memberships are stored as joins per joining day and expiries per
+    expiration day, so the memberships active at any time in [a, b] are the
+    joins up to b minus the expiries before a. Reports therefore scan days
+    times groups rather than receipts, and new receipts are added by id
+    watermark without touching older days.
+    """
+
+    def __init__(
+        self,
+        path: str = REPORTS_PATH,
+        rest=None,
+        batch_size: int = REPORTS_BATCH_SIZE,
+        refresh_interval: float = REPORTS_REFRESH_INTERVAL,
+        rebuild_interval: float = REPORTS_REBUILD_INTERVAL,
+        cache_path: Optional[str] = SHARED_CACHE_PATH,
+        cache_bytes: int = REPORT_CACHE_BYTES,
+    ):
+        self.path = path
+        self.rest = rest
+        self.batch_size = batch_size
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._flight = SingleFlight()
+        self._cache = SharedCache(cache_path, "reports", cache_bytes) if cache_path and cache_bytes > 0 else None
+        self.last_refresh = 0.0
+        self.rows_applied = 0
+        self.rebuilds = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # Connections must not cross fork(), so each worker process opens its own
+        if self._pid != os.getpid():
+            private_file(self.path)
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._connection, self._pid = conn, os.getpid()
+        return self._connection
+
+    def _state(self) -> dict:
+        return dict(self._conn.execute("SELECT key, value FROM rollup_state").fetchall())
+
+    def version(self) -> str:
+        """Changes whenever the rollups do; part of every cached report key"""
+        with self._lock:
+            state = self._state()
+        return f"{state.get('generation', '0')}.{state.get('last_id', '0')}"
+
+    # ---- Maintenance -------------------------------------------------------
+
+    async def _pull(self, after_id: int) -> Tuple[Rollup, Rollup, int, int]:
+        """Aggregate rows past after_id; returns (revenue, memberships, last id, rows read)"""
+        revenue: Rollup = {}
+        memberships: Rollup = {}
+        read = 0
+        while True:
+            rows = await self.rest.select(
+                "receipts",
+                columns=ROLLUP_COLUMNS,
+                params={"id": f"gt.{after_id}", "order": "id.asc"},
+                limit=self.batch_size,
+            )
+            if not rows:
+                break
+            aggregate(rows, revenue, memberships)
+            read += len(rows)
+            after_id = rows[-1]["id"]
+            if len(rows) < self.batch_size:
+                break
+        return revenue, memberships, after_id, read
+
+    def _apply(self, revenue: Rollup, memberships: Rollup, from_id: int, last_id: int, rebuild: bool) -> bool:
+        """Add (or with rebuild, replace with) pulled rollups; False if another process got there first"""
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                state = self._state()
+                if not rebuild and int(state.get("last_id", 0)) != from_id:
+                    conn.execute("ROLLBACK")
+                    return False
+                if rebuild:
+                    conn.execute("DELETE FROM revenue_daily")
+                    conn.execute("DELETE FROM membership_daily")
+                conn.executemany(
+                    "INSERT INTO revenue_daily VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT DO UPDATE SET "
+                    "receipts = receipts + excluded.receipts, amount = amount + excluded.amount",
+                    [key + tuple(totals) for key, totals in revenue.items()],
+                )
+                conn.executemany(
+                    "INSERT INTO membership_daily VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT DO UPDATE SET "
+                    "joined = joined + excluded.joined, expired = expired + excluded.expired",
+                    [key + tuple(counts) for key, counts in memberships.items()],
+                )
+                updates = [("last_id", str(last_id))]
+                if rebuild:
+                    updates.append(("generation", str(int(state.get("generation", 0)) + 1)))
+                    updates.append(("last_rebuild", str(time.time())))
+                conn.executemany("INSERT OR REPLACE INTO rollup_state (key, value) VALUES (?, ?)", updates)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return True
+
+    async def _refresh(self):
+        with self._lock:
+            state = self._state()
+        from_id = int(state.get("last_id", 0))
+        rebuild = time.time() - float(state.get("last_rebuild", 0)) > self.rebuild_interval
+        revenue, memberships, last_id, read = await self._pull(0 if rebuild else from_id)
+        applied = await asyncio.to_thread(self._apply, revenue, memberships, from_id, last_id, rebuild)
+        if applied:
+            self.rows_applied += read
+            if rebuild:
+                self.rebuilds += 1
+                logger.info(f"Report rollups rebuilt from {read} receipts (watermark id={last_id})")
+            elif read:
+                logger.info(f"Report rollups added {read} receipts (watermark id={last_id})")
+        self.last_refresh = time.monotonic()
+
+    async def refresh(self, force: bool = False):
+        """Bring the rollups up to date, at most once per refresh_interval; concurrent callers share one pull"""
+        if not force and time.monotonic() - self.last_refresh < self.refresh_interval:
+            return
+        try:
+            await self._flight.do("refresh", self._refresh)
+        except Exception as e:
+            self.last_error = str(e)
+            # Rollups built earlier still answer while the database is unavailable
+            if self.version() == "0.0":
+                raise
+            logger.warning(f"Report rollup refresh failed, serving the previous rollups: {e}")
+        else:
+            self.last_error = None
+
+    # ---- Queries -----------------------------------------------------------
+
+    def _revenue(self, start: date, end: date, group_by: List[str]) -> List[dict]:
+        columns = ["substr(day, 1, 7)" if group == "month" else group for group in group_by]
+        select = "".join(f"{column}, " for column in columns)
+        grouping = f" GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}" if columns else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {select}SUM(receipts), SUM(amount) FROM revenue_daily WHERE day BETWEEN ? AND ?{grouping}",
+                (start.isoformat(), end.isoformat()),
+            ).fetchall()
+        return [
+            {**dict(zip(group_by, row)), "receipts": row[-2] or 0, "amount": row[-1] or 0}
+            for row in rows
+            if row[-2]
+        ]
+
+    def _active(self, start: date, end: date, dimensions: List[str]) -> Counter:
+        """Memberships active at any time in [start, end], per dimension values"""
+        select = "".join(f"{column}, " for column in dimensions)
+        grouping = f" GROUP BY {', '.join(dimensions)}" if dimensions else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {select}SUM(joined) - SUM(CASE WHEN day < ? THEN expired ELSE 0 END) "
+                f"FROM membership_daily WHERE day <= ?{grouping}",
+                (start.isoformat(), end.isoformat()),
+            ).fetchall()
+        return Counter({row[:-1]: row[-1] for row in rows if row[-1]})
+
+    def _memberships(self, start: date, end: date, group_by: List[str]) -> List[dict]:
+        dimensions = [group for group in group_by if group != "month"]
+        spans = months(start, end) if "month" in group_by else [(None, start, end)]
+        results = []
+        for month, first, last in spans:
+            for values, active in sorted(self._active(first, last, dimensions).items()):
+                groups = dict(zip(dimensions, values))
+                if month is not None:
+                    groups["month"] = month
+                results.append({**{group: groups[group] for group in group_by}, "active": active})
+        return results
+
+    def _report(self, start: date, end: date, group_by: List[str]) -> dict:
+        revenue = self._revenue(start, end, group_by)
+        return {
+            "date_from": start.isoformat(),
+            "date_to": end.isoformat(),
+            "group_by": group_by,
+            "revenue": revenue,
+            "memberships": self._memberships(start, end, group_by),
+            "totals": {
+                "receipts": sum(row["receipts"] for row in revenue),
+                "amount": sum(row["amount"] for row in revenue),
+                "active_memberships": sum(self._active(start, end, []).values()),
+            },
+        }
+
+    async def report(self, start: date, end: date, group_by: List[str]) -> dict:
+        """Revenue and active memberships over [start, end] grouped by any of GROUPS, cached per range"""
+        unknown = set(group_by) - set(GROUPS)
+        if unknown:
+            raise ValueError(f"Unknown report grouping: {', '.join(sorted(unknown))}")
+        await self.refresh()
+        version = self.version()
+        key = f"{version}:{start.isoformat()}:{end.isoformat()}:{','.join(group_by)}"
+        data = await self._cache.aget(key) if self._cache else None
+        if data is not None:
+            self.cache_hits += 1
+            return json.loads(data)
+        self.cache_misses += 1
+        result = await asyncio.to_thread(self._report, start, end, group_by)
+        result["version"] = version
+        if self._cache:
+            self._cache.put_async(key, json.dumps(result).encode(), REPORT_CACHE_TTL)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            state = self._state()
+            days = self._conn.execute("SELECT COUNT(DISTINCT day) FROM revenue_daily").fetchone()[0]
+        return {
+            "version": f"{state.get('generation', '0')}.{state.get('last_id', '0')}",
+            "revenue_days": days,
+            "rows_applied": self.rows_applied,
+            "rebuilds": self.rebuilds,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "last_error": self.last_error,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = self._pid = None
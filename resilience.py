@@ -0,0 +1,244 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Budget for one upstream call including its retries, and for each attempt within it
+UPSTREAM_DEADLINE = float(os.getenv("UPSTREAM_DEADLINE", "4"))
+UPSTREAM_ATTEMPT_TIMEOUT = float(os.getenv("UPSTREAM_ATTEMPT_TIMEOUT", "2"))
+# Extra attempts for idempotent reads; backoff is exponential with full jitter
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+UPSTREAM_BACKOFF = float(os.getenv("UPSTREAM_BACKOFF", "0.1"))
+# Consecutive failures that open the breaker, and how long it stays open before trial calls
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "10"))
+# Concurrent trial calls while half-open; more than one so a lookup issuing parallel queries can pass
+BREAKER_TRIAL_CALLS = int(os.getenv("BREAKER_TRIAL_CALLS", "3"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when an upstream call cannot succeed: the breaker is open or the deadline passed"""
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """Raised without calling the upstream while the breaker is open"""
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    """Raised when every attempt timed out or the call's deadline ran out"""
+
+
+def is_transient(error: BaseException) -> bool:
+    """Failures worth retrying and counting against the upstream's health; 4xx answers are the caller's fault"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code >= 500 or status_code in (408, 429)
+    # httpx and httpcore transport errors, without importing them here
+    module = type(error).__module__.split(".")[0]
+    return module in ("httpx", "httpcore", "h2", "ssl")
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: open after failure_threshold failures, a few trial calls after reset_timeout"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURES,
+        reset_timeout: float = BREAKER_RESET,
+        trial_calls: int = BREAKER_TRIAL_CALLS,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.trial_calls = max(1, trial_calls)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials_running = 0
+        self.opens = 0
+        self.rejections = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; while half-open only trial_calls at a time are let through"""
+        with self._lock:
+            if not self._available():
+                self.rejections += 1
+                return False
+            if self._state != CLOSED:
+                self._state = HALF_OPEN
+                self._trials_running += 1
+            return True
+
+    def available(self) -> bool:
+        """Whether allow() would let a call through now, without taking a half-open trial"""
+        with self._lock:
+            return self._available()
+
+    def _available(self) -> bool:
+        if self._state == CLOSED:
+            return True
+        return (
+            self._trials_running < self.trial_calls and time.monotonic() - self._opened_at >= self.reset_timeout
+        )
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f"Circuit {self.name} closed")
+            self._state = CLOSED
+            self._failures = 0
+            self._trials_running = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trials_running = max(0, self._trials_running - 1)
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self.opens += 1
+                logger.warning(f"Circuit {self.name} opened after {self._failures} consecutive failures")
+
+    def release(self):
+        """End a half-open trial that was cancelled before the upstream answered"""
+        with self._lock:
+            self._trials_running = max(0, self._trials_running - 1)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opens": self.opens,
+            "rejections": self.rejections,
+        }
+
+
+class Upstream:
+    """Deadline, jittered retries and a circuit breaker around calls to one upstream service"""
+
+    def __init__(
+        self,
+        name: str,
+        deadline: float = UPSTREAM_DEADLINE,
+        attempt_timeout: float = UPSTREAM_ATTEMPT_TIMEOUT,
+        retries: int = UPSTREAM_RETRIES,
+        backoff: float = UPSTREAM_BACKOFF,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker(name)
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.retried = 0
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def _admit(self):
+        if not self.breaker.allow():
+            raise CircuitOpen(f"{self.name} circuit is open")
+        self.calls += 1
+
+    def _failed(self, error: BaseException) -> bool:
+        """Record a failed attempt; returns whether it was transient"""
+        if not is_transient(error):
+            # The upstream answered, so it is healthy even if the request was wrong
+            self.breaker.record_success()
+            return False
+        self.failures += 1
+        if isinstance(error, (asyncio.TimeoutError, TimeoutError)) or "Timeout" in type(error).__name__:
+            self.timeouts += 1
+        self.breaker.record_failure()
+        return True
+
+    def _give_up(self, error: BaseException) -> UpstreamUnavailable:
+        if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+            return DeadlineExceeded(f"{self.name} did not answer in time")
+        return UpstreamUnavailable(f"{self.name} failed: {type(error).__name__}: {error}")
+
+    async def call(
+        self, operation: Callable[[], Awaitable[T]], idempotent: bool = True, deadline: Optional[float] = None
+    ) -> T:
+        """Await operation() under the deadline; idempotent operations are retried on transient failures"""
+        give_up = time.monotonic() + (deadline or self.deadline)
+        attempts = self.retries + 1 if idempotent else 1
+        for attempt in range(attempts):
+            self._admit()
+            remaining = give_up - time.monotonic()
+            try:
+                result = await asyncio.wait_for(operation(), min(self.attempt_timeout, remaining))
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if not self._failed(e):
+                    raise
+                pause = self._backoff(attempt)
+                if attempt + 1 == attempts or time.monotonic() + pause >= give_up:
+                    raise self._give_up(e) from e
+                self.retried += 1
+                logger.warning(f"{self.name} call failed ({type(e).__name__}: {e}), retrying in {pause:.2f}s")
+                await asyncio.sleep(pause)
+            else:
+                self.breaker.record_success()
+                return result
+
+    def call_sync(self, operation: Callable[[], T], idempotent: bool = True) -> T:
+        """Blocking version of call; the client's own timeout bounds each attempt"""
+        give_up = time.monotonic() + self.deadline
+        attempts = self.retries + 1 if idempotent else 1
+        for attempt in range(attempts):
+            self._admit()
+            try:
+                result = operation()
+            except Exception as e:
+                if not self._failed(e):
+                    raise
+                pause = self._backoff(attempt)
+                if attempt + 1 == attempts or time.monotonic() + pause >= give_up:
+                    raise self._give_up(e) from e
+                self.retried += 1
+                logger.warning(f"{self.name} call failed ({type(e).__name__}: {e}), retrying in {pause:.2f}s")
+                time.sleep(pause)
+            else:
+                self.breaker.record_success()
+                return result
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "retries": self.retried,
+            "deadline_seconds": self.deadline,
+            "breaker": self.breaker.stats(),
+        }
+
+
+# Every Supabase caller in the process shares one view of its health
+supabase_upstream = Upstream("supabase")
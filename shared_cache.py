@@ -0,0 +1,230 @@
+import os
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# App-owned directory for the SQLite caches; they hold customer names and phone numbers,
+# so it is created for this user only rather than living in the world-readable temp directory
+CACHE_DIR = os.getenv(
+    "RECEIPT_CACHE_DIR",
+    os.path.join(os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "receipt-downloader"),
+)
+# SQLite file shared by every worker process on the host; empty keeps caches per process
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", os.path.join(CACHE_DIR, "cache.sqlite3"))
+# Seconds to wait on another process's write lock; a busy database then counts as a miss
+# (or a skipped write). Async callers use aget/put_async, which keep even that wait off the event loop
+SHARED_CACHE_BUSY_TIMEOUT = float(os.getenv("SHARED_CACHE_BUSY_TIMEOUT", "0.05"))
+# Last-access times are only rewritten when older than this, so reads rarely write
+ACCESS_RESOLUTION = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed);
+CREATE TABLE IF NOT EXISTS {table}_total (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+INSERT OR IGNORE INTO {table}_total (id, bytes) VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON {table} BEGIN
+    UPDATE {table}_total SET bytes = bytes + new.size;
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF size ON {table} BEGIN
+    UPDATE {table}_total SET bytes = bytes + new.size - old.size;
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON {table} BEGIN
+    UPDATE {table}_total SET bytes = bytes - old.size;
+END;
+CREATE TABLE IF NOT EXISTS {table}_entries (id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER NOT NULL);
+CREATE TRIGGER IF NOT EXISTS {table}_count_insert AFTER INSERT ON {table} BEGIN
+    UPDATE {table}_entries SET entries = entries + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_count_delete AFTER DELETE ON {table} BEGIN
+    UPDATE {table}_entries SET entries = entries - 1;
+END;
+-- Counted once, for files created before the running count existed
+INSERT OR IGNORE INTO {table}_entries (id, entries) SELECT 0, COUNT(*) FROM {table};
+"""
+
+
+def private_file(path: str):
+    """Create path (and its directory) readable and writable by this user only"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        # Files left by older versions were created with the default umask
+        os.fchmod(fd, 0o600)
+    finally:
+        os.close(fd)
+
+
+def is_busy(error: sqlite3.Error) -> bool:
+    """Whether error is another connection holding the lock rather than a real failure"""
+    return isinstance(error, sqlite3.OperationalError) and "locked" in str(error)
+
+
+class SharedCache:
+    """Size-bounded LRU key/value store in a SQLite file, shared across worker processes"""
+
+    def __init__(self, path: str, table: str, max_bytes: int, busy_timeout: float = SHARED_CACHE_BUSY_TIMEOUT):
+        self.path = path
+        self.table = table
+        self.max_bytes = max_bytes
+        self.busy_timeout = busy_timeout
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._writer_pid: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.busy = 0
+        self.errors = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross fork(), so each worker opens its own
+        if self._pid != os.getpid():
+            try:
+                private_file(self.path)
+            except OSError as e:
+                raise sqlite3.OperationalError(f"cannot create {self.path}: {e}") from e
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA.format(table=self.table))
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connection()
+                row = conn.execute(
+                    f"SELECT value, expires, accessed FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] is not None and row[1] <= now:
+                    conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    row = None
+                if row is not None and now - row[2] > ACCESS_RESOLUTION:
+                    conn.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            self._failed("read", e)
+            self.misses += 1
+            return None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    async def aget(self, key: str) -> Optional[bytes]:
+        """get on a worker thread, so reading a blob or waiting on a lock never blocks the event loop"""
+        return await asyncio.to_thread(self.get, key)
+
+    def put_async(self, key: str, value: bytes, ttl: Optional[float] = None):
+        """Queue a put on this cache's writer thread; writes leave the caller at once but keep their order"""
+        self._write_behind(self.put, key, value, ttl)
+
+    def delete_async(self, key: str):
+        """Queue a delete behind any pending writes, so an earlier put cannot bring the key back"""
+        self._write_behind(self.delete, key)
+
+    def _write_behind(self, operation, *args):
+        # Threads do not survive fork(), so each worker process starts its own writer
+        if self._writer_pid != os.getpid():
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"shared-cache-{self.table}")
+            self._writer_pid = os.getpid()
+        self._writer.submit(operation, *args)
+
+    def put(self, key: str, value: bytes, ttl: Optional[float] = None):
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        expires = now + ttl if ttl is not None else None
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute(
+                        f"INSERT INTO {self.table} (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                        "expires = excluded.expires, accessed = excluded.accessed",
+                        (key, value, len(value), expires, now),
+                    )
+                    self._evict(conn)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            self._failed("write", e)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least recently used entries until the table fits its budget"""
+        total = conn.execute(f"SELECT bytes FROM {self.table}_total").fetchone()[0]
+        while total > self.max_bytes:
+            victims = conn.execute(
+                f"SELECT key, size FROM {self.table} ORDER BY accessed LIMIT 32"
+            ).fetchall()
+            if not victims:
+                break
+            for key, size in victims:
+                if total <= self.max_bytes:
+                    break
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                total -= size
+                self.evictions += 1
+
+    def delete(self, key: str):
+        try:
+            with self._lock:
+                self._connection().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            self._failed("delete", e)
+
+    def clear(self):
+        try:
+            with self._lock:
+                self._connection().execute(f"DELETE FROM {self.table}")
+        except sqlite3.Error as e:
+            self._failed("clear", e)
+
+    def _failed(self, operation: str, error: sqlite3.Error):
+        # The cache is an optimization; callers fall back to their loader
+        if is_busy(error):
+            self.busy += 1
+            return
+        self.errors += 1
+        logger.warning(f"Shared cache {self.table} {operation} failed: {error}")
+
+    def stats(self) -> dict:
+        """Counters plus the entry and byte totals the triggers keep, so no scan of the blobs"""
+        try:
+            with self._lock:
+                entries, size = self._connection().execute(
+                    f"SELECT entries, bytes FROM {self.table}_entries, {self.table}_total"
+                ).fetchone()
+        except sqlite3.Error:
+            entries = size = None
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "busy": self.busy,
+            "errors": self.errors,
+        }
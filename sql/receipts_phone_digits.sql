@@ -0,0 +1,13 @@
+-- Digits-only copy of customer_phone so receipt verification can match
+-- (receiptid, phone) in the database instead of fetching the row first.
+-- Apply once in the Supabase SQL editor; the app reads the column named by
+-- RECEIPT_PHONE_DIGITS_COLUMN (set it empty to match phones in Python).
+
+ALTER TABLE receipts
+    ADD COLUMN IF NOT EXISTS customer_phone_digits text
+    GENERATED ALWAYS AS (regexp_replace(coalesce(customer_phone, ''), '\D', '', 'g')) STORED;
+
+-- receiptid is the selective part; including the digits lets a failed
+-- verification be answered from the index alone
+CREATE INDEX IF NOT EXISTS receipts_receiptid_phone_digits
+    ON receipts (receiptid, customer_phone_digits);
@@ -0,0 +1,26 @@
+-- Last-modified time of each receipt, so the local replica (replica.py) can
+-- pull edited rows incrementally instead of waiting for its full pass.
+-- Apply once in the Supabase SQL editor; the replica reads the column named
+-- by REPLICA_UPDATED_COLUMN (set it empty to sync on the id watermark only).
+
+ALTER TABLE receipts
+    ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+
+CREATE OR REPLACE FUNCTION receipts_touch_updated_at() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS receipts_touch_updated_at ON receipts;
+CREATE TRIGGER receipts_touch_updated_at
+    BEFORE UPDATE ON receipts
+    FOR EACH ROW EXECUTE FUNCTION receipts_touch_updated_at();
+
+-- now() is the transaction's start time, so a row committed late can land
+-- behind the replica's watermark; the periodic full pass picks it up.
+-- The replica pages on (updated_at, id), which this index serves.
+CREATE INDEX IF NOT EXISTS receipts_updated_at_id
+    ON receipts (updated_at, id);
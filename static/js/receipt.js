@@ -1,5 +1,10 @@
 // Receipt Downloader JavaScript functionality
 
+// Receipt pages and PDFs kept in Cache Storage hold customer details, so copies expire
+// and only the most recent few are kept per store
+const STORED_COPY_MAX_AGE_MS = 24 * 60 * 60 * 1000;
+const STORED_COPY_MAX_ENTRIES = 20;
+
 class ReceiptApp {
     constructor() {
         this.init();
@@ -33,10 +38,72 @@ class ReceiptApp {
                 
                 // Show loading state
                 this.showLoadingModal('Verifying your information...');
+
+                if (window.fetch && 'caches' in window) {
+                    e.preventDefault();
+                    this.submitVerification(verificationForm).catch(() => verificationForm.submit());
+                }
             });
         }
     }
 
+    // Browsers never revalidate a form POST, so the page is fetched with the ETag of the copy
+    // kept in Cache Storage; a 304 shows that copy without the server rendering it again
+    async submitVerification(form) {
+        const store = await this.openStore('receipt-pages');
+        const cached = await store.match(form.action);
+        const response = await fetch(form.action, {
+            method: 'POST',
+            body: new FormData(form),
+            headers: this.validatorHeaders(cached)
+        });
+        let page = response;
+        if (response.status === 304 && cached) {
+            page = cached;
+        } else if (response.ok && response.headers.get('ETag')) {
+            // Only the verified receipt page carries an ETag; error pages are not kept
+            await this.storeCopy(store, form.action, response);
+        }
+        const html = await page.text();
+        document.open();
+        document.write(html);
+        document.close();
+    }
+
+    validatorHeaders(cached) {
+        const etag = cached ? cached.headers.get('ETag') : null;
+        return etag ? { 'If-None-Match': etag } : {};
+    }
+
+    // Open a Cache Storage store after dropping expired copies and all but the newest entries
+    async openStore(name) {
+        const store = await caches.open(name);
+        const now = Date.now();
+        const entries = [];
+        for (const request of await store.keys()) {
+            const response = await store.match(request);
+            const storedAt = Number(response && response.headers.get('X-Stored-At'));
+            if (!storedAt || now - storedAt > STORED_COPY_MAX_AGE_MS) {
+                await store.delete(request);
+            } else {
+                entries.push({ request, storedAt });
+            }
+        }
+        entries.sort((a, b) => b.storedAt - a.storedAt);
+        for (const { request } of entries.slice(STORED_COPY_MAX_ENTRIES - 1)) {
+            await store.delete(request);
+        }
+        return store;
+    }
+
+    // Keep a copy of a response, stamped with when it was stored
+    async storeCopy(store, key, response) {
+        const headers = new Headers(response.headers);
+        headers.set('X-Stored-At', String(Date.now()));
+        const body = await response.clone().blob();
+        await store.put(key, new Response(body, { status: response.status, headers }));
+    }
+
     // Phone number formatting and validation
     setupPhoneFormatting() {
         const phoneInput = document.getElementById('phone_number');
@@ -67,9 +134,25 @@ class ReceiptApp {
 
     // Loading states and modals
     setupLoadingStates() {
-        // Download button loading
         const downloadBtn = document.getElementById('downloadBtn');
-        if (downloadBtn) {
+        const downloadForm = downloadBtn ? downloadBtn.closest('form') : null;
+        if (downloadForm && window.fetch) {
+            // Render through the job API; a repeat download can be answered with 304 from the browser cache
+            downloadForm.addEventListener('submit', async (e) => {
+                e.preventDefault();
+                if (downloadBtn.disabled) {
+                    return;
+                }
+                this.setButtonLoading(downloadBtn, true);
+                try {
+                    await this.downloadPdf(downloadForm, downloadBtn);
+                } catch (error) {
+                    this.showError(error.message || 'Failed to download PDF');
+                } finally {
+                    this.setButtonLoading(downloadBtn, false);
+                }
+            });
+        } else if (downloadBtn) {
             downloadBtn.addEventListener('click', () => {
                 this.setButtonLoading(downloadBtn, true);
                 
@@ -81,6 +164,126 @@ class ReceiptApp {
         }
     }
 
+    // Queue the render as a job, follow it over SSE (or polling), then fetch the PDF,
+    // revalidating a previously downloaded copy with its ETag
+    async downloadPdf(form, button) {
+        // Cached under the form URL so copies from earlier jobs are reused
+        const url = form.action;
+        const store = 'caches' in window ? await this.openStore('receipt-pdfs') : null;
+        const cached = store ? await store.match(url) : undefined;
+        const headers = this.validatorHeaders(cached);
+
+        // The validator goes on the job request too, so an unchanged PDF is confirmed before any render
+        const jobResponse = await fetch(url.replace(/\/download$/, '/jobs'), {
+            method: 'POST',
+            body: new FormData(form),
+            headers
+        });
+        let response;
+        if (jobResponse.status === 304) {
+            response = jobResponse;
+        } else if (jobResponse.status === 503) {
+            // Job queue full: download directly, still revalidating the cached copy
+            response = await fetch(url, { method: 'POST', body: new FormData(form), headers });
+        } else {
+            const job = await jobResponse.json().catch(() => ({}));
+            if (!jobResponse.ok) {
+                throw new Error(job.detail || 'Failed to download PDF');
+            }
+            await this.waitForJob(job, button);
+            response = await fetch(job.result_url, { headers });
+        }
+        let pdf;
+        if (response.status === 304 && cached) {
+            pdf = cached;
+        } else if (response.ok) {
+            pdf = response;
+            if (store) {
+                await this.storeCopy(store, url, response);
+            }
+        } else {
+            const body = await response.json().catch(() => ({}));
+            throw new Error(body.detail || 'Failed to download PDF');
+        }
+
+        const blob = await pdf.blob();
+        const link = document.createElement('a');
+        link.href = URL.createObjectURL(blob);
+        link.download = this.filenameFrom(pdf.headers.get('Content-Disposition')) || 'receipt.pdf';
+        document.body.appendChild(link);
+        link.click();
+        link.remove();
+        setTimeout(() => URL.revokeObjectURL(link.href), 10000);
+    }
+
+    // Resolve once the job is done; status changes update the button text
+    waitForJob(job, button) {
+        return new Promise((resolve, reject) => {
+            const update = (status) => {
+                if (status.status === 'done') {
+                    resolve();
+                    return true;
+                }
+                if (status.status === 'failed' || status.status === 'expired') {
+                    reject(new Error(status.error || 'Failed to generate PDF'));
+                    return true;
+                }
+                this.setButtonProgress(button, status);
+                return false;
+            };
+            if (update(job)) {
+                return;
+            }
+
+            const poll = async () => {
+                try {
+                    const response = await fetch(job.status_url);
+                    const status = await response.json();
+                    if (!response.ok) {
+                        reject(new Error(status.detail || 'Failed to generate PDF'));
+                    } else if (!update(status)) {
+                        setTimeout(poll, 1000);
+                    }
+                } catch (error) {
+                    reject(error);
+                }
+            };
+            if (!window.EventSource) {
+                poll();
+                return;
+            }
+            const events = new EventSource(job.events_url);
+            events.addEventListener('status', (e) => {
+                if (update(JSON.parse(e.data))) {
+                    events.close();
+                }
+            });
+            events.onerror = () => {
+                // Proxies that buffer or cut streams: fall back to polling
+                events.close();
+                poll();
+            };
+        });
+    }
+
+    setButtonProgress(button, status) {
+        if (!button) {
+            return;
+        }
+        const text = status.status === 'queued' && status.position
+            ? `Queued (${status.position} ahead)...`
+            : status.status === 'queued' ? 'Queued...' : 'Generating PDF...';
+        button.innerHTML = `
+            <span class="spinner-border spinner-border-sm me-2" role="status"></span>
+            ${text}
+        `;
+    }
+
+    filenameFrom(disposition) {
+        const match = /filename="([^"]+)"/.exec(disposition || '');
+        return match ? match[1] : null;
+    }
+
     // Keyboard shortcuts
     setupKeyboardShortcuts() {
         document.addEventListener('keydown', (e) => {
@@ -124,8 +327,9 @@ class ReceiptApp {
                 <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
             `;
             
-            // Insert after the form
-            const form = document.getElementById('verificationForm');
+            // Insert after the verification form, or the download form on the receipt page
+            const downloadBtn = document.getElementById('downloadBtn');
+            const form = document.getElementById('verificationForm') || (downloadBtn && downloadBtn.closest('form'));
             if (form) {
                 form.parentNode.insertBefore(errorAlert, form.nextSibling);
             }
@@ -133,11 +337,16 @@ class ReceiptApp {
             errorAlert.querySelector('.error-message').textContent = message;
         }
         
-        // Auto-dismiss after 5 seconds
+        // Auto-dismiss after 5 seconds (the receipt page does not load Bootstrap)
         setTimeout(() => {
-            if (errorAlert) {
-                const alert = bootstrap.Alert.getInstance(errorAlert);
-                if (alert) alert.close();
+            if (!errorAlert) {
+                return;
+            }
+            const alert = window.bootstrap ? bootstrap.Alert.getInstance(errorAlert) : null;
+            if (alert) {
+                alert.close();
+            } else if (!window.bootstrap) {
+                errorAlert.remove();
             }
         }, 5000);
     }
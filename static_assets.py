@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Fingerprint and precompress /static assets; run at startup or ahead of time with `python static_assets.py`"""
+import os
+import gzip
+import json
+import hashlib
+import logging
+import mimetypes
+import tempfile
+from typing import Dict, Optional
+
+from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+STATIC_BUILD_DIR = os.getenv("STATIC_BUILD_DIR", os.path.join(BASE_DIR, "static_build"))
+MANIFEST_NAME = "manifest.json"
+
+# Only text formats shrink; PNGs are already deflated
+COMPRESSIBLE = {".css", ".js", ".svg", ".html", ".json", ".txt", ".map"}
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Unversioned URLs may change under the same name
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Preference order when a client accepts several
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _write_atomic(path: str, data: bytes):
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build(source_dir: str = STATIC_DIR, build_dir: str = STATIC_BUILD_DIR) -> Dict[str, str]:
+    """Copy each asset to a content-hashed name, write gzip/brotli variants and the manifest"""
+    manifest = {}
+    for root, _, files in os.walk(source_dir):
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, source_dir).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+            stem, ext = os.path.splitext(relative)
+            hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+            target = os.path.join(build_dir, hashed)
+            manifest[relative] = hashed
+            if os.path.exists(target):
+                # Names are content hashes, so an existing file and its variants are already current
+                continue
+            if ext.lower() in COMPRESSIBLE:
+                compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                if len(compressed) < len(data):
+                    _write_atomic(target + ".gz", compressed)
+                if brotli is not None:
+                    compressed = brotli.compress(data, quality=11)
+                    if len(compressed) < len(data):
+                        _write_atomic(target + ".br", compressed)
+            # Written last, so a variant never goes missing once its original exists
+            _write_atomic(target, data)
+    os.makedirs(build_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=build_dir, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(build_dir, MANIFEST_NAME))
+    return manifest
+
+
+def load_manifest(source_dir: str = STATIC_DIR, build_dir: str = STATIC_BUILD_DIR) -> Dict[str, str]:
+    """Build (a no-op for unchanged files) and return the manifest; empty if the build dir is unusable"""
+    try:
+        return build(source_dir, build_dir)
+    except OSError as e:
+        logger.warning(f"Static asset build failed, serving unversioned assets: {e}")
+        return {}
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class AssetFiles(StaticFiles):
+    """StaticFiles that serves fingerprinted names immutably, picking a precompressed variant per Accept-Encoding"""
+
+    def __init__(self, directory: str = STATIC_DIR, build_dir: str = STATIC_BUILD_DIR,
+                 manifest: Optional[Dict[str, str]] = None):
+        super().__init__(directory=directory)
+        self.build_dir = build_dir
+        self.manifest: Dict[str, str] = {}
+        self.hashed = set()
+        if manifest is not None:
+            self.use(manifest)
+
+    def use(self, manifest: Dict[str, str]):
+        self.manifest = manifest
+        self.hashed = set(manifest.values())
+
+    def load(self):
+        """Build and switch to the fingerprinted names; until then assets are served unversioned"""
+        self.use(load_manifest(self.directory, self.build_dir))
+
+    def url(self, path: str) -> str:
+        """Public URL for an asset, fingerprinted when the build knows it"""
+        return "/static/" + self.manifest.get(path, path)
+
+    async def get_response(self, path: str, scope):
+        relative = path.replace(os.sep, "/")
+        if relative not in self.hashed:
+            response = await super().get_response(path, scope)
+            response.headers.setdefault("Cache-Control", REVALIDATE_CACHE_CONTROL)
+            return response
+
+        full_path = os.path.join(self.build_dir, relative)
+        media_type = mimetypes.guess_type(relative)[0] or "application/octet-stream"
+        headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        accept = dict(scope.get("headers") or []).get(b"accept-encoding", b"").decode("latin-1")
+        accepted = _accepted_encodings(accept)
+        for coding, suffix in ENCODINGS:
+            if coding in accepted and os.path.exists(full_path + suffix):
+                full_path += suffix
+                headers["Content-Encoding"] = coding
+                break
+        return FileResponse(full_path, media_type=media_type, headers=headers)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    built = build()
+    print(f"Built {len(built)} assets into {STATIC_BUILD_DIR}")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Jinja environment shared by the web and render processes; `python templating.py` precompiles ahead of time"""
+import os
+import time
+import logging
+from typing import AsyncIterator, Iterator, Optional
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template
+from starlette.responses import StreamingResponse
+
+from filters import format_date
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+# Compiled template bytecode, shared by every web worker and render process on the host;
+# empty uses Jinja's per-user directory under the system temp dir
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", "")
+# Rendered characters buffered into each streamed chunk
+TEMPLATE_STREAM_CHUNK = int(os.getenv("TEMPLATE_STREAM_CHUNK", "4096"))
+
+
+def bytecode_cache(directory: str = TEMPLATE_CACHE_DIR) -> Optional[FileSystemBytecodeCache]:
+    """Filesystem bytecode cache, or None (compile in every process) when the directory is unusable"""
+    try:
+        if not directory:
+            return FileSystemBytecodeCache()
+        os.makedirs(directory, exist_ok=True)
+        if not os.access(directory, os.W_OK):
+            raise OSError(f"{directory} is not writable")
+        return FileSystemBytecodeCache(directory)
+    except (OSError, RuntimeError) as e:
+        logger.warning(f"Template bytecode cache disabled: {e}")
+        return None
+
+
+def environment(directory: str = TEMPLATE_DIR, cache_dir: str = TEMPLATE_CACHE_DIR) -> Environment:
+    """Environment every process builds the same way, so they all reuse one set of cached bytecode"""
+    env = Environment(loader=FileSystemLoader(directory), autoescape=True, bytecode_cache=bytecode_cache(cache_dir))
+    env.filters["format_date"] = format_date
+    return env
+
+
+def precompile(env: Environment) -> int:
+    """Compile (or load from the bytecode cache) every template into the environment; returns the count"""
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+def _chunks(template: Template, context: dict, chunk_size: int) -> Iterator[str]:
+    """Jinja's small output events joined into chunks of about chunk_size characters"""
+    buffer, size = [], 0
+    for piece in template.generate(context):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+async def _stream(first: str, rest: Iterator[str], started: float) -> AsyncIterator[str]:
+    yield first
+    for chunk in rest:
+        yield chunk
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="template_stream")
+
+
+def stream_template(
+    env: Environment, name: str, context: dict, status_code: int = 200, headers: Optional[dict] = None
+) -> StreamingResponse:
+    """Send a page as it renders; the first chunk renders before the response starts, so early errors still raise here"""
+    started = time.perf_counter()
+    chunks = _chunks(env.get_template(name), context, TEMPLATE_STREAM_CHUNK)
+    first = next(chunks, "")
+    return StreamingResponse(_stream(first, chunks, started), status_code=status_code, headers=headers, media_type="text/html")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    env = environment()
+    count = precompile(env)
+    print(f"Precompiled {count} templates into {getattr(env.bytecode_cache, 'directory', 'memory only')}")
@@ -0,0 +1,36 @@
+import os
+
+# Keep caches per process so tests never read or write the shared SQLite file
+os.environ["SHARED_CACHE_PATH"] = ""
+os.environ["REPLICA_PATH"] = ""
+
+import pytest
+
+from fake_supabase import FakeSupabase, make_rows
+from receipt_cache import receipt_cache
+
+# create_client only accepts JWT-shaped keys; the fake server ignores it
+TEST_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.dGVzdA"
+
+
+@pytest.fixture
+def rows():
+    return make_rows(5)
+
+
+@pytest.fixture
+def fake_supabase(rows):
+    """A FakeSupabase seeded with rows, serving on a free port"""
+    fake = FakeSupabase(rows)
+    server = fake.serve()
+    fake.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield fake
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def empty_receipt_cache():
+    receipt_cache.clear()
+    yield
+    receipt_cache.clear()
@@ -0,0 +1,165 @@
+import asyncio
+
+import pytest
+
+import database
+from async_db import AsyncPostgrest, PostgrestError, in_filter
+from database import ReceiptDatabase, fetch_verified, PHONE_DIGITS_COLUMN
+from models import Receipt, normalize_phone
+
+from conftest import TEST_KEY
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def receipt_db(fake_supabase, monkeypatch):
+    monkeypatch.setenv("SUPABASE_URL", fake_supabase.url)
+    monkeypatch.setenv("SUPABASE_KEY", TEST_KEY)
+    return ReceiptDatabase()
+
+
+def test_select_by_equality(fake_supabase, rows):
+    async def select():
+        rest = AsyncPostgrest(fake_supabase.url, TEST_KEY)
+        try:
+            return await rest.select("receipts", {"receiptid": rows[1]["receiptid"]}, columns="receiptid,customer_name")
+        finally:
+            await rest.aclose()
+
+    assert run(select()) == [{"receiptid": rows[1]["receiptid"], "customer_name": rows[1]["customer_name"]}]
+
+
+def test_select_in_filter_and_limit(fake_supabase, rows):
+    async def select():
+        rest = AsyncPostgrest(fake_supabase.url, TEST_KEY)
+        try:
+            wanted = [rows[0]["receiptid"], rows[3]["receiptid"], "MISSING"]
+            found = await rest.select("receipts", columns="receiptid", params=[("receiptid", in_filter(wanted))])
+            limited = await rest.select("receipts", columns="receiptid", limit=2)
+            return found, limited
+        finally:
+            await rest.aclose()
+
+    found, limited = run(select())
+    assert sorted(row["receiptid"] for row in found) == [rows[0]["receiptid"], rows[3]["receiptid"]]
+    assert len(limited) == 2
+
+
+def test_fetch_receipt(receipt_db, rows):
+    async def fetch():
+        try:
+            return await receipt_db.aget_receipt_by_id(rows[2]["receiptid"])
+        finally:
+            await receipt_db.aclose()
+
+    receipt = run(fetch())
+    assert receipt.receiptid == rows[2]["receiptid"]
+    assert receipt.id == rows[2]["id"]
+    assert receipt.customer_name == rows[2]["customer_name"]
+
+
+def test_fetch_receipt_not_found(receipt_db):
+    async def fetch():
+        try:
+            return await receipt_db.aget_receipt_by_id("NO-SUCH-RECEIPT")
+        finally:
+            await receipt_db.aclose()
+
+    assert run(fetch()) is None
+
+
+def test_verify_receipt_phone(receipt_db, rows):
+    row = rows[0]
+    # Formatting differs from the stored number; only the digits are compared
+    phone = " ".join(normalize_phone(row["customer_phone"]))
+
+    async def verify():
+        try:
+            return (
+                await receipt_db.averify_receipt_phone(row["receiptid"], phone),
+                await receipt_db.averify_receipt_phone(row["receiptid"], "0000000000"),
+            )
+        finally:
+            await receipt_db.aclose()
+
+    verified, wrong_phone = run(verify())
+    assert verified.receiptid == row["receiptid"]
+    assert verified.transaction_id == row["transaction_id"]
+    assert wrong_phone is None
+
+
+def test_verify_receipt_not_found(fake_supabase, rows):
+    async def verify():
+        rest = AsyncPostgrest(fake_supabase.url, TEST_KEY)
+        try:
+            return (
+                await fetch_verified(rest, None, "NO-SUCH-RECEIPT", "0000000000"),
+                await fetch_verified(rest, None, rows[0]["receiptid"], "0000000000"),
+            )
+        finally:
+            await rest.aclose()
+
+    # (exists, receipt): an unknown receipt is told apart from a wrong phone
+    assert run(verify()) == ((False, None), (True, None))
+
+
+def test_verify_without_phone_digits_column(rows, monkeypatch):
+    """A database without the digits column answers 400; phones are then matched in Python"""
+    monkeypatch.setattr(database, "_phone_column_available", True)
+    queries = []
+
+    class MissingColumn:
+        async def select(self, table, eq=None, columns="*", limit=None, params=None):
+            queries.append(dict(eq))
+            if PHONE_DIGITS_COLUMN in eq:
+                raise PostgrestError(400, f"column receipts.{PHONE_DIGITS_COLUMN} does not exist", "42703")
+            return [row for row in rows if row["receiptid"] == eq["receiptid"]][:limit]
+
+    row = rows[1]
+    rest = MissingColumn()
+    exists, receipt = run(fetch_verified(rest, None, row["receiptid"], normalize_phone(row["customer_phone"])))
+    assert exists and receipt == Receipt.from_row(row)
+    assert run(fetch_verified(rest, None, row["receiptid"], "0000000000")) == (True, None)
+    assert run(fetch_verified(rest, None, "NO-SUCH-RECEIPT", "0000000000")) == (False, None)
+    # Only the first lookup tried the missing column
+    assert sum(PHONE_DIGITS_COLUMN in query for query in queries) == 1
+
+
+class CountingRest:
+    """Answers selects from rows, recording each filter; optionally fails phone-filtered ones"""
+
+    def __init__(self, rows, error=None):
+        self.rows = rows
+        self.error = error
+        self.queries = []
+
+    async def select(self, table, eq=None, columns="*", limit=None, params=None):
+        self.queries.append(dict(eq))
+        if self.error is not None and PHONE_DIGITS_COLUMN in eq:
+            raise self.error
+        return [row for row in self.rows if all(str(row.get(c)) == str(v) for c, v in eq.items())][:limit]
+
+
+def test_verified_match_is_one_request(rows):
+    row = rows[2]
+    rest = CountingRest(rows)
+
+    exists, receipt = run(fetch_verified(rest, None, row["receiptid"], normalize_phone(row["customer_phone"])))
+
+    assert exists and receipt.receiptid == row["receiptid"]
+    assert len(rest.queries) == 1
+    # A miss adds the ID-only probe
+    assert run(fetch_verified(rest, None, row["receiptid"], "0000000000")) == (True, None)
+    assert len(rest.queries) == 3
+
+
+def test_other_bad_requests_keep_the_phone_filter(rows, monkeypatch):
+    monkeypatch.setattr(database, "_phone_column_available", True)
+    rest = CountingRest(rows, PostgrestError(400, "failed to parse filter", "PGRST100"))
+
+    with pytest.raises(PostgrestError):
+        run(fetch_verified(rest, None, rows[0]["receiptid"], "0000000000"))
+    assert database._phone_column_available
@@ -0,0 +1,76 @@
+import os
+import sys
+import asyncio
+import subprocess
+
+from batch_verify import NOT_FOUND, PHONE_MISMATCH, VERIFIED, phone_digits_by_id, verify_pairs
+from receipt_cache import receipt_cache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class InQueries:
+    """Answers receiptid=in.(...) selects from rows, recording the IDs of each query"""
+
+    def __init__(self, rows):
+        self.rows = {row["receiptid"]: row for row in rows}
+        self.queries = []
+
+    async def select(self, table, eq=None, columns="*", limit=None, params=None):
+        (column, expression), = params
+        ids = [value.strip('"') for value in expression[len("in.("):-1].split(",")]
+        self.queries.append(ids)
+        return [self.rows[receipt_id] for receipt_id in ids if receipt_id in self.rows]
+
+
+def test_misses_are_fetched_in_bounded_chunks(rows):
+    rest = InQueries(rows)
+    ids = [row["receiptid"] for row in rows] + ["NO-SUCH"]
+
+    digits = asyncio.run(phone_digits_by_id(ids + ids, rest, chunk_size=2))
+
+    # Duplicates are looked up once, and no query carries more than chunk_size IDs
+    assert sorted(receipt_id for query in rest.queries for receipt_id in query) == sorted(ids)
+    assert max(len(query) for query in rest.queries) == 2
+    assert digits["NO-SUCH"] is None
+    assert digits[rows[0]["receiptid"]] == "".join(filter(str.isdigit, rows[0]["customer_phone"]))
+
+
+def test_cached_ids_skip_the_database(rows):
+    rest = InQueries(rows)
+    ids = [row["receiptid"] for row in rows] + ["NO-SUCH"]
+    asyncio.run(phone_digits_by_id(ids, rest))
+    # The unknown ID left a negative entry, as a single verification would
+    assert receipt_cache.get("NO-SUCH") == (True, None)
+    rest.queries.clear()
+
+    # Only two columns were fetched, so found rows are not cached; the negative entry is reused
+    asyncio.run(phone_digits_by_id(["NO-SUCH", rows[0]["receiptid"]], rest))
+
+    assert rest.queries == [[rows[0]["receiptid"]]]
+
+
+def test_results_keep_request_order(rows):
+    rest = InQueries(rows)
+    pairs = [
+        (rows[1]["receiptid"], "0000000000"),
+        ("NO-SUCH", rows[0]["customer_phone"]),
+        (rows[0]["receiptid"], " ".join(rows[0]["customer_phone"])),
+    ]
+
+    results = asyncio.run(verify_pairs(pairs, rest))
+
+    assert [(result["receipt_id"], result["status"]) for result in results] == [
+        (rows[1]["receiptid"], PHONE_MISMATCH), ("NO-SUCH", NOT_FOUND), (rows[0]["receiptid"], VERIFIED),
+    ]
+    assert [result["match"] for result in results] == [False, False, True]
+
+
+def test_limits_are_at_least_one():
+    code = "import batch_verify; print(batch_verify.VERIFY_BATCH_MAX, batch_verify.VERIFY_BATCH_CHUNK)"
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT,
+        env={**os.environ, "VERIFY_BATCH_MAX": "0", "VERIFY_BATCH_CHUNK": "-5"},
+        capture_output=True, text=True, check=True,
+    )
+    assert result.stdout.split() == ["1", "1"]
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from models import Receipt
+from pdf_jobs import FairQueue, JobQueueFull, PDFJob
+
+
+@pytest.fixture
+def receipt(rows):
+    return Receipt.from_row(rows[0])
+
+
+def job(receipt, client):
+    return PDFJob(receipt, "native", f"key-{client}", client)
+
+
+def test_clients_are_served_round_robin(receipt):
+    queue = FairQueue(maxsize=10)
+    # One client bursts four jobs before two others submit one each
+    jobs = [job(receipt, "burst") for _ in range(4)] + [job(receipt, "b"), job(receipt, "c")]
+
+    async def drain():
+        for item in jobs:
+            await queue.put(item.client, item)
+        return [await queue.get() for _ in jobs]
+
+    served = asyncio.run(drain())
+
+    assert [item.client for item in served] == ["burst", "b", "c", "burst", "burst", "burst"]
+    # Each client's own jobs keep their order
+    assert [item for item in served if item.client == "burst"] == jobs[:4]
+    assert len(queue) == 0
+
+
+def test_position_counts_the_turns_ahead(receipt):
+    queue = FairQueue(maxsize=10)
+    burst = [job(receipt, "burst") for _ in range(3)]
+    other = job(receipt, "other")
+
+    async def fill():
+        for item in burst + [other]:
+            await queue.put(item.client, item)
+
+    asyncio.run(fill())
+
+    # Order is burst[0], other, burst[1], burst[2]
+    assert [queue.position(item) for item in (burst[0], other, burst[1], burst[2])] == [0, 1, 2, 3]
+
+
+def test_a_full_queue_refuses_more_work(receipt):
+    queue = FairQueue(maxsize=2)
+
+    async def overfill():
+        await queue.put("a", job(receipt, "a"))
+        await queue.put("b", job(receipt, "b"))
+        await queue.put("c", job(receipt, "c"))
+
+    with pytest.raises(JobQueueFull):
+        asyncio.run(overfill())
+    assert len(queue) == 2
+
+
+def test_get_waits_for_work(receipt):
+    queue = FairQueue(maxsize=2)
+    item = job(receipt, "a")
+
+    async def wait_then_put():
+        waiting = asyncio.create_task(queue.get())
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        await queue.put("a", item)
+        return await asyncio.wait_for(waiting, 1)
+
+    assert asyncio.run(wait_then_put()) is item
@@ -0,0 +1,103 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+pytest.importorskip("reportlab")
+pdfium = pytest.importorskip("pypdfium2")
+
+import renderer
+from models import Receipt
+from native_pdf import NativeReceiptRenderer
+from pdf_output import PRESETS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RECEIPT = Receipt.from_row({
+    "id": 7,
+    "receiptid": "NG000777",
+    "transaction_id": 1007,
+    "transaction_date": "2025-03-14T10:30:00",
+    "customer_name": "Asha Kulkarni",
+    "customer_phone": "98200 00777",
+    "shift": "Morning",
+    "plantype": "Monthly",
+    "payment_mode": "UPI",
+    "payment_amount": 1500,
+    "joining_date": "2025-03-14",
+    "expiration_date": "2025-04-13",
+})
+
+
+def pages_text(pdf: bytes) -> list:
+    document = pdfium.PdfDocument(pdf)
+    try:
+        return [page.get_textpage().get_text_range() for page in document]
+    finally:
+        document.close()
+
+
+@pytest.fixture(scope="module")
+def native():
+    return NativeReceiptRenderer()
+
+
+def test_render_receipt(native):
+    pdf = native.render(RECEIPT)
+
+    assert pdf.startswith(b"%PDF-")
+    pages = pages_text(pdf)
+    assert len(pages) == 1
+    text = pages[0]
+    for field in (
+        RECEIPT.receiptid,
+        RECEIPT.customer_name,
+        RECEIPT.plantype,
+        RECEIPT.shift,
+        RECEIPT.transaction_date_display,
+        RECEIPT.joining_date_display,
+        RECEIPT.expiration_date_display,
+        f"{RECEIPT.payment_amount}/-",
+    ):
+        assert field in text
+    # The phone number is what unlocks the receipt; it is never printed
+    assert "00777" not in text.replace(RECEIPT.receiptid, "")
+
+
+def test_render_many_is_one_page_per_receipt(native):
+    other = Receipt.from_row({**RECEIPT.to_dict(), "receiptid": "NG000778", "customer_name": "Ravi Patil"})
+
+    pages = pages_text(native.render_many([RECEIPT, other], PRESETS["compact"]))
+
+    assert len(pages) == 2
+    assert RECEIPT.customer_name in pages[0] and other.customer_name in pages[1]
+
+
+def test_missing_values_print_na(native):
+    receipt = Receipt.from_row({"receiptid": "NG000779", "customer_phone": "1", "payment_amount": 0})
+
+    text = pages_text(native.render(receipt))[0]
+
+    assert "NG000779" in text
+    assert text.count("N/A") >= 3
+
+
+def test_engine_dispatch(native, monkeypatch):
+    monkeypatch.setattr(renderer, "_native", native)
+    monkeypatch.setattr(renderer, "_HTML", None)
+
+    assert pages_text(renderer._render_pdf(RECEIPT, "native"))[0].count(RECEIPT.receiptid) == 1
+    with pytest.raises(RuntimeError, match="WeasyPrint is not available"):
+        renderer._render_pdf(RECEIPT, "weasyprint")
+
+
+@pytest.mark.parametrize("engine", renderer.ENGINES)
+def test_pdf_engine_environment(engine):
+    """PDF_ENGINE picks the engine used when a render does not name one"""
+    code = "import renderer; print(renderer.PDF_ENGINE, renderer._render_pdf.__defaults__[0])"
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env={**os.environ, "PDF_ENGINE": engine},
+        capture_output=True, text=True, check=True,
+    )
+    assert result.stdout.split() == [engine, engine]
@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+pytest.importorskip("reportlab")
+pytest.importorskip("pypdfium2")
+pytest.importorskip("PIL")
+
+import renderer
+from benchmarks.pdf_engines import MAX_DIFF, SAMPLE_RECEIPT, visual_diff
+
+ENGINE_STATE = ("_template", "_HTML", "_base_url", "_native", "_started")
+
+
+@pytest.fixture
+def engines(monkeypatch):
+    """Both engines loaded in this process; skipped where WeasyPrint or its pango libraries are missing"""
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError) as e:
+        pytest.skip(f"WeasyPrint unavailable: {e}")
+    # Restored afterwards, so other tests still see an uninitialized renderer
+    for name in ENGINE_STATE:
+        monkeypatch.setattr(renderer, name, getattr(renderer, name))
+    renderer._init_worker(renderer.TEMPLATE_DIR, renderer.PDF_TEMPLATE, os.path.dirname(renderer.TEMPLATE_DIR))
+    assert renderer._native is not None and renderer._HTML is not None
+
+
+def test_native_output_matches_weasyprint(engines):
+    """The check benchmarks/pdf_engines.py runs, at its default threshold"""
+    weasyprint_pdf = renderer._render_pdf(SAMPLE_RECEIPT, "weasyprint")
+    native_pdf = renderer._render_pdf(SAMPLE_RECEIPT, "native")
+
+    diff = visual_diff(weasyprint_pdf, native_pdf, scale=1.0)
+
+    assert diff["differing_pixels"] <= MAX_DIFF, diff
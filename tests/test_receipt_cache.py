@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+import receipt_cache as receipt_cache_module
+from models import Receipt
+from receipt_cache import ReceiptCache
+
+
+class Clock:
+    """Stands in for the time module so entries expire without sleeping"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(receipt_cache_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def receipts(rows):
+    return {row["receiptid"]: Receipt.from_row(row) for row in rows}
+
+
+def counting_loader(receipts):
+    calls = []
+
+    async def load(receipt_id):
+        calls.append(receipt_id)
+        return receipts.get(receipt_id)
+
+    return load, calls
+
+
+def test_read_through_caches_rows_and_unknown_ids(clock, receipts):
+    cache = ReceiptCache(ttl=300, negative_ttl=30, stale_ttl=0, shared_path="")
+    load, calls = counting_loader(receipts)
+    known = next(iter(receipts))
+
+    async def lookups():
+        return [await cache.fetch(receipt_id, load) for receipt_id in (known, known, "NO-SUCH", "NO-SUCH")]
+
+    results = asyncio.run(lookups())
+
+    assert results == [receipts[known], receipts[known], None, None]
+    assert calls == [known, "NO-SUCH"]
+    assert cache.get("NO-SUCH") == (True, None)
+    assert (cache.hits, cache.negative_hits, cache.misses) == (1, 2, 2)
+
+
+def test_unknown_ids_expire_before_rows(clock, receipts):
+    cache = ReceiptCache(ttl=300, negative_ttl=30, stale_ttl=0, shared_path="")
+    known = next(iter(receipts))
+    cache.put(known, receipts[known])
+    cache.put("NEW-RECEIPT", None)
+
+    clock.now += 31
+    # A receipt issued after the negative lookup is picked up once that entry lapses
+    assert cache.get("NEW-RECEIPT") == (False, None)
+    assert cache.get(known) == (True, receipts[known])
+    clock.now += 270
+    assert cache.get(known) == (False, None)
+
+
+def test_negative_entries_are_never_served_stale(clock, receipts):
+    cache = ReceiptCache(ttl=300, negative_ttl=30, stale_ttl=3600, shared_path="")
+    cache.put("NO-SUCH", None)
+    clock.now += 31
+    load, calls = counting_loader(receipts)
+
+    assert asyncio.run(cache.fetch("NO-SUCH", load)) is None
+    assert calls == ["NO-SUCH"]
+    assert cache.stale_hits == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock, receipts):
+    cache = ReceiptCache(max_entries=2, shared_path="")
+    first, second, third = list(receipts)[:3]
+    cache.put(first, receipts[first])
+    cache.put(second, receipts[second])
+    cache.get(first)
+    cache.put(third, receipts[third])
+
+    assert cache.get(second) == (False, None)
+    assert cache.get(first)[0] and cache.get(third)[0]
+    assert cache.evictions == 1
+
+
+def test_verified_lookup_checks_the_phone_of_a_cached_row(clock, receipts):
+    cache = ReceiptCache(shared_path="")
+    receipt = next(iter(receipts.values()))
+    cache.put(receipt.receiptid, receipt)
+
+    async def loader(receipt_id, phone_digits):
+        raise AssertionError("a cached row must not reach the database")
+
+    async def verify(phone_digits):
+        return await cache.fetch_verified(receipt.receiptid, phone_digits, loader)
+
+    assert asyncio.run(verify(receipt.phone_digits)) == (True, receipt)
+    assert asyncio.run(verify("0000000000")) == (True, None)
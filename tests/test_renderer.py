@@ -0,0 +1,49 @@
+import time
+import asyncio
+
+import pytest
+
+import renderer
+from renderer import RenderPool, RenderTimeout, WARMUP_RECEIPT
+
+
+def test_worker_enforces_its_deadline(monkeypatch):
+    def hang(receipts, engine, quality):
+        time.sleep(5)
+
+    monkeypatch.setattr(renderer, "_render_documents", hang)
+    started = time.perf_counter()
+    with pytest.raises(RenderTimeout):
+        renderer._render_job(1, [WARMUP_RECEIPT], "native", "standard", 0.2)
+    assert time.perf_counter() - started < 1
+
+
+def test_native_timeout_does_not_fall_back_to_weasyprint(monkeypatch):
+    class Hung:
+        def render(self, receipt, preset):
+            time.sleep(5)
+
+    monkeypatch.setattr(renderer, "_native", Hung())
+    with pytest.raises(RenderTimeout):
+        renderer._render_job(1, [WARMUP_RECEIPT], "native", "standard", 0.2)
+
+
+def test_queue_time_does_not_count_against_the_deadline():
+    """More queued work than fits in one deadline still renders, with no pool restart"""
+    pytest.importorskip("reportlab")
+
+    async def burst():
+        pool = RenderPool(workers=1, queue_depth=40, timeout=0.2)
+        try:
+            await pool.warm_up()
+            started = time.perf_counter()
+            results = await asyncio.gather(*(pool.render(WARMUP_RECEIPT, "native") for _ in range(40)))
+            return results, time.perf_counter() - started, pool.restarts
+        finally:
+            pool.shutdown()
+
+    results, elapsed, restarts = asyncio.run(burst())
+    assert all(pdf.startswith(b"%PDF") for pdf in results)
+    assert restarts == 0
+    if elapsed < 0.2:
+        pytest.skip("renders too fast here to queue past the deadline")
@@ -0,0 +1,75 @@
+import asyncio
+from datetime import datetime, timezone
+
+from async_db import AsyncPostgrest, PostgrestError
+from fake_supabase import make_rows
+from replica import ReceiptReplica
+
+from conftest import TEST_KEY
+
+
+def run_with_replica(url, path, steps):
+    """Run steps(replica) on one event loop: the HTTP client cannot outlive it"""
+    async def run():
+        rest = AsyncPostgrest(url, TEST_KEY)
+        replica = ReceiptReplica(str(path / "replica.sqlite3"), rest, batch_size=2)
+        try:
+            await steps(replica)
+        finally:
+            replica.close()
+            await rest.aclose()
+
+    asyncio.run(run())
+
+
+def test_incremental_sync_picks_up_inserts_and_edits(fake_supabase, rows, tmp_path):
+    stored = fake_supabase.tables["receipts"]
+
+    async def steps(replica):
+        assert await replica.sync_once() == len(rows)
+        assert replica.count() == len(rows)
+
+        stored[1].update(customer_name="Renamed", updated_at=datetime.now(timezone.utc).isoformat())
+        stored.extend(make_rows(1, start=len(rows) + 1))
+
+        # Only the edited row and the new one come back
+        assert await replica.sync_once() == 2
+        assert replica.get(rows[1]["receiptid"])["customer_name"] == "Renamed"
+        assert replica.count() == len(rows) + 1
+        assert await replica.sync_once() == 0
+
+    run_with_replica(fake_supabase.url, tmp_path, steps)
+
+
+def test_full_sync_deletes_rows_gone_upstream(fake_supabase, rows, tmp_path):
+    async def steps(replica):
+        await replica.sync_once()
+        del fake_supabase.tables["receipts"][2]
+
+        # An incremental sync cannot see a delete
+        await replica.sync_once()
+        assert replica.exists(rows[2]["receiptid"])
+
+        await replica.sync_once(full=True)
+        assert not replica.exists(rows[2]["receiptid"])
+        assert replica.count() == len(rows) - 1
+        assert replica.stats()["deleted"] == 1
+
+    run_with_replica(fake_supabase.url, tmp_path, steps)
+
+
+def test_falls_back_to_id_watermark_without_updated_column(rows, tmp_path):
+    class NoUpdatedColumn:
+        async def select(self, table, eq=None, columns="*", limit=None, params=None):
+            if "updated_at" in params["order"]:
+                raise PostgrestError(400, "column receipts.updated_at does not exist", "42703")
+            after = int(params["id"][len("gt."):])
+            return [row for row in rows if row["id"] > after][:limit]
+
+    replica = ReceiptReplica(str(tmp_path / "replica.sqlite3"), NoUpdatedColumn())
+    try:
+        assert asyncio.run(replica.sync_once()) == len(rows)
+        assert replica.updated_column == ""
+        assert replica.count() == len(rows)
+    finally:
+        replica.close()
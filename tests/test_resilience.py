@@ -0,0 +1,213 @@
+import time
+import asyncio
+
+import pytest
+
+import resilience
+import receipt_cache as receipt_cache_module
+from models import Receipt
+from receipt_cache import ReceiptCache
+from resilience import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, DeadlineExceeded, Upstream, UpstreamUnavailable,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience, "time", clock)
+    return clock
+
+
+def test_breaker_opens_then_lets_trials_through(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=10, trial_calls=2)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock.now += 10
+    assert breaker.state == HALF_OPEN
+    # Only trial_calls go out while half-open
+    assert breaker.allow() and breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert (breaker.opens, breaker.rejections) == (1, 2)
+
+
+def test_failed_trial_reopens_the_breaker(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN and breaker.opens == 2
+    clock.now += 9
+    assert not breaker.available()
+
+
+def test_cancelled_trial_frees_its_slot(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=10, trial_calls=1)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    assert not breaker.available()
+
+    breaker.release()
+
+    assert breaker.available()
+
+
+def test_transient_failures_are_retried_and_counted():
+    upstream = Upstream("test", retries=2, backoff=0.001, breaker=CircuitBreaker("test", failure_threshold=10))
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ServerError("unavailable")
+        return "row"
+
+    assert asyncio.run(upstream.call(flaky)) == "row"
+    assert (upstream.failures, upstream.retried) == (2, 2)
+    assert upstream.breaker.state == CLOSED
+
+
+def test_client_errors_are_not_retried_and_keep_the_breaker_closed():
+    upstream = Upstream("test", retries=2, breaker=CircuitBreaker("test", failure_threshold=1))
+    attempts = []
+
+    async def bad():
+        attempts.append(1)
+        raise BadRequest("bad filter")
+
+    with pytest.raises(BadRequest):
+        asyncio.run(upstream.call(bad))
+    assert len(attempts) == 1
+    assert upstream.breaker.state == CLOSED
+
+
+def test_writes_are_not_retried():
+    upstream = Upstream("test", retries=2, backoff=0.001, breaker=CircuitBreaker("test", failure_threshold=10))
+    attempts = []
+
+    async def insert():
+        attempts.append(1)
+        raise ServerError("unavailable")
+
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(upstream.call(insert, idempotent=False))
+    assert len(attempts) == 1
+
+
+def test_deadline_bounds_a_hung_upstream():
+    upstream = Upstream("test", deadline=0.3, attempt_timeout=0.1, retries=5, backoff=0.001)
+
+    async def hang():
+        await asyncio.sleep(5)
+
+    started = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(upstream.call(hang))
+
+    assert time.perf_counter() - started < 1
+    assert upstream.timeouts >= 1
+
+
+def test_open_breaker_fails_fast():
+    upstream = Upstream("test", breaker=CircuitBreaker("test", failure_threshold=1, reset_timeout=60))
+    upstream.breaker.record_failure()
+    called = []
+
+    async def operation():
+        called.append(1)
+
+    with pytest.raises(CircuitOpen):
+        asyncio.run(upstream.call(operation))
+    assert not called
+
+
+@pytest.fixture
+def stale_cache(rows, monkeypatch):
+    """A cache holding rows[0] past its TTL but within its stale window"""
+    clock = Clock()
+    monkeypatch.setattr(receipt_cache_module, "time", clock)
+    cache = ReceiptCache(ttl=300, stale_ttl=3600, shared_path="")
+    receipt = Receipt.from_row(rows[0])
+    cache.put(receipt.receiptid, receipt)
+    clock.now += 301
+    return cache, receipt
+
+
+def test_stale_row_is_served_while_one_refresh_runs(stale_cache):
+    cache, receipt = stale_cache
+    refreshed = Receipt.from_row({**receipt.to_dict(), "customer_name": "Refreshed"})
+    loads = []
+
+    async def loader(receipt_id):
+        loads.append(receipt_id)
+        await asyncio.sleep(0.01)
+        return refreshed
+
+    async def scenario():
+        served = await asyncio.gather(*(cache.fetch(receipt.receiptid, loader) for _ in range(3)))
+        await asyncio.sleep(0.05)
+        return served, await cache.fetch(receipt.receiptid, loader)
+
+    served, after = asyncio.run(scenario())
+
+    assert served == [receipt] * 3
+    assert after == refreshed
+    assert len(loads) == 1
+    assert (cache.stale_hits, cache.refreshes) == (3, 1)
+
+
+def test_failed_refresh_keeps_the_stale_row(stale_cache):
+    cache, receipt = stale_cache
+
+    async def loader(receipt_id):
+        raise UpstreamUnavailable("supabase circuit is open")
+
+    async def scenario():
+        first = await cache.fetch(receipt.receiptid, loader)
+        await asyncio.sleep(0.01)
+        return first, await cache.fetch(receipt.receiptid, loader)
+
+    assert asyncio.run(scenario()) == (receipt, receipt)
+    assert cache.refresh_failures >= 1
+
+
+def test_blocking_lookup_falls_back_to_stale_only_on_failure(stale_cache):
+    cache, receipt = stale_cache
+
+    def failing(receipt_id):
+        raise UpstreamUnavailable("supabase did not answer in time")
+
+    assert cache.fetch_sync(receipt.receiptid, failing) == receipt
+    assert cache.fetch_sync("NO-SUCH", lambda receipt_id: None) is None
+    with pytest.raises(UpstreamUnavailable):
+        cache.fetch_sync("OTHER", failing)
@@ -0,0 +1,40 @@
+import sqlite3
+
+from metrics import Callback
+from shared_cache import SharedCache
+
+
+def test_entry_count_is_kept_without_scanning(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SharedCache(path, "pdfs", max_bytes=250)
+    for key in "abc":
+        cache.put(key, b"x" * 100)
+    cache.put("a", b"y" * 50)
+    cache.delete("missing")
+    cache.delete("c")
+
+    # The third 100-byte put evicted "a", the smaller put brought it back, "c" was deleted
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert (stats["entries"], stats["bytes"]) == (2, 150)
+    cache.put("b", b"z" * 10)
+    assert cache.stats()["entries"] == 2
+    cache.clear()
+    assert (cache.stats()["entries"], cache.stats()["bytes"]) == (0, 0)
+
+
+def test_entry_count_starts_from_existing_rows(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SharedCache(path, "pdfs", max_bytes=1000).put("a", b"x")
+    # A file from before the running count: drop it so the next open recounts
+    conn = sqlite3.connect(path)
+    conn.executescript("DROP TABLE pdfs_entries; DROP TRIGGER pdfs_count_insert; DROP TRIGGER pdfs_count_delete;")
+    conn.close()
+
+    assert SharedCache(path, "pdfs", max_bytes=1000).stats()["entries"] == 1
+
+
+def test_unreadable_stats_are_left_out_of_the_scrape():
+    metric = Callback("cache_bytes", "Bytes", lambda: {"memory": 10, "disk": None}, labelname="tier")
+
+    assert metric.samples() == ['cache_bytes{tier="memory"} 10']
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def render(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return f"pdf-{key}"
+
+    async def burst():
+        return await asyncio.gather(*(flight.do(key, render, key) for key in ["a"] * 5 + ["b"] * 3))
+
+    results = asyncio.run(burst())
+
+    assert results == ["pdf-a"] * 5 + ["pdf-b"] * 3
+    assert sorted(calls) == ["a", "b"]
+    assert flight.stats() == {"calls": 2, "coalesced": 6, "in_flight": 0}
+
+
+def test_a_finished_call_is_not_reused():
+    flight = SingleFlight()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return len(calls)
+
+    async def twice():
+        return await flight.do("key", load), await flight.do("key", load)
+
+    assert asyncio.run(twice()) == (1, 2)
+
+
+def test_every_waiter_sees_the_failure():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream down")
+
+    async def burst():
+        return await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(burst())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.calls == 1 and flight.in_flight == 0
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def render():
+        await asyncio.sleep(0.05)
+        return b"%PDF"
+
+    async def scenario():
+        leader = asyncio.create_task(flight.do("key", render))
+        follower = asyncio.create_task(flight.do("key", render))
+        await asyncio.sleep(0.01)
+        # The client that started the render disconnects
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == b"%PDF"